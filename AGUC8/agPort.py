@@ -6,10 +6,31 @@
 import serial as s
 from datetime import datetime
 import time
+import threading
 import logging
 
+from AGUC8 import codec
+from AGUC8 import framing
+from AGUC8.framing import FrameReader, Timeouts, TERMINATOR, TIMEOUT
+from AGUC8.errors import NotConnected, CommandLost
+from AGUC8.metrics import Metrics
+from AGUC8.trace import TraceRecorder, CAPACITY, TX, RX
+
 logger = logging.getLogger(__name__)
 
+## Seconds an exchange waits for a lost connection to be restored before failing
+RESUMETIMEOUT = 5.
+## First and largest delays in seconds between two attempts to reopen a lost connection
+BACKOFFMIN = 0.01
+BACKOFFMAX = 1.
+## Default seconds without traffic after which the connection is checked with VE, see supervise
+HEARTBEAT = 1.
+
+# Makes sim:// and replay:// URLs open a simulated controller or a recorded session
+# (see AGUC8.protocol_sim and AGUC8.protocol_replay)
+if 'AGUC8' not in s.protocol_handler_packages:
+    s.protocol_handler_packages.append('AGUC8')
+
 
 class AGPort():
     """Class that extends the functionality of :class:`Serial` for use with the Agilis controller commands.
@@ -17,6 +38,14 @@ class AGPort():
     
     :param portName: Serial port (Uses pySerial serial_for_url)
     :portName type: str
+    :raises AGUC8.errors.NotConnected: if the port cannot be opened
+
+    A connection that drops, e.g. a socket:// link to an Ethernet-serial bridge, is reopened
+    with exponential backoff by the next exchange, for up to :attr:`resumeTimeout` seconds.
+    The commands returned by :attr:`restore` are then written before anything else. An exchange
+    lost with the connection is sent again, unless it holds a relative move, which could run
+    twice: :class:`AGUC8.errors.CommandLost` is raised instead. Use :meth:`supervise` to detect
+    and repair drops while the port is idle.
     """
     
     ## Class constructor
@@ -29,16 +58,48 @@ class AGPort():
             ## @var AGPort.soul
             self.soul = None
             return None
+        logger.debug('Opening serial communication..')
+        self.portName = portName
+        ## @var AGPort.lock
+        # Held for a whole command/reply exchange so that threads sharing the port do not interleave
+        self.lock = threading.RLock()
+        # Exchanges waiting for the lock give way while urgent ones are pending, see sendUrgent
+        self._turn = threading.Condition(self.lock)
+        self._urgentLock = threading.Lock()
+        self._urgent = 0
+        ## @var AGPort.errorCount
+        # Number of queries whose reply timed out or could not be read, and of connection losses
+        self.errorCount = 0
+        ## @var AGPort.metrics
+        # Traffic statistics, see :class:`AGUC8.metrics.Metrics`
+        self.metrics = Metrics()
+        ## @var AGPort.recorder
+        # Wire trace recorder, None when tracing is off. See :meth:`startTrace`
+        self.recorder = None
+        ## @var AGPort.timeouts
+        # Reply timeout of each command, learned from the latencies in the metrics
+        self.timeouts = Timeouts(self.metrics)
+        ## @var AGPort.restore
+        # Called holding the lock after a lost connection is reopened. Returns the commands,
+        # none of them a query, that configure the controller again. None to send nothing.
+        self.restore = None
+        ## @var AGPort.resumeTimeout
+        # Seconds an exchange waits for a lost connection to be restored
+        self.resumeTimeout = RESUMETIMEOUT
+        ## @var AGPort.connected
+        # Whether the connection is up
+        self.connected = False
+        self._lastExchange = time.monotonic()
+        self._downSince = None
+        self._supervisor = None
+        self._unsupervise = threading.Event()
         try:
-            logger.debug('Opening serial communication..')
-            self.portName = portName
-            self.ser = s.serial_for_url(self.portName,115200,s.EIGHTBITS,s.PARITY_NONE,s.STOPBITS_ONE, timeout=1)
-            self.soul = 'p'
-            logger.info('Serial communcation opened with ' + self.portName)
-        except Exception as e:
-            print('I could not find or open the port you specified: {0}'.format(portName))
-            self.soul = None
-            return None
+            self._open()
+        except (s.SerialException, OSError, ValueError) as e:
+            raise NotConnected('I could not find or open the port you specified: {0} ({1})'.format(portName, e)) from e
+        self.connected = True
+        self.soul = 'p'
+        logger.info('Serial communcation opened with ' + self.portName)
     
         
     def amInull(self):
@@ -50,6 +111,26 @@ class AGPort():
         return self.soul is None
     
     
+    def startTrace(self, capacity=CAPACITY):
+        """Starts recording every frame sent and received in a ring buffer.
+        Clears the records if tracing was already on.
+
+        :param capacity: Size of the ring buffer in bytes
+        :capacity type: int, optional
+        :return: Recorder, see :class:`AGUC8.trace.TraceRecorder`
+        :rtype: :class:`AGUC8.trace.TraceRecorder`
+        """
+        self.recorder = TraceRecorder(capacity)
+        return self.recorder
+
+    def stopTrace(self):
+        """Stops recording. Returns the recorder holding the frames recorded so far, or None.
+
+        :rtype: :class:`AGUC8.trace.TraceRecorder`
+        """
+        recorder, self.recorder = self.recorder, None
+        return recorder
+
     def isAquery(self,command):
         """Returns whether command is a query, as defined by Agilis command reference.
 
@@ -61,42 +142,254 @@ class AGPort():
         
         if self.amInull():
             return False
-        
-        queryOnly=["?","PH","TE","TP","TS","VE"]
-        command = command.upper()
-        for q in queryOnly:
-            if command.find(q) != -1:
-                return True
-        return False
+        return codec.isQuery(command)
     
     
     def sendString(self, command):
         """Sends a serial command to the device.
         Returns a response if command is a query. Else returns 0.
 
-        :param command: Command to send
-        :command type: str
+        :param command: Command to send, as text or as a frame from :func:`AGUC8.codec.frame`
+        :command type: str or :class:`AGUC8.codec.Frame`
         :return: Return reponse if command is a query. Else returns 0.
         :rtype: str or int
         """
         
-        response = ''
-        logger.debug('sent: ' + repr(command))
-        bCommand = command.encode('utf-8')
-        self.ser.write(bCommand)
-        if self.isAquery(command):
-            try:
-                response = self.ser.readline().decode('utf-8')
+        responses = self._exchange([command])
+        if responses:
+            return responses[0]
+
+    def sendBatch(self, commands):
+        """Sends several serial commands to the device in a single write, then reads
+        the responses to the queries among them in order.
+        A batch costs one round trip instead of one per command.
+
+        :param commands: Commands to send, as text or as frames from :func:`AGUC8.codec.frame`
+        :commands type: list
+        :return: Responses to the queries, in the order the queries were sent. A reply that
+            timed out is returned as ''.
+        :rtype: list
+        """
+
+        return self._exchange(commands)
+
+    def sendMotion(self, command, cancel=None):
+        """Sends a motion command unless cancel is set. The check is made once the command has
+        its turn on the port, after any urgent exchange such as a stop's ST, so a motion is either
+        sent before the ST or not at all.
+
+        :param command: Command to send
+        :command type: str or :class:`AGUC8.codec.Frame`
+        :param cancel: Event that is set to cancel the motion. Defaults to None.
+        :cancel type: threading.Event, optional
+        :return: Whether the command was sent
+        :rtype: bool
+        """
+
+        return self._exchange([command], cancel=cancel) is not None
+
+    def sendUrgent(self, commands):
+        """Sends commands like :meth:`sendBatch`, ahead of every exchange waiting for the port.
+        Only an exchange already in progress, whose replies are being read, is let finish first.
+        Used for ST.
+
+        :param commands: Commands to send
+        :commands type: list
+        :return: Responses to the queries, in order
+        :rtype: list
+        """
+
+        with self._urgentLock:
+            self._urgent += 1
+        try:
+            return self._exchange(commands, True)
+        finally:
+            with self._urgentLock:
+                self._urgent -= 1
+            with self.lock:
+                self._turn.notify_all()
+
+    def _exchange(self, commands, urgent=False, cancel=None):
+        
+        frames = [codec.encode(c) for c in commands]
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug('sent: ' + repr(frames))
+        with self.lock:
+            while self._urgent and not urgent:
+                self._turn.wait()
+            if cancel is not None and cancel.is_set():
+                # Cancelled while giving way, e.g. by the stop that was sent meanwhile
+                return None
+            for attempt in (0, 1):
+                if not self.connected:
+                    self._reconnect()
+                try:
+                    return self._transfer(frames)
+                except (s.SerialException, OSError) as e:
+                    self._lost(e)
+                    if attempt or any(f.mnemonic == 'PR' for f in frames):
+                        raise CommandLost('Connection to {0} lost during {1!r}'.format(self.portName, frames)) from e
+
+    def _transfer(self, frames):
+        
+        if self._dirty:
+            # Bytes left by a timeout or a late reply would be taken for the replies to come
+            self.reader.flush()
+            self._dirty = False
+        bCommands = b''.join(frames)
+        queries = [f for f in frames if f.query]
+        responses = [''] * len(queries)
+        start = time.perf_counter()
+        recorder = self.recorder
+        if recorder is not None:
+            recorder.record(TX, bCommands)
+        self.ser.write(bCommands)
+        self.metrics.written(frames, time.perf_counter() - start)
+        i = 0
+        while i < len(queries):
+            line = self.reader.readline(self.timeouts.get(queries[i].mnemonic))
+            if not line:
+                logger.warning('No reply to ' + repr(queries[i]) + ' from ' + self.portName)
+                self._missed(queries[i], start)
+                i += 1
+                continue
+            if recorder is not None:
+                recorder.record(RX, line)
+            response = line[:-len(TERMINATOR)].decode('ascii', 'replace')
+            if logger.isEnabledFor(logging.DEBUG):
                 logger.debug('received: ' + repr(response))
-                return response[:-2]
-            except:
-                print('Serial Timeout')
-                return 0
+            j = framing.match(queries[i:], response)
+            if j is not None and self._wasMissed(queries[i + j].echo):
+                if j:
+                    # The late reply to a query that timed out, not the reply to a later query
+                    j = None
+                else:
+                    # Possibly the late reply: the reply to this query may follow, flush it
+                    self._dirty = True
+            if j is None:
+                logger.warning('Discarding late reply ' + repr(response) + ' from ' + self.portName)
+                self.metrics.discarded()
+                self._dirty = True
+                continue
+            for q in queries[i:i + j]:
+                logger.warning('Reply to ' + repr(q) + ' from ' + self.portName + ' skipped')
+                self._missed(q, start)
+            i += j
+            self.metrics.replied(queries[i], len(line), time.perf_counter() - start)
+            responses[i] = response
+            i += 1
+        self._lastExchange = time.monotonic()
+        return responses
+
+    def _missed(self, query, start):
+        
+        self.metrics.replied(query, 0, time.perf_counter() - start)
+        self.errorCount += 1
+        self._dirty = True
+        # Its reply may still come, within the longest timeout
+        self._late[query.echo] = time.monotonic() + TIMEOUT
+
+    def _wasMissed(self, echo):
+        
+        return bool(self._late) and self._late.pop(echo, 0.) > time.monotonic()
+
+    def _open(self):
+        
+        self.ser = s.serial_for_url(self.portName,115200,s.EIGHTBITS,s.PARITY_NONE,s.STOPBITS_ONE, timeout=TIMEOUT)
+        self.reader = FrameReader(self.ser)
+        self._dirty = False
+        self._late = {}
+
+    def _lost(self, error):
+        
+        if self.connected:
+            logger.warning('Connection to ' + self.portName + ' lost: ' + str(error))
+            self._downSince = time.monotonic()
+        self.connected = False
+        # Invalidates the tracked positions and the cached channel
+        self.errorCount += 1
+        try:
+            self.ser.close()
+        except Exception:
+            pass
+
+    def _reconnect(self):
+        """Reopens a lost connection, with delays doubling from BACKOFFMIN up to BACKOFFMAX
+        between attempts, and writes the commands returned by :attr:`restore`.
+        Called holding the lock.
+
+        :raises AGUC8.errors.NotConnected: if the connection is not restored within
+            :attr:`resumeTimeout` seconds
+        """
+        deadline = time.monotonic() + self.resumeTimeout
+        delay = BACKOFFMIN
+        while True:
+            try:
+                self._open()
+                restore = [] if self.restore is None else [codec.encode(c) for c in self.restore()]
+                if restore:
+                    self._transfer(restore)
+                break
+            except (s.SerialException, OSError, ValueError) as e:
+                error = e
+                try:
+                    self.ser.close()
+                except Exception:
+                    pass
+            if time.monotonic() + delay > deadline:
+                raise NotConnected('Could not reconnect to {0} within {1} s: {2}'.format(
+                    self.portName, self.resumeTimeout, error))
+            time.sleep(delay)
+            delay = min(2*delay, BACKOFFMAX)
+        self.connected = True
+        down = time.monotonic() - self._downSince
+        self.metrics.reconnected(down)
+        logger.info('Reconnected to ' + self.portName + ' after ' + format(down, '.3f') + ' s')
+
+    def supervise(self, heartbeat=HEARTBEAT):
+        """Starts a thread that checks the connection with VE whenever no exchange went through
+        for heartbeat seconds, and restores it if it dropped. Without it, a drop is only noticed
+        and repaired by the next exchange.
+
+        :param heartbeat: Seconds without traffic before a check. Defaults to HEARTBEAT.
+        :heartbeat type: float, optional
+        """
+        if self._supervisor is not None and self._supervisor.is_alive():
+            return
+        self._unsupervise.clear()
+        self._supervisor = threading.Thread(target=self._supervise, args=(heartbeat,),
+                                            name='AGUC8 supervisor', daemon=True)
+        self._supervisor.start()
+
+    def unsupervise(self):
+        """Stops the thread started by :meth:`supervise` and waits for it.
+        """
+        self._unsupervise.set()
+        if self._supervisor is not None:
+            self._supervisor.join()
+            self._supervisor = None
+
+    def _supervise(self, heartbeat):
+        query = codec.frame('','VE')
+        while not self._unsupervise.is_set():
+            wait = self._lastExchange + heartbeat - time.monotonic()
+            if self.connected and wait > 0:
+                self._unsupervise.wait(wait)
+                continue
+            try:
+                reply, = self._exchange([query])
+                if not reply:
+                    with self.lock:
+                        self._lost(s.SerialException('no reply to ' + repr(query)))
+            except Exception as e:
+                logger.warning('Heartbeat failed: ' + str(e))
+                self._unsupervise.wait(heartbeat)
 
     def close(self):
         """Close serial connection.
         """
         logger.debug('Closing serial communication..')
+        self.unsupervise()
         self.ser.close()
         logger.info('Serial communication with ' + self.portName + ' is closed.')
     
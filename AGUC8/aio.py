@@ -0,0 +1,248 @@
+## @package aio
+# This module contains asyncio versions of :class:`AGPort` and :class:`AGUC8`.
+# Serial exchanges run on one executor thread per port while motions run the synchronous
+# driver on threads of their own, so a move in progress does not keep other coroutines
+# from using the port.
+#
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import logging
+
+from AGUC8.driver import AGUC8
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncAGPort(object):
+    """asyncio wrapper of :class:`AGUC8.agPort.AGPort`. Exchanges are executed in order on
+    a single worker thread owned by the port.
+
+    :param port: Opened port
+    :port type: :class:`AGUC8.agPort.AGPort`
+    """
+
+    def __init__(self, port):
+        """Constructor method
+        """
+        self.port = port
+        name = 'AGPort ' + str(getattr(port, 'portName', ''))
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=name)
+        # Runs stops, which must not queue behind the exchanges submitted to executor
+        self.urgentExecutor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=name + ' stop')
+
+    def amInull(self):
+        """Returns whether port has been successfully opened.
+
+        :return: True if port is open. False if not.
+        :rtype: bool
+        """
+        return self.port.amInull()
+
+    async def run(self, function, *args):
+        """Runs a blocking function that talks to the port on the port worker thread.
+
+        :param function: Function to run
+        :function type: callable
+        :return: Return value of function
+        """
+        return await asyncio.get_running_loop().run_in_executor(self.executor, function, *args)
+
+    async def runUrgent(self, function, *args):
+        """Runs a blocking function on the stop worker thread, without waiting for the functions
+        submitted with :meth:`run`. It should use :meth:`AGUC8.agPort.AGPort.sendUrgent`.
+
+        :param function: Function to run
+        :function type: callable
+        :return: Return value of function
+        """
+        return await asyncio.get_running_loop().run_in_executor(self.urgentExecutor, function, *args)
+
+    async def sendString(self, command):
+        """asyncio version of :meth:`AGUC8.agPort.AGPort.sendString`.
+        """
+        return await self.run(self.port.sendString, command)
+
+    async def sendBatch(self, commands):
+        """asyncio version of :meth:`AGUC8.agPort.AGPort.sendBatch`.
+        """
+        return await self.run(self.port.sendBatch, commands)
+
+    def close(self):
+        """Close serial connection and stop the port worker thread.
+        """
+        self.executor.shutdown(wait=True)
+        self.urgentExecutor.shutdown(wait=True)
+        self.port.close()
+
+
+class AsyncAGUC8(object):
+    """asyncio version of :class:`AGUC8.driver.AGUC8`. Takes the same parameters.
+    The controller is configured synchronously on construction.
+
+    Motion methods are serialized with each other and run the methods of the synchronous
+    driver on a thread of their own, while :meth:`stop` and status queries on the channel in
+    motion are served as soon as the port is free.
+    """
+
+    def __init__(self, *args, **kwargs):
+        """Constructor method
+        """
+        self.drv = AGUC8(*args, **kwargs)
+        self.port = AsyncAGPort(self.drv.port)
+        self.aliases = self.drv.aliases
+        self.defChannel = self.drv.defChannel
+        self._motion = asyncio.Lock()
+        self._motionChannel = None
+
+    def close(self):
+        """Close serial connection."""
+        self.drv.monitor.stop()
+        self.drv.saveState(force=True)
+        self.port.close()
+
+    async def chchch(self, ch):
+        """asyncio version of :meth:`AGUC8.driver.AGUC8.chchch`.
+        """
+        await self.port.run(self.drv.chchch, ch)
+
+    def moving(self, ch):
+        """Returns whether a motion is in progress on channel ch.
+        """
+        return self._motion.locked() and self._motionChannel == ch
+
+    def _checkPath(self):
+        if self.drv.path is not None and self.drv.path.running():
+            raise RuntimeError('A path is being followed')
+
+    async def _runMotion(self, ch, function, *args):
+        """Runs a motion method of the synchronous driver on a thread of its own, so status
+        queries are served while it runs.
+        """
+        self._checkPath()
+        async with self._motion:
+            self._motionChannel = ch
+            try:
+                return await asyncio.get_running_loop().run_in_executor(None, function, *args)
+            finally:
+                self._motionChannel = None
+
+    async def move(self, d1, d2, ch='def', concurrent=None):
+        """Relative move. See :meth:`AGUC8.driver.AGUC8.move`.
+        """
+        if ch == 'def':
+            ch = self.defChannel
+        await self._runMotion(ch, self.drv.move, d1, d2, ch, concurrent)
+
+    async def moveUpUp(self, ch='def', concurrent=None):
+        """Move to Axis 1 maximum, Axis 2 maximum.
+        """
+        if ch == 'def':
+            ch = self.defChannel
+        await self._runMotion(ch, self.drv.moveUpUp, ch, concurrent)
+
+    async def moveDownDown(self, ch='def', concurrent=None):
+        """Move to Axis 1 minimum, Axis 2 minimum.
+        """
+        if ch == 'def':
+            ch = self.defChannel
+        await self._runMotion(ch, self.drv.moveDownDown, ch, concurrent)
+
+    async def moveDownUp(self, ch='def', concurrent=None):
+        """Move to Axis 1 minimum, Axis 2 maximum.
+        """
+        if ch == 'def':
+            ch = self.defChannel
+        await self._runMotion(ch, self.drv.moveDownUp, ch, concurrent)
+
+    async def moveUpDown(self, ch='def', concurrent=None):
+        """Move to Axis 1 maximum, Axis 2 minimum.
+        """
+        if ch == 'def':
+            ch = self.defChannel
+        await self._runMotion(ch, self.drv.moveUpDown, ch, concurrent)
+
+    async def goToZero(self, ch='def', concurrent=None):
+        """Move to the zero position. See :meth:`AGUC8.driver.AGUC8.goToZero`.
+        """
+        if ch == 'def':
+            ch = self.defChannel
+        await self._runMotion(ch, self.drv.goToZero, ch, concurrent)
+
+    async def setZero(self, ch='def'):
+        """Set the zero position to the current position.
+        """
+        if ch == 'def':
+            ch = self.defChannel
+        self._checkPath()
+        async with self._motion:
+            await self.port.run(self.drv.setZero, ch)
+
+    async def positions(self, ch='def'):
+        """Step counters of both axes. See :meth:`AGUC8.driver.AGUC8.positions`.
+        Returns at once when the counters are tracked. Otherwise served during a motion on
+        the same channel, or after the motion ends.
+        """
+        if ch == 'def':
+            ch = self.defChannel
+        axes = [self.drv.channels[ch][alias] for alias in self.aliases]
+        if all(a.positionKnown() for a in axes):
+            return {alias: a.position() for alias, a in zip(self.aliases, axes)}
+        if self.moving(ch):
+            return await self.port.run(self.drv.positions, ch)
+        async with self._motion:
+            return await self.port.run(self.drv.positions, ch)
+
+    async def queryStatus(self, ch='def'):
+        """Axis status codes. See :meth:`AGUC8.driver.AGUC8.queryStatus`.
+        Served during a motion on the same channel; waits for the motion to end otherwise.
+        """
+        if ch == 'def':
+            ch = self.defChannel
+        snapshot = self.drv.monitor.fresh()
+        if snapshot is not None and snapshot.channel == ch and None not in snapshot.status.values():
+            return dict(snapshot.status)
+        if self.drv._channel is not None and self.drv._channel != ch and self._motionChannel != ch:
+            # The controller only drives the active channel, so the axes of any other channel are still
+            return {alias: 0 for alias in self.aliases}
+        if self.moving(ch):
+            return await self.port.run(self.drv.queryStatus, ch)
+        async with self._motion:
+            return await self.port.run(self.drv.queryStatus, ch)
+
+    async def stop(self, ch='def'):
+        """Stop ongoing motion. See :meth:`AGUC8.driver.AGUC8.stop`. Runs on the stop worker
+        thread, so it neither queues behind the exchanges of other coroutines nor waits for a
+        motion in progress to finish.
+        """
+        logger.info('Stopping ongoing motion')
+        await self.port.runUrgent(self.drv.stop, ch)
+
+    async def scan(self, points, ch='def', dwell=0., hook=None, measure=True, relative=True):
+        """Visits a list of points. See :meth:`AGUC8.driver.AGUC8.scan`.
+        The scan runs on its own thread, so status queries are served while it runs.
+        """
+        if ch == 'def':
+            ch = self.defChannel
+        return await self._runMotion(ch, self.drv.scan, points, ch, dwell, hook, measure, relative)
+
+    async def optimize(self, objective, method='pattern', ch='def', step=50, tol=1, budget=200, maximize=True,
+                       dwell=0.):
+        """Moves to the extremum of an objective. See :meth:`AGUC8.driver.AGUC8.optimize`.
+        The optimization runs on its own thread, so status queries are served while it runs.
+        """
+        if ch == 'def':
+            ch = self.defChannel
+        return await self._runMotion(ch, self.drv.optimize, objective, method, ch, step, tol, budget, maximize,
+                                     dwell)
+
+    def followApath(self, path, ch='def'):
+        """Follow a path of relative moves in a background thread.
+        See :meth:`AGUC8.driver.AGUC8.followApath`.
+
+        :return: Runner of the path
+        :rtype: :class:`AGUC8.path.PathRunner`
+        """
+        if self._motion.locked():
+            raise RuntimeError('A motion is in progress')
+        return self.drv.followApath(path, ch)
@@ -1,13 +1,26 @@
 #!/usr/bin/env python3
 
 import argparse
+import asyncio
+import importlib
+from concurrent.futures import ThreadPoolExecutor
 import logging
+import os
 import sys
 
-from sipyco.pc_rpc import simple_server_loop
-from sipyco import common_args
+from sipyco.pc_rpc import Server
+from sipyco.sync_struct import Publisher
+from sipyco import common_args, pyon
 
 from AGUC8 import driver
+from AGUC8 import aio
+from AGUC8 import scan as scans
+from AGUC8 import optimize as optimizers
+from AGUC8.errors import NotConnected
+from AGUC8.lease import Leases, DURATION
+from AGUC8.motion import Motions
+from AGUC8.scheduler import ChannelScheduler, STATUS
+from AGUC8.state import StatePublisher, INTERVAL
 
 logger = logging.getLogger(__name__)
 
@@ -20,69 +33,317 @@ class Motor():
     :param port: Serial port (Uses pySerial serial_for_url)
     Defaults to None if not specified. In that case, it will use self.port.
     :port type: str, optional
+    :param options: Further keyword arguments given to :class:`AGUC8.driver.AGUC8`
     """
 
-    def __init__(self, port=None):
+    def __init__(self, port=None, **options):
         """Constructor method
         """
         if port is None:
             self.port = "socket://192.168.1.220:10001"
         else:
             self.port = port
+        self.options = options
         self._connect()
 
     def _connect(self):
-        self.drv = driver.AGUC8(self.port)
+        self.drv = driver.AGUC8(self.port, **self.options)
 
-    def move(self, d1, d2):
+    def move(self, d1, d2, ch='def'):
         """Moves to the relative location specified by coordinates (d1,d2).
         
         :param d1: Axis 1 relative location
         :d1 type: int
         :param d2: Axis 2 relative location
         :d2 type: int
+        :param ch: Channel number. Defaults to 'def', the first active channel.
+        :ch type: str, optional
         """
-        self.drv.move(d1, d2)
+        self.drv.move(d1, d2, ch)
 
-    def moveUpUp(self):
+    def moveUpUp(self, ch='def'):
         """Moves to Axis 1 maximum, Axis 2 maximum.
+
+        :param ch: Channel number. Defaults to 'def', the first active channel.
+        :ch type: str, optional
         """
-        self.drv.moveUpUp()
+        self.drv.moveUpUp(ch)
 
-    def moveDownDown(self):
+    def moveDownDown(self, ch='def'):
         """Moves to Axis 1 minimum, Axis 2 minimum.
+
+        :param ch: Channel number. Defaults to 'def', the first active channel.
+        :ch type: str, optional
         """
-        self.drv.moveDownDown()
+        self.drv.moveDownDown(ch)
 
-    def moveDownUp(self):
+    def moveDownUp(self, ch='def'):
         """Moves to Axis 1 minimum, Axis 2 maximum.
+
+        :param ch: Channel number. Defaults to 'def', the first active channel.
+        :ch type: str, optional
         """
-        self.drv.moveDownUp()
+        self.drv.moveDownUp(ch)
 
-    def moveUpDown(self):
+    def moveUpDown(self, ch='def'):
         """Moves to Axis 1 maximum, Axis 2 minimum.
+
+        :param ch: Channel number. Defaults to 'def', the first active channel.
+        :ch type: str, optional
         """
-        self.drv.moveUpDown()
+        self.drv.moveUpDown(ch)
 
-    def goToZero(self):
+    def goToZero(self, ch='def'):
         """Moves to the the zero position. If this point has not been specified, it moves to
         the initial position of the device when powered on.
+
+        :param ch: Channel number. Defaults to 'def', the first active channel.
+        :ch type: str, optional
+        """
+        self.drv.goToZero(ch)
+
+    def setZero(self, ch='def'):
+        """Set the zero position to the current position.
+
+        :param ch: Channel number. Defaults to 'def', the first active channel.
+        :ch type: str, optional
         """
-        self.drv.goToZero()
+        self.drv.setZero(ch)
+
+    def stop(self, ch='def'):
+        """Stops ongoing motion.
 
-    def setZero(self):
+        :param ch: Channel number. Defaults to 'def', the first active channel.
+        :ch type: str, optional
         """
-        Set the zero position to the current position.
+        self.drv.stop(ch)
+
+    def get_status(self, ch='def'):
+        """Returns the status code of each axis: 0 ready, 1 stepping, 2 jogging, 3 moving to limit.
+
+        :param ch: Channel number. Defaults to 'def', the first active channel.
+        :ch type: str, optional
+        :return: Status code by axis alias
+        :rtype: dict
+        """
+        return self.drv.queryStatus(ch)
+
+    def get_position(self, ch='def'):
+        """Returns the step counter of each axis. Counters are tracked by the driver and only
+        read from the controller when they became uncertain.
+
+        :param ch: Channel number. Defaults to 'def', the first active channel.
+        :ch type: str, optional
+        :return: Step counter by axis alias
+        :rtype: dict
         """
-        self.drv.setZero()
+        return self.drv.positions(ch)
 
-    def followApath(self, path):
-        """Sequentially moves to each relative location specified in path.
+    def get_eta(self, ch='def'):
+        """Returns the predicted time until the moves in progress end.
+
+        :param ch: Channel number. Defaults to 'def', the first active channel.
+        :ch type: str, optional
+        :return: Seconds until the end of the move of each axis, by alias. None for limit moves.
+        :rtype: dict
+        """
+        return self.drv.eta(ch)
+
+    def followApath(self, path, ch='def'):
+        """Starts moving sequentially to each relative location specified in path.
+        Returns without waiting, see :meth:`path_progress`.
         
         :param path: List of tuples specifying the coordinates of each relative move.
         :path type: list
+        :param ch: Channel number. Defaults to 'def', the first active channel.
+        :ch type: str, optional
+        """
+        self.drv.followApath(path, ch)
+
+    def point_scan(self, points, ch='def', dwell=0., hook=None, measure=True):
+        """Visits each point in turn, in a single call. See :func:`AGUC8.scan.run`.
+
+        :param points: Points (d1, d2), offsets from the current position
+        :points type: list or numpy.ndarray
+        :param ch: Channel number. Defaults to 'def', the first active channel.
+        :ch type: str, optional
+        :param dwell: Seconds to wait at each point. Defaults to 0.
+        :dwell type: float, optional
+        :param hook: Name of a hook registered on the server with :func:`AGUC8.scan.register`,
+            called at each point. Defaults to None.
+        :hook type: str, optional
+        :param measure: Whether to read the step counters at each point. Defaults to True.
+        :measure type: bool, optional
+        :return: NumPy arrays commanded and measured (step counters, shape (N, 2)), time and values
+        :rtype: dict
+        """
+        return self.drv.scan(points, ch, dwell, hook, measure)
+
+    def raster_scan(self, n1, n2, step1, step2=None, ch='def', dwell=0., hook=None, measure=True):
+        """Serpentine raster scan of n1 x n2 points, step1 and step2 steps apart, centred on the
+        current position. See :meth:`point_scan`.
+        """
+        return self.point_scan(scans.raster(n1, n2, step1, step2), ch, dwell, hook, measure)
+
+    def spiral_scan(self, n, step1, step2=None, ch='def', dwell=0., hook=None, measure=True):
+        """Square spiral scan of n points, step1 and step2 steps apart, going out from the
+        current position. See :meth:`point_scan`.
+        """
+        return self.point_scan(scans.spiral(n, step1, step2), ch, dwell, hook, measure)
+
+    def list_hooks(self):
+        """Returns the names of the scan hooks registered on the server.
+
+        :rtype: list
+        """
+        return sorted(scans.hooks)
+
+    def optimize(self, objective, method='pattern', ch='def', step=50, tol=1, budget=200, maximize=True, dwell=0.):
+        """Moves the axes of a channel to the extremum of a measured objective in a single call.
+        Each reading costs one move and one measurement, with no client round trip.
+
+        :param objective: Name of an objective registered on the server with
+            :func:`AGUC8.optimize.register`, {'rpc': {'host': ..., 'port': ..., 'target': ...,
+            'method': ...}} to read a sipyco RPC target, or {'gaussian': {...}} for a simulated beam
+        :objective type: str or dict
+        :param method: 'coordinate', 'pattern' or 'neldermead'. Defaults to 'pattern'.
+        :method type: str, optional
+        :param ch: Channel number. Defaults to 'def', the first active channel.
+        :ch type: str, optional
+        :param step: Initial step size in steps. Defaults to 50.
+        :step type: int, optional
+        :param tol: Smallest step size in steps. Defaults to 1.
+        :tol type: int, optional
+        :param budget: Largest number of readings. Defaults to 200.
+        :budget type: int, optional
+        :param maximize: Whether to maximize rather than minimize. Defaults to True.
+        :maximize type: bool, optional
+        :param dwell: Seconds to wait at each point before reading. Defaults to 0.
+        :dwell type: float, optional
+        :return: See :func:`AGUC8.optimize.run`
+        :rtype: dict
+        """
+        return self.drv.optimize(objective, method, ch, step, tol, budget, maximize, dwell)
+
+    def list_objectives(self):
+        """Returns the names of the optimizer objectives registered on the server.
+
+        :rtype: list
+        """
+        return sorted(optimizers.objectives)
+
+    def move_units(self, u1, u2, ch='def'):
+        """Relative move in the physical units of the calibration. See :meth:`AGUC8.driver.AGUC8.moveUnits`.
+
+        :param u1: Axis 1 relative location
+        :u1 type: float
+        :param u2: Axis 2 relative location
+        :u2 type: float
+        :param ch: Channel number. Defaults to 'def', the first active channel.
+        :ch type: str, optional
+        """
+        self.drv.moveUnits(u1, u2, ch)
+
+    def followApath_units(self, path, ch='def'):
+        """Starts following a path of relative moves in the physical units of the calibration.
+        See :meth:`followApath`.
+        """
+        self.followApath(self.drv.toSteps(path, ch), ch)
+
+    def get_calibration(self):
+        """Returns the step size calibration: units, and by channel, axis number and step
+        amplitude, the (plus, minus) step sizes.
+
+        :rtype: dict
+        """
+        return self.drv.calibration.asdict()
+
+    def set_step_size(self, ch, axis, amp, plus, minus):
+        """Sets the step sizes of an axis at a step amplitude, in physical units per step.
+
+        :param ch: Channel number
+        :ch type: str
+        :param axis: Axis number, '1' or '2'
+        :axis type: str
+        :param amp: Step amplitude
+        :amp type: int
+        :param plus: Size of a step in the + direction
+        :plus type: float
+        :param minus: Size of a step in the - direction
+        :minus type: float
+        """
+        self.drv.calibration.axis(ch, axis).set(amp, plus, minus)
+
+    def save_calibration(self, filename):
+        """Saves the calibration to a file on the controller host, to be given back as the
+        ``calibration`` option.
+
+        :param filename: File name
+        :filename type: str
+        """
+        self.drv.calibration.save(filename)
+
+    def path_progress(self):
+        """Returns the progress of the last path started with :meth:`followApath`.
+
+        :return: Progress, see :meth:`AGUC8.path.PathRunner.progress`. None if no path was started.
+        :rtype: dict
+        """
+        if self.drv.path is None:
+            return None
+        return self.drv.path.progress()
+
+    def get_snapshot(self):
+        """Returns the latest status polled from the controller without querying it: time
+        (monotonic seconds), channel, limits (PH bit field) and status (TS code by axis alias).
+        See :class:`AGUC8.monitor.Snapshot`.
+
+        :rtype: dict
         """
-        self.drv.followApath(self, path)
+        return self.drv.monitor.snapshot().asdict()
+
+    def get_metrics(self):
+        """Returns a snapshot of the instrumentation: per command mnemonic counts, write times,
+        round trip latency histograms, timeouts and bytes in and out, TS polls per move and
+        the durations of whole operations. See :class:`AGUC8.metrics.Metrics`.
+
+        :rtype: dict
+        """
+        return self.drv.port.metrics.snapshot()
+
+    def reset_metrics(self):
+        """Clears the instrumentation counters and histograms.
+        """
+        self.drv.port.metrics.reset()
+
+    def metrics_text(self, labels=None):
+        """Returns the instrumentation in the Prometheus text exposition format.
+
+        :param labels: Labels added to every sample, e.g. {'controller': 'mirror1'}
+        :labels type: dict, optional
+        :rtype: str
+        """
+        return self.drv.port.metrics.prometheus(labels=labels)
+
+    def start_trace(self, capacity=1 << 20):
+        """Starts recording the frames exchanged with the controller in a ring buffer of
+        capacity bytes. See :meth:`AGUC8.agPort.AGPort.startTrace`.
+        """
+        self.drv.port.startTrace(capacity)
+
+    def save_trace(self, filename, stop=False):
+        """Saves the recorded frames to a file on the controller host, to be replayed with
+        ``python -m AGUC8.trace replay FILE`` or opened as ``replay://FILE``.
+
+        :param filename: File name
+        :filename type: str
+        :param stop: Stop recording after saving. Defaults to False.
+        :stop type: bool, optional
+        """
+        recorder = self.drv.port.stopTrace() if stop else self.drv.port.recorder
+        if recorder is None:
+            raise RuntimeError('Tracing is off, call start_trace first')
+        recorder.save(filename)
 
     def close(self):
         """Close serial connection.
@@ -90,32 +351,543 @@ class Motor():
         self.drv.close()
 
 
+class AsyncMotor(Motor):
+    """:class:`Motor` served by the asyncio RPC server. Motions wait without blocking the
+    server, so :meth:`stop` and :meth:`get_status` are answered while a motion is in progress.
+
+    Operations are queued in a :class:`AGUC8.scheduler.ChannelScheduler`, which groups them by
+    channel to minimize channel switches. :meth:`stop` bypasses the queue, status and position
+    reads are answered without switching channel whenever possible and otherwise go ahead of
+    the queued motions.
+
+    Clients sharing the controller can reserve a channel with :meth:`lease`. Motions on a leased
+    channel are refused unless given the token of the lease as their lease argument; stops and
+    status reads are always served.
+
+    The ``*_async`` methods queue a motion and return its id at once, so that an experiment can
+    do other work while the motors travel. The id is then given to :meth:`status`, :meth:`wait`
+    and :meth:`cancel`.
+
+    :param port: Serial port (Uses pySerial serial_for_url)
+    :port type: str, optional
+    """
+
+    def _connect(self):
+        self.adrv = aio.AsyncAGUC8(self.port, **self.options)
+        self.drv = self.adrv.drv
+        ## Channel leases, see :class:`AGUC8.lease.Leases`
+        self.leases = Leases()
+        self.scheduler = ChannelScheduler(self.drv._channel, self.drv.port.metrics, self.leases)
+        ## Motions queued by the *_async methods, see :class:`AGUC8.motion.Motions`
+        self.motions = Motions()
+
+    def _ch(self, ch):
+        return self.drv.defChannel if ch == 'def' else str(ch)
+
+    async def move(self, d1, d2, ch='def', lease=None):
+        """Moves to the relative location specified by coordinates (d1,d2).
+
+        :param d1: Axis 1 relative location
+        :d1 type: int
+        :param d2: Axis 2 relative location
+        :d2 type: int
+        :param ch: Channel number. Defaults to 'def', the first active channel.
+        :ch type: str, optional
+        :param lease: Token of the lease of the channel, see :meth:`lease`. Defaults to None.
+        :lease type: str, optional
+        """
+        ch = self._ch(ch)
+        await self.scheduler.submit(ch, self.adrv.move, d1, d2, ch, lease=lease)
+
+    async def moveUpUp(self, ch='def', lease=None):
+        """Moves to Axis 1 maximum, Axis 2 maximum.
+
+        :param ch: Channel number. Defaults to 'def', the first active channel.
+        :ch type: str, optional
+        :param lease: Token of the lease of the channel, see :meth:`lease`. Defaults to None.
+        :lease type: str, optional
+        """
+        ch = self._ch(ch)
+        await self.scheduler.submit(ch, self.adrv.moveUpUp, ch, lease=lease)
+
+    async def moveDownDown(self, ch='def', lease=None):
+        """Moves to Axis 1 minimum, Axis 2 minimum.
+
+        :param ch: Channel number. Defaults to 'def', the first active channel.
+        :ch type: str, optional
+        :param lease: Token of the lease of the channel, see :meth:`lease`. Defaults to None.
+        :lease type: str, optional
+        """
+        ch = self._ch(ch)
+        await self.scheduler.submit(ch, self.adrv.moveDownDown, ch, lease=lease)
+
+    async def moveDownUp(self, ch='def', lease=None):
+        """Moves to Axis 1 minimum, Axis 2 maximum.
+
+        :param ch: Channel number. Defaults to 'def', the first active channel.
+        :ch type: str, optional
+        :param lease: Token of the lease of the channel, see :meth:`lease`. Defaults to None.
+        :lease type: str, optional
+        """
+        ch = self._ch(ch)
+        await self.scheduler.submit(ch, self.adrv.moveDownUp, ch, lease=lease)
+
+    async def moveUpDown(self, ch='def', lease=None):
+        """Moves to Axis 1 maximum, Axis 2 minimum.
+
+        :param ch: Channel number. Defaults to 'def', the first active channel.
+        :ch type: str, optional
+        :param lease: Token of the lease of the channel, see :meth:`lease`. Defaults to None.
+        :lease type: str, optional
+        """
+        ch = self._ch(ch)
+        await self.scheduler.submit(ch, self.adrv.moveUpDown, ch, lease=lease)
+
+    async def goToZero(self, ch='def', lease=None):
+        """Moves to the the zero position. If this point has not been specified, it moves to
+        the initial position of the device when powered on.
+
+        :param ch: Channel number. Defaults to 'def', the first active channel.
+        :ch type: str, optional
+        :param lease: Token of the lease of the channel, see :meth:`lease`. Defaults to None.
+        :lease type: str, optional
+        """
+        ch = self._ch(ch)
+        await self.scheduler.submit(ch, self.adrv.goToZero, ch, lease=lease)
+
+    async def setZero(self, ch='def', lease=None):
+        """Set the zero position to the current position.
+
+        :param ch: Channel number. Defaults to 'def', the first active channel.
+        :ch type: str, optional
+        :param lease: Token of the lease of the channel, see :meth:`lease`. Defaults to None.
+        :lease type: str, optional
+        """
+        ch = self._ch(ch)
+        await self.scheduler.submit(ch, self.adrv.setZero, ch, lease=lease)
+
+    async def stop(self, ch='def'):
+        """Stops ongoing motion. Does not wait for queued operations.
+
+        :param ch: Channel number. Defaults to 'def', the first active channel.
+        :ch type: str, optional
+        """
+        await self.adrv.stop(self._ch(ch))
+
+    async def get_position(self, ch='def'):
+        """Returns the step counter of each axis. Counters are tracked by the driver and only
+        read from the controller when they became uncertain: during a motion on the channel
+        they are read at once, otherwise ahead of the queued motions.
+
+        :param ch: Channel number. Defaults to 'def', the first active channel.
+        :ch type: str, optional
+        :return: Step counter by axis alias
+        :rtype: dict
+        """
+        ch = self._ch(ch)
+        axes = [self.drv.channels[ch][alias] for alias in self.drv.aliases]
+        if all(a.positionKnown() for a in axes):
+            return self.drv.positions(ch)
+        if self.adrv.moving(ch):
+            # Read in between the polls of the motion rather than after it
+            return await self.adrv.positions(ch)
+        return await self.scheduler.submit(ch, self.adrv.positions, ch, priority=STATUS)
+
+    async def get_status(self, ch='def'):
+        """Returns the status code of each axis: 0 ready, 1 stepping, 2 jogging, 3 moving to limit.
+
+        :param ch: Channel number. Defaults to 'def', the first active channel.
+        :ch type: str, optional
+        :return: Status code by axis alias
+        :rtype: dict
+        """
+        return await self.adrv.queryStatus(self._ch(ch))
+
+    async def point_scan(self, points, ch='def', dwell=0., hook=None, measure=True, lease=None):
+        """Visits each point in turn, in a single call. See :meth:`Motor.point_scan`.
+        """
+        ch = self._ch(ch)
+        return await self.scheduler.submit(ch, self.adrv.scan, points, ch, dwell, hook, measure, lease=lease)
+
+    async def raster_scan(self, n1, n2, step1, step2=None, ch='def', dwell=0., hook=None, measure=True, lease=None):
+        """Serpentine raster scan. See :meth:`Motor.raster_scan`.
+        """
+        return await self.point_scan(scans.raster(n1, n2, step1, step2), ch, dwell, hook, measure, lease)
+
+    async def spiral_scan(self, n, step1, step2=None, ch='def', dwell=0., hook=None, measure=True, lease=None):
+        """Square spiral scan. See :meth:`Motor.spiral_scan`.
+        """
+        return await self.point_scan(scans.spiral(n, step1, step2), ch, dwell, hook, measure, lease)
+
+    async def move_units(self, u1, u2, ch='def', lease=None):
+        """Relative move in physical units. See :meth:`Motor.move_units`.
+        """
+        ch = self._ch(ch)
+        d1, d2 = (int(d) for d in self.drv.toSteps((u1, u2), ch))
+        await self.scheduler.submit(ch, self.adrv.move, d1, d2, ch, lease=lease)
+
+    async def optimize(self, objective, method='pattern', ch='def', step=50, tol=1, budget=200, maximize=True,
+                       dwell=0., lease=None):
+        """Moves to the extremum of an objective. See :meth:`Motor.optimize`.
+        """
+        ch = self._ch(ch)
+        return await self.scheduler.submit(ch, self.adrv.optimize, objective, method, ch, step, tol, budget,
+                                           maximize, dwell, lease=lease)
+
+    def followApath(self, path, ch='def', lease=None):
+        """Starts moving sequentially to each relative location specified in path.
+        Returns without waiting, see :meth:`path_progress`.
+
+        :param path: List of tuples specifying the coordinates of each relative move.
+        :path type: list
+        :param ch: Channel number. Defaults to 'def', the first active channel.
+        :ch type: str, optional
+        :param lease: Token of the lease of the channel, see :meth:`lease`. Defaults to None.
+        :lease type: str, optional
+        """
+        ch = self._ch(ch)
+        self.leases.check(ch, lease)
+        self.adrv.followApath(path, ch)
+
+    def followApath_units(self, path, ch='def', lease=None):
+        """Starts following a path of relative moves in the physical units of the calibration.
+        See :meth:`followApath`.
+        """
+        ch = self._ch(ch)
+        self.followApath(self.drv.toSteps(path, ch), ch, lease)
+
+    def _start(self, operation, ch, function, *args, lease=None):
+        return self.motions.start(operation, ch, self.scheduler, function, *args, lease=lease)
+
+    def move_async(self, d1, d2, ch='def', lease=None):
+        """Queues a relative move, see :meth:`move`, and returns without waiting.
+
+        :return: Motion id
+        :rtype: int
+        """
+        ch = self._ch(ch)
+        return self._start('move', ch, self.adrv.move, d1, d2, ch, lease=lease)
+
+    def move_units_async(self, u1, u2, ch='def', lease=None):
+        """Queues a relative move in physical units, see :meth:`Motor.move_units`, and returns
+        without waiting.
+
+        :return: Motion id
+        :rtype: int
+        """
+        ch = self._ch(ch)
+        d1, d2 = (int(d) for d in self.drv.toSteps((u1, u2), ch))
+        return self._start('move_units', ch, self.adrv.move, d1, d2, ch, lease=lease)
+
+    def moveUpUp_async(self, ch='def', lease=None):
+        """Queues a move to Axis 1 maximum, Axis 2 maximum and returns without waiting.
+
+        :return: Motion id
+        :rtype: int
+        """
+        ch = self._ch(ch)
+        return self._start('moveUpUp', ch, self.adrv.moveUpUp, ch, lease=lease)
+
+    def moveDownDown_async(self, ch='def', lease=None):
+        """Queues a move to Axis 1 minimum, Axis 2 minimum and returns without waiting.
+
+        :return: Motion id
+        :rtype: int
+        """
+        ch = self._ch(ch)
+        return self._start('moveDownDown', ch, self.adrv.moveDownDown, ch, lease=lease)
+
+    def moveDownUp_async(self, ch='def', lease=None):
+        """Queues a move to Axis 1 minimum, Axis 2 maximum and returns without waiting.
+
+        :return: Motion id
+        :rtype: int
+        """
+        ch = self._ch(ch)
+        return self._start('moveDownUp', ch, self.adrv.moveDownUp, ch, lease=lease)
+
+    def moveUpDown_async(self, ch='def', lease=None):
+        """Queues a move to Axis 1 maximum, Axis 2 minimum and returns without waiting.
+
+        :return: Motion id
+        :rtype: int
+        """
+        ch = self._ch(ch)
+        return self._start('moveUpDown', ch, self.adrv.moveUpDown, ch, lease=lease)
+
+    def goToZero_async(self, ch='def', lease=None):
+        """Queues a move to the zero position and returns without waiting.
+
+        :return: Motion id
+        :rtype: int
+        """
+        ch = self._ch(ch)
+        return self._start('goToZero', ch, self.adrv.goToZero, ch, lease=lease)
+
+    def status(self, id):
+        """Returns the status of a motion queued by an ``*_async`` method.
+
+        :param id: Motion id
+        :id type: int
+        :return: id, operation, channel, state ('queued', 'running', 'done', 'failed' or
+            'cancelled'), submitted, started and finished times, result and error
+        :rtype: dict
+        """
+        return self.motions.get(id).status()
+
+    async def wait(self, id, timeout=None):
+        """Waits for a motion to end. Raises the error of the motion if it failed.
+
+        :param id: Motion id
+        :id type: int
+        :param timeout: Seconds to wait at most. Defaults to None (no limit).
+        :timeout type: float, optional
+        :return: Status of the motion, see :meth:`status`. Still queued or running if the timeout
+            expired.
+        :rtype: dict
+        """
+        return await self.motions.wait(id, timeout)
+
+    async def cancel(self, id):
+        """Cancels a motion. A queued motion is taken off the queue; a running one is stopped,
+        see :meth:`stop`.
+
+        :param id: Motion id
+        :id type: int
+        :return: Status of the motion once it ended
+        :rtype: dict
+        """
+        return await self.motions.cancel(id, self.adrv.stop)
+
+    async def lease(self, ch='def', duration=DURATION, owner=None, wait=0.):
+        """Reserves the motions of a channel. The lease expires after duration seconds unless
+        renewed, see :meth:`renew_lease`.
+
+        :param ch: Channel number. Defaults to 'def', the first active channel.
+        :ch type: str, optional
+        :param duration: Seconds until the lease expires. Defaults to 60.
+        :duration type: float, optional
+        :param owner: Name of the holder, shown to the clients that are refused. Defaults to None.
+        :owner type: str, optional
+        :param wait: Seconds to wait for a lease held by another client to end. Defaults to 0.
+        :wait type: float, optional
+        :return: Token of the lease, to give as the lease argument of the motions
+        :rtype: str
+        """
+        return await self.leases.acquire(self._ch(ch), duration, owner, wait)
+
+    def renew_lease(self, token, duration=DURATION):
+        """Extends a lease to duration seconds from now.
+
+        :param token: Token returned by :meth:`lease`
+        :token type: str
+        :param duration: Seconds until the lease expires. Defaults to 60.
+        :duration type: float, optional
+        """
+        self.leases.renew(token, duration)
+
+    async def release_lease(self, token):
+        """Ends a lease.
+
+        :param token: Token returned by :meth:`lease`
+        :token type: str
+        """
+        await self.leases.release(token)
+
+    def list_leases(self):
+        """Returns the leases in force: channel, owner, granted time and remaining seconds.
+
+        :rtype: list
+        """
+        return [lease.status() for lease in self.leases.all()]
+
+    def list_motions(self):
+        """Returns the status of the motions that did not end and of the last finished ones,
+        oldest first.
+
+        :rtype: list
+        """
+        return [m.status() for m in self.motions.all()]
+
+    def close(self):
+        """Close serial connection.
+        """
+        self.scheduler.close()
+        self.adrv.close()
+
+
+class Broadcast():
+    """Operations applied to every controller served by the process, served as the "all" target.
+    Each controller runs the operation on its own port worker thread, so they proceed in parallel.
+
+    :param motors: Controllers by target name
+    :motors type: dict
+    """
+
+    def __init__(self, motors):
+        """Constructor method
+        """
+        self.motors = motors
+
+    def list_controllers(self):
+        """Returns the target names of the controllers.
+
+        :rtype: list
+        """
+        return sorted(self.motors)
+
+    async def _all(self, method):
+        names = sorted(self.motors)
+        results = await asyncio.gather(*[getattr(self.motors[n], method)() for n in names],
+                                       return_exceptions=True)
+        for n, r in zip(names, results):
+            if isinstance(r, Exception):
+                logger.error("%s failed on %s: %r", method, n, r)
+        for r in results:
+            if isinstance(r, Exception):
+                raise r
+        return dict(zip(names, results))
+
+    async def stop_all(self):
+        """Stops ongoing motion on every controller.
+        """
+        await self._all("stop")
+
+    async def setZero_all(self):
+        """Sets the zero position to the current position on every controller.
+        """
+        await self._all("setZero")
+
+    async def goToZero_all(self):
+        """Moves every controller to its zero position.
+        """
+        await self._all("goToZero")
+
+    async def get_position_all(self):
+        """Returns the step counters of every controller.
+
+        :return: Step counter by axis alias, by target name
+        :rtype: dict
+        """
+        return await self._all("get_position")
+
+
 def get_argparser():
     parser = argparse.ArgumentParser(description="""Agilis AG-UC8 controller.
 
     Use this controller to drive the AG-UC8 piezo motor controller.""")
     common_args.simple_network_args(parser, 3251)
-    parser.add_argument("-s", "--serialPort", default=None,
-                        help="Serial port. See documentation for how to specify port.")
+    parser.add_argument("-s", "--serialPort", default=[], action="append",
+                        help="Serial port. See documentation for how to specify port. "
+                        "Can be given several times to serve several controllers, "
+                        "as NAME=PORT to choose the name of the RPC target.")
+    parser.add_argument("-c", "--config", default=None,
+                        help="pyon file mapping RPC target names to a serial port or to a "
+                        "dictionary of AGUC8 driver arguments including 'port'.")
+    parser.add_argument("-m", "--monitor", default=None, type=float,
+                        help="Seconds between the status polls of a background monitor. "
+                        "Status calls are then answered from its latest poll.")
+    parser.add_argument("--heartbeat", default=None, type=float, metavar="SECONDS",
+                        help="Seconds without traffic after which the connection is checked and, "
+                        "if it dropped, reopened with the controller configuration restored.")
+    parser.add_argument("--state-dir", default=None, metavar="DIR",
+                        help="Directory in which each controller keeps its configuration and "
+                        "step counters between runs, as NAME.json, for a fast warm start.")
+    parser.add_argument("--publish", default=None, type=int, metavar="PORT",
+                        help="TCP port on which to publish the live state of the controllers "
+                        "with sync_struct, one notifier per RPC target name.")
+    parser.add_argument("--publish-interval", default=INTERVAL, type=float, metavar="SECONDS",
+                        help="Shortest time between two state updates (default: %(default)s)")
+    parser.add_argument("--hooks", default=[], action="append", metavar="MODULE",
+                        help="Python module to import at startup, which registers scan hooks "
+                        "with AGUC8.scan.register or optimizer objectives with "
+                        "AGUC8.optimize.register. Can be given several times.")
     common_args.verbosity_args(parser)
     return parser
 
 
+def get_controllers(args):
+    """Returns the options of each controller given on the command line, by target name.
+    """
+    controllers = {}
+    if args.config is not None:
+        for name, options in pyon.load_file(args.config).items():
+            if isinstance(options, str):
+                options = {"port": options}
+            controllers[name] = dict(options)
+    unnamed = [p for p in args.serialPort if "=" not in p.split("://")[0]]
+    for port in args.serialPort:
+        if port in unnamed:
+            name = "AGUC8" if len(unnamed) == 1 else "AGUC8_" + str(unnamed.index(port) + 1)
+        else:
+            name, port = port.split("=", 1)
+        controllers[name] = {"port": port}
+    if args.monitor is not None:
+        for options in controllers.values():
+            options.setdefault("monitor", args.monitor)
+    if args.heartbeat is not None:
+        for options in controllers.values():
+            options.setdefault("heartbeat", args.heartbeat)
+    if args.state_dir is not None:
+        for name, options in controllers.items():
+            options.setdefault("state", os.path.join(args.state_dir, name + ".json"))
+    return controllers
+
+
 def main():
     args = get_argparser().parse_args()
     common_args.init_logger_from_args(args)
 
-    if not args.serialPort:
-        print("You need to specify -s")
+    for module in args.hooks:
+        importlib.import_module(module)
+    controllers = get_controllers(args)
+    if not controllers:
+        print("You need to specify -s or -c")
+        sys.exit(1)
+    if "all" in controllers:
+        print("'all' is reserved for the broadcast target")
         sys.exit(1)
 
-    motor = Motor(args.serialPort)
-    
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    # Controllers are configured in parallel
+    with ThreadPoolExecutor(max_workers=len(controllers)) as pool:
+        futures = {name: pool.submit(AsyncMotor, **options) for name, options in controllers.items()}
+    motors = {}
     try:
-        logger.info("AG-UC8 open. Serving...")
-        simple_server_loop({"AGUC8": motor}, common_args.bind_address_from_args(args), args.port)
+        for name, future in futures.items():
+            try:
+                motors[name] = future.result()
+            except NotConnected as e:
+                print(name + ": " + str(e))
+                sys.exit(1)
+        targets = dict(motors)
+        if len(motors) > 1:
+            targets["all"] = Broadcast(motors)
+        server = Server(targets, None, True, allow_parallel=True)
+        bind = common_args.bind_address_from_args(args)
+        loop.run_until_complete(server.start(bind, args.port))
+        state = publisher = None
+        try:
+            if args.publish is not None:
+                state = StatePublisher({name: motor.drv for name, motor in motors.items()},
+                                       args.publish_interval)
+                publisher = Publisher(state.notifiers)
+                loop.run_until_complete(publisher.start(bind, args.publish))
+                state.start()
+            logger.info("AG-UC8 open. Serving %s...", ", ".join(sorted(motors)))
+            loop.run_until_complete(server.wait_terminate())
+        finally:
+            if state is not None:
+                loop.run_until_complete(state.stop())
+            if publisher is not None:
+                loop.run_until_complete(publisher.stop())
+            loop.run_until_complete(server.stop())
     finally:
-        motor.close()
+        for future in futures.values():
+            if future.exception() is None:
+                future.result().close()
+        loop.close()
 
 if __name__ == "__main__":
     main()
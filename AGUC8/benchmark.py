@@ -0,0 +1,293 @@
+## @package benchmark
+# This module contains the benchmark suite of the hot paths of the driver and of the RPC layer,
+# run against the simulated controller, see :mod:`AGUC8.simulator`
+#
+# Run ``python -m AGUC8.benchmark run [--latency S] [-o FILE]`` to run the benchmarks and write
+# the results as JSON, or ``python -m AGUC8.benchmark compare OLD NEW`` to compare two result
+# files, e.g. of two versions.
+#
+
+import argparse
+from collections import OrderedDict
+import asyncio
+import itertools
+import json
+import os
+import platform
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from AGUC8 import codec
+from AGUC8 import simulator
+from AGUC8.channel import RATE
+from AGUC8.driver import AGUC8
+
+## Benchmarks by name, in the order they run
+BENCHMARKS = OrderedDict()
+
+_names = itertools.count(1)
+
+
+def benchmark(name):
+    """Decorator registering a benchmark. A benchmark is called with the parsed command line
+    options and returns its results as a dictionary."""
+    def register(function):
+        BENCHMARKS[name] = function
+        return function
+    return register
+
+
+def timed(count, function):
+    """Calls function(i) for i in range(count) and returns the statistics of the calls.
+
+    :param count: Number of calls
+    :count type: int
+    :param function: Function called
+    :function type: callable
+    :return: count, seconds (total), perSecond, and the p50, p99 and max seconds of one call
+    :rtype: dict
+    """
+    times = np.empty(count)
+    for i in range(count):
+        start = time.perf_counter()
+        function(i)
+        times[i] = time.perf_counter() - start
+    total = float(times.sum())
+    return {'count': count, 'seconds': total, 'perSecond': count/total if total else None,
+            'p50': float(np.percentile(times, 50)), 'p99': float(np.percentile(times, 99)),
+            'max': float(times.max())}
+
+
+def url(options):
+    """Returns the URL of a new simulated controller with the link model of the options.
+
+    :rtype: str
+    """
+    query = ['latency={}'.format(options.latency), 'processing={}'.format(options.processing)]
+    if options.rate is not None:
+        query.append('rate={}'.format(options.rate))
+    return 'sim://benchmark{}?{}'.format(next(_names), '&'.join(query))
+
+
+class _Controller(object):
+    """Driver of a new simulated controller, forgotten on exit."""
+
+    def __init__(self, options, **kwargs):
+        self.url = url(options)
+        self.kwargs = kwargs
+
+    def __enter__(self):
+        self.drv = AGUC8(self.url, **self.kwargs)
+        return self.drv
+
+    def __exit__(self, *exc):
+        self.drv.close()
+        self.remove()
+
+    def remove(self):
+        simulator.removeController(self.url[len('sim://'):].split('?')[0])
+
+
+@benchmark('startup')
+def _startup(options):
+    def cold(i):
+        with _Controller(options, activeChannels=['1', '2']):
+            pass
+
+    with tempfile.TemporaryDirectory() as directory:
+        state = os.path.join(directory, 'state.json')
+        controller = _Controller(options, activeChannels=['1', '2'], state=state)
+        with controller:
+            pass
+        # Restarts of the driver of the same controller, from the state file it saved
+        try:
+            warm = timed(options.startups,
+                         lambda i: AGUC8(controller.url, activeChannels=['1', '2'], state=state).close())
+        finally:
+            controller.remove()
+    return {'cold': timed(options.startups, cold), 'warm': warm}
+
+
+@benchmark('commands')
+def _commands(options):
+    with _Controller(options) as drv:
+        frame = codec.frame('1', 'SU', '+50')
+        return timed(options.count, lambda i: drv.port.sendString(frame))
+
+
+@benchmark('queries')
+def _queries(options):
+    with _Controller(options) as drv:
+        query = codec.frame('1', 'TS')
+        batch = [codec.frame('1', 'TS'), codec.frame('2', 'TS'), codec.frame('', 'PH')]
+        single = timed(options.count, lambda i: drv.port.sendString(query))
+        batched = timed(options.count, lambda i: drv.port.sendBatch(batch))
+        batched['queriesPerSecond'] = len(batch)*batched['perSecond']
+        return {'single': single, 'batched': batched}
+
+
+@benchmark('chchch')
+def _chchch(options):
+    with _Controller(options, activeChannels=['1', '2']) as drv:
+        cached = timed(options.count, lambda i: drv.chchch('1'))
+        switching = timed(options.count, lambda i: drv.chchch(str(1 + i % 2)))
+        return {'cached': cached, 'switching': switching}
+
+
+@benchmark('amIstill')
+def _amIstill(options):
+    with _Controller(options) as drv:
+        axis = drv.channels['1'][drv.aliases[0]]
+        return timed(options.count, lambda i: axis.amIstill(RATE))
+
+
+@benchmark('moves')
+def _moves(options):
+    with _Controller(options) as drv:
+        short = timed(options.moves, lambda i: drv.move(*((options.short,)*2 if i % 2 == 0 else (-options.short,)*2)))
+        long = timed(max(options.moves//10, 2),
+                     lambda i: drv.move(*((options.long,)*2 if i % 2 == 0 else (-options.long,)*2)))
+        short['steps'] = options.short
+        long['steps'] = options.long
+        return {'short': short, 'long': long}
+
+
+@benchmark('path')
+def _path(options):
+    with _Controller(options) as drv:
+        path = [(options.short, options.short) if i % 2 == 0 else (-options.short, -options.short)
+                for i in range(options.points)]
+        result = timed(1, lambda i: drv.followApath(path, wait=True))
+        return {'points': options.points, 'seconds': result['seconds'],
+                'pointsPerSecond': options.points/result['seconds']}
+
+
+@benchmark('rpc')
+def _rpc(options):
+    try:
+        from sipyco.pc_rpc import Server, Client
+        from AGUC8.aqctl_AGUC8 import AsyncMotor
+    except ImportError as e:
+        return {'skipped': str(e)}
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        port = s.getsockname()[1]
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+
+    async def serve():
+        motor = AsyncMotor(url(options))
+        server = Server({'AGUC8': motor}, None, True, allow_parallel=True)
+        await server.start('127.0.0.1', port)
+        return motor, server
+
+    motor, server = asyncio.run_coroutine_threadsafe(serve(), loop).result()
+    client = Client('127.0.0.1', port, 'AGUC8')
+    try:
+        position = timed(options.calls, lambda i: client.get_position())
+        status = timed(options.calls, lambda i: client.get_status())
+        moves = timed(max(options.calls//10, 2),
+                      lambda i: client.move(*((options.short,)*2 if i % 2 == 0 else (-options.short,)*2)))
+    finally:
+        client.close_rpc()
+        asyncio.run_coroutine_threadsafe(server.stop(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        motor.close()
+        loop.close()
+    return {'get_position': position, 'get_status': status, 'move': moves}
+
+
+def run(options, names=None):
+    """Runs benchmarks.
+
+    :param options: Parsed command line options of the run command
+    :options type: argparse.Namespace
+    :param names: Benchmarks to run. Defaults to None, running them all.
+    :names type: list, optional
+    :return: Environment, options and results by benchmark name
+    :rtype: dict
+    """
+    results = OrderedDict()
+    for name in names or BENCHMARKS:
+        print('Running ' + name + '...', file=sys.stderr)
+        results[name] = BENCHMARKS[name](options)
+    return {'python': platform.python_version(), 'platform': platform.platform(), 'time': time.time(),
+            'options': {k: v for k, v in vars(options).items() if k not in ('action', 'only', 'output')},
+            'results': results}
+
+
+def _flatten(results, prefix=''):
+    values = OrderedDict()
+    for key, value in results.items():
+        if isinstance(value, dict):
+            values.update(_flatten(value, prefix + key + '.'))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            values[prefix + key] = value
+    return values
+
+
+def compare(old, new):
+    """Returns the lines of a comparison of two result files: every value present in both, with
+    the ratio of the new one to the old one.
+
+    :param old: Results returned by :func:`run`
+    :old type: dict
+    :param new: Results returned by :func:`run`
+    :new type: dict
+    :rtype: list
+    """
+    old, new = _flatten(old['results']), _flatten(new['results'])
+    width = max([len(k) for k in new] + [10])
+    lines = ['{:<{w}} {:>14} {:>14} {:>8}'.format('value', 'old', 'new', 'new/old', w=width)]
+    for key, value in new.items():
+        if key in old:
+            ratio = value/old[key] if old[key] else float('nan')
+            lines.append('{:<{w}} {:>14.6g} {:>14.6g} {:>8.3f}'.format(key, old[key], value, ratio, w=width))
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description='AG-UC8 driver benchmarks')
+    sub = parser.add_subparsers(dest='action', required=True)
+    p = sub.add_parser('run', help='run the benchmarks against a simulated controller')
+    p.add_argument('--latency', type=float, default=0.002, help='round trip latency of the link, s (default: %(default)s)')
+    p.add_argument('--processing', type=float, default=0., help='processing time per command, s (default: %(default)s)')
+    p.add_argument('--rate', type=float, default=None, help='step rate of the simulated axes, steps/s')
+    p.add_argument('--count', type=int, default=500, help='calls per command, query and status benchmark (default: %(default)s)')
+    p.add_argument('--moves', type=int, default=40, help='short moves; a tenth as many long moves (default: %(default)s)')
+    p.add_argument('--short', type=int, default=10, help='steps of a short move (default: %(default)s)')
+    p.add_argument('--long', type=int, default=1000, help='steps of a long move (default: %(default)s)')
+    p.add_argument('--points', type=int, default=100, help='points of the path benchmark (default: %(default)s)')
+    p.add_argument('--startups', type=int, default=10, help='startups per startup benchmark (default: %(default)s)')
+    p.add_argument('--calls', type=int, default=200, help='calls per RPC benchmark (default: %(default)s)')
+    p.add_argument('--only', action='append', choices=list(BENCHMARKS), help='benchmark to run, can be given several times')
+    p.add_argument('-o', '--output', default=None, help='file to write the results to (default: stdout)')
+    p = sub.add_parser('compare', help='compare two result files')
+    p.add_argument('old')
+    p.add_argument('new')
+    args = parser.parse_args()
+    if args.action == 'run':
+        results = run(args, args.only)
+        if args.output is None:
+            json.dump(results, sys.stdout, indent=1)
+            print()
+        else:
+            with open(args.output, 'w') as f:
+                json.dump(results, f, indent=1)
+    else:
+        with open(args.old) as f:
+            old = json.load(f)
+        with open(args.new) as f:
+            new = json.load(f)
+        print('\n'.join(compare(old, new)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,184 @@
+## @package calibration
+# This module contains the step size calibration of the axes and the vectorized conversion
+# between physical units and steps
+#
+
+import json
+
+import numpy as np
+
+
+class AxisCalibration(object):
+    """Step sizes of one axis, in physical units per step, for each direction and step amplitude.
+    Sizes at an amplitude that was not calibrated are interpolated linearly between the
+    calibrated ones. An axis without any calibration has a size of 1 in both directions.
+    """
+
+    def __init__(self, sizes=None):
+        """Constructor method
+
+        :param sizes: (plus, minus) step sizes by step amplitude. Defaults to None.
+        :sizes type: dict, optional
+        """
+        self.sizes = {}
+        for amp, (plus, minus) in (sizes or {}).items():
+            self.set(amp, plus, minus)
+
+    def set(self, amp, plus, minus):
+        """Sets the step sizes at a step amplitude.
+
+        :param amp: Step amplitude, 1 to 50
+        :amp type: int
+        :param plus: Size of a step in the + direction, positive
+        :plus type: float
+        :param minus: Size of a step in the - direction, positive
+        :minus type: float
+        """
+        if plus <= 0 or minus <= 0:
+            raise ValueError('Step sizes must be positive')
+        self.sizes[int(amp)] = (float(plus), float(minus))
+
+    def measure(self, amp, steps, distance):
+        """Sets the step size of one direction from a move of steps that covered distance.
+
+        :param amp: Step amplitude of the move
+        :amp type: int
+        :param steps: Steps moved, signed
+        :steps type: int
+        :param distance: Distance covered, signed like steps
+        :distance type: float
+        """
+        if steps == 0 or distance*steps <= 0:
+            raise ValueError('steps and distance must be non zero and of the same sign')
+        plus, minus = self.size(amp)
+        if steps > 0:
+            plus = distance/steps
+        else:
+            minus = distance/steps
+        self.set(amp, plus, minus)
+
+    def size(self, amp):
+        """Returns the (plus, minus) step sizes at a step amplitude.
+
+        :rtype: tuple
+        """
+        amp = int(amp)
+        if amp in self.sizes:
+            return self.sizes[amp]
+        if not self.sizes:
+            return (1., 1.)
+        amps = sorted(self.sizes)
+        plus = np.interp(amp, amps, [self.sizes[a][0] for a in amps])
+        minus = np.interp(amp, amps, [self.sizes[a][1] for a in amps])
+        return (float(plus), float(minus))
+
+
+class Calibration(object):
+    """Step size calibration of every axis of a controller.
+
+    :param units: Name of the physical unit, e.g. 'urad'. Defaults to 'steps'.
+    :units type: str, optional
+    """
+
+    def __init__(self, units='steps'):
+        """Constructor method
+        """
+        self.units = units
+        self.axes = {}
+
+    def axis(self, ch, axis):
+        """Returns the calibration of an axis, creating an empty one if needed.
+
+        :param ch: Channel number
+        :ch type: str
+        :param axis: Axis number, '1' or '2'
+        :axis type: str
+        :rtype: :class:`AxisCalibration`
+        """
+        key = (str(ch), str(axis))
+        if key not in self.axes:
+            self.axes[key] = AxisCalibration()
+        return self.axes[key]
+
+    def _sizes(self, ch, amps):
+        sizes = [self.axis(ch, axis).size(amp) for axis, amp in zip(('1', '2'), amps)]
+        return np.array([s[0] for s in sizes]), np.array([s[1] for s in sizes])
+
+    def toSteps(self, ch, moves, amps=(50, 50)):
+        """Converts relative moves in physical units to steps. Rounding errors are carried
+        from one move to the next, so a converted path does not drift.
+
+        :param ch: Channel number
+        :ch type: str
+        :param moves: Relative moves (d1, d2) in physical units, shape (N, 2) or (2,)
+        :moves type: array_like
+        :param amps: Step amplitudes of axis 1 and axis 2. Defaults to (50, 50).
+        :amps type: tuple, optional
+        :return: Steps, same shape as moves
+        :rtype: numpy.ndarray
+        """
+        moves = np.asarray(moves, dtype=float)
+        plus, minus = self._sizes(ch, amps)
+        steps = np.where(moves >= 0, moves/plus, moves/minus).reshape(-1, 2)
+        steps = np.diff(np.round(np.cumsum(steps, axis=0)), axis=0, prepend=np.zeros((1, 2)))
+        return steps.astype(np.int64).reshape(moves.shape)
+
+    def toUnits(self, ch, steps, amps=(50, 50)):
+        """Converts relative moves in steps to physical units.
+
+        :param ch: Channel number
+        :ch type: str
+        :param steps: Relative moves (d1, d2) in steps, shape (N, 2) or (2,)
+        :steps type: array_like
+        :param amps: Step amplitudes of axis 1 and axis 2. Defaults to (50, 50).
+        :amps type: tuple, optional
+        :return: Distances, same shape as steps
+        :rtype: numpy.ndarray
+        """
+        steps = np.asarray(steps, dtype=float)
+        plus, minus = self._sizes(ch, amps)
+        return np.where(steps >= 0, steps*plus, steps*minus)
+
+    def asdict(self):
+        """Returns the calibration as plain types, as saved by :meth:`save`.
+
+        :rtype: dict
+        """
+        channels = {}
+        for (ch, axis), calibration in sorted(self.axes.items()):
+            if calibration.sizes:
+                channels.setdefault(ch, {})[axis] = {str(amp): list(s) for amp, s in sorted(calibration.sizes.items())}
+        return {'units': self.units, 'channels': channels}
+
+    @classmethod
+    def fromdict(cls, data):
+        """Builds a calibration from the output of :meth:`asdict`.
+
+        :rtype: :class:`Calibration`
+        """
+        calibration = cls(data.get('units', 'steps'))
+        for ch, axes in data.get('channels', {}).items():
+            for axis, sizes in axes.items():
+                for amp, (plus, minus) in sizes.items():
+                    calibration.axis(ch, axis).set(amp, plus, minus)
+        return calibration
+
+    def save(self, filename):
+        """Saves the calibration to a JSON file.
+
+        :param filename: File name
+        :filename type: str
+        """
+        with open(filename, 'w') as f:
+            json.dump(self.asdict(), f, indent=1)
+
+    @classmethod
+    def load(cls, filename):
+        """Reads a calibration saved by :meth:`save`.
+
+        :param filename: File name
+        :filename type: str
+        :rtype: :class:`Calibration`
+        """
+        with open(filename) as f:
+            return cls.fromdict(json.load(f))
@@ -10,17 +10,28 @@
 #
 #
 
-import serial as s
-from time import time,sleep
+from time import monotonic
 from datetime import datetime
+from threading import Event
+
+from AGUC8 import codec
 
 RATE = 750
 LIMSPEED = 3
 TIMEOUT = 2000 
+# Initial relative move step rate estimate in steps/s
+STEPRATE = 750.
+# Weight of the newest observation in the step rate estimate
+LEARNRATE = 0.3
+# Moves shorter than this are not used to learn the step rate
+LEARNSTEPS = 20
+# Shortest poll interval in seconds and the factor by which it grows while waiting
+POLLMIN = 0.005
+BACKOFF = 1.5
 
 class Axis(object):
     
-    def __init__(self,name = '1',stepAmp = 50,rate = RATE,controller = None):
+    def __init__(self,name = '1',stepAmp = 50,rate = RATE,controller = None,configure = True):
         
         if controller == None:
             raise(ValueError('You cannot initialize an Axis without a controller'))
@@ -28,10 +39,34 @@ class Axis(object):
         self.name = name
         self.rate = rate
         self.stepAmp = str(stepAmp) if 0<int(stepAmp)<=50 else str(50)
-        self.controller.port.sendString(name+'SU+'+self.stepAmp+'\r\n')
-        self.controller.port.sendString(name+'SU-'+self.stepAmp+'\r\n')
+        if configure:
+            self.controller.port.sendBatch([codec.frame(self.name,'SU','+'+self.stepAmp),codec.frame(self.name,'SU','-'+self.stepAmp)])
         
         self.__lastOp__ = 'opened'
+        
+        # Step rate estimate in steps/s, learned from the relative moves that ran to completion
+        self.stepRate = STEPRATE
+        self._moveStart = None
+        self._moveSteps = None
+        self._lastMoving = None
+        # Set by stop to cut short the sleeps of amIstill
+        self.woken = Event()
+        # Step counter as tracked from the commands sent. None when it has to be read with TP.
+        self._position = None
+        self._positionErrors = 0
+        # Whether a move was started and not yet seen to end, and the step counter expected at the
+        # end of a relative move, which only becomes the position when a poll finds the axis still
+        self._moving = False
+        self._target = None
+        # Position of the zero reference on the controller step counter: positions are counter
+        # values minus offset. Non zero only when a power cycle reset the counter, see AGUC8.persist
+        self.offset = 0
+    
+    
+    def command(self,mnemonic):
+        """Returns the cached frame of a command of this axis without parameter, e.g. 1TS."""
+        
+        return codec.frame(self.name,mnemonic)
     
     
     def whatDidIdo(self):
@@ -40,65 +75,202 @@ class Axis(object):
     
     
     def stop(self):
-        self.controller.port.sendString(self.name+'ST\r\n')
+        self.controller.port.sendUrgent([self.command('ST')])
+        self.stopped()
+    
+    
+    def stopped(self):
+        """Records that an ST command was sent to the axis."""
+        
         self.__lastOp__ = 'stopped'
+        self._moveSteps = None
+        self._position = self._target = None
+        self._moving = False
+        self.woken.set()
     
     
-    def amIstill(self,rate):
+    def setPosition(self,steps):
+        """Sets the tracked step counter. None marks it as unknown. A reading taken during a
+        relative move does not change the counter expected at its end."""
+        
+        self._position = steps
+        if steps is None:
+            self._target = None
+        self._positionErrors = self.controller.port.errorCount
+    
+    
+    def setCounter(self,counter):
+        """Sets the tracked step counter from a TP reading of the controller counter, None if
+        the reply could not be read."""
+        
+        self.setPosition(None if counter is None else counter - self.offset)
+    
+    
+    def counter(self):
+        """Returns the tracked controller step counter, None when unknown."""
+        
+        return self._position + self.offset if self.positionKnown() else None
+    
+    
+    def positionKnown(self):
+        """Returns whether the tracked step counter can be trusted: it is unknown during moves,
+        after limit moves and stops, and after any reply error on the port since it was last set."""
+        
+        return (self._position is not None and not self._moving and
+                self._positionErrors == self.controller.port.errorCount)
+    
+    
+    def position(self):
+        """Returns the step counter, reading it with TP only if the tracked value is unknown."""
+        
+        if not self.positionKnown():
+            return self.queryCounter()
+        return self._position
+    
+    
+    def eta(self):
+        """Predicted time in seconds until the current relative move ends. 0 if no move
+        is known to be running, None if the end of the move cannot be predicted (limit moves)."""
+        
+        if self._moveStart is None:
+            return 0.
+        if self._moveSteps is None:
+            return None
+        return max(0., self._moveStart + self._moveSteps/self.stepRate - monotonic())
+    
+    
+    def pollDelays(self,rate):
+        """Delays in seconds between TS polls while waiting for the current move to end.
+        Sleeps until shortly before the predicted end of the move, then polls with a delay
+        growing from POLLMIN up to rate milliseconds."""
         
+        eta = self.eta()
+        yield 0. if eta is None else 0.9*eta
+        delay = POLLMIN
         while True:
-            if self.controller.port.sendString(self.name+'TS\r\n').find('0') != -1:
+            yield delay
+            delay = min(delay*BACKOFF, 0.001*rate)
+    
+    
+    def moving(self,now):
+        
+        self._lastMoving = now
+    
+    
+    def still(self,now):
+        """Records that a poll sent at time now found the axis still, learning the step rate
+        from the move that just ended."""
+        
+        if self._moveStart is not None and self._moveSteps is not None and self._moveSteps >= LEARNSTEPS:
+            if self._lastMoving is not None:
+                # The move ended between the last poll that saw it moving and this one
+                observed = self._moveSteps/(0.5*(self._lastMoving + now) - self._moveStart)
+            else:
+                # The move ended some time before the first poll: only a lower bound is known,
+                # so probe above it. Moves seen running on later polls bracket the true rate.
+                observed = BACKOFF*max(self.stepRate, self._moveSteps/(now - self._moveStart))
+            self.stepRate += LEARNRATE*(observed - self.stepRate)
+        if self._moving:
+            # A counter read during the move is out of date now
+            self._position = self._target
+            self._target = None
+            self._moving = False
+        self._moveStart = self._moveSteps = self._lastMoving = None
+    
+    
+    def amIstill(self,rate):
+        
+        self.woken.clear()
+        for polls, delay in enumerate(self.pollDelays(rate), 1):
+            self.woken.wait(delay)
+            now = monotonic()
+            if self.controller.pollStatus([self]) == [0]:
+                self.still(now)
+                self.controller.port.metrics.polled(polls)
                 return True
-            sleep(0.001*rate)
+            self.moving(now)
             
             
     def amIatMyLimit(self):
         
-        return self.controller.port.sendString('PH\r\n').find(self.name) != -1 or self.controller.port.sendString('PH\r\n').find('3') != -1
+        return bool((self.controller.limits() or 0) & int(self.name))
         
     
     def queryCounter(self):
         
-        return int(self.controller.port.sendString(self.name+'TP\r\n')[3:])
+        tp = self.command('TP')
+        self.setCounter(codec.decode(tp,self.controller.port.sendString(tp)))
+        return self._position
     
     
     def resetCounter(self):
         
-        self.controller.port.sendString(self.name+'ZP\r\n')
+        self.controller.port.sendString(self.command('ZP'))
         self.__lastOp__ = 'reset'
+        self.offset = 0
+        self.setPosition(0)
         
     
-    def jog(self,steps = 0):
+    def startMotion(self,frame,cancel = None):
+        """Sends a motion command unless cancel is set, see :meth:`AGUC8.agPort.AGPort.sendMotion`.
+        A motion is either started before a stop's ST or not started at all.
+
+        :return: Whether the command was sent
+        :rtype: bool
+        """
+        
+        return self.controller.port.sendMotion(frame,cancel)
+    
+    
+    def jog(self,steps = 0,cancel = None):
         
         if steps == 0:
             return False
         
+        if not self.startMotion(codec.frame(self.name,'PR',int(steps)),cancel):
+            return False
         self.__lastOp__ = 'jogged: '+str(steps)
-        self.controller.port.sendString(self.name+'PR'+str(int(steps))+'\r\n')
+        start = self._target if self._moving else self._position
+        self._target = None if start is None else start + int(steps)
+        self._moving = True
+        self._moveStart = monotonic()
+        self._moveSteps = abs(int(steps))
     
     
-    def goMax(self,speedTag = LIMSPEED):
+    def goMax(self,speedTag = LIMSPEED,cancel = None):
         
         if self.__lastOp__ == 'goneMin':
-            self.jog(500)
+            if self.jog(500,cancel) is False:
+                return False
             self.amIstill(100)
         elif self.__lastOp__ == 'goneMax':
             return False 
             
+        if not self.startMotion(codec.frame(self.name,'MV',speedTag),cancel):
+            return False
         self.__lastOp__ = 'goneMax'
-        self.controller.port.sendString(self.name+'MV'+str(speedTag)+'\r\n')
+        self._moveStart = monotonic()
+        self._moveSteps = None
+        self._position = self._target = None
+        self._moving = True
     
     
-    def goMin(self,speedTag = LIMSPEED):
+    def goMin(self,speedTag = LIMSPEED,cancel = None):
         
         if self.__lastOp__ == 'goneMax':
-            self.jog(-500)
+            if self.jog(-500,cancel) is False:
+                return False
             self.amIstill(100)
         elif self.__lastOp__ == 'goneMin':
             return False
             
+        if not self.startMotion(codec.frame(self.name,'MV',-1*speedTag),cancel):
+            return False
         self.__lastOp__ = 'goneMin'
-        self.controller.port.sendString(self.name+'MV'+str(-1*speedTag)+'\r\n')
+        self._moveStart = monotonic()
+        self._moveSteps = None
+        self._position = self._target = None
+        self._moving = True
             
         
     def nowToMilliseconds(self):
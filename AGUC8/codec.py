@@ -0,0 +1,137 @@
+## @package codec
+# This module contains the table of the AG-UC8 commands, the encoding of command frames and
+# the decoding of replies
+#
+
+from collections import namedtuple
+import functools
+import re
+
+## The command never gets a reply
+NEVER = 0
+## The command always gets a reply
+ALWAYS = 1
+## The command gets a reply when its parameter is '?'
+ASKED = 2
+
+## Description of a command: axis is whether it takes an axis number prefix, params its number
+# of parameters, reply one of NEVER, ALWAYS or ASKED, and type the type of the value in its reply
+Spec = namedtuple('Spec', 'axis params reply type')
+
+## AG-UC8 command set, by mnemonic
+COMMANDS = {
+    'CC': Spec(False, 1, ASKED, str),
+    'DL': Spec(True, 1, ASKED, int),
+    'JA': Spec(True, 1, ASKED, int),
+    'ML': Spec(False, 0, NEVER, None),
+    'MR': Spec(False, 0, NEVER, None),
+    'MV': Spec(True, 1, NEVER, None),
+    'PH': Spec(False, 0, ALWAYS, int),
+    'PR': Spec(True, 1, NEVER, None),
+    'RS': Spec(False, 0, NEVER, None),
+    'ST': Spec(True, 0, NEVER, None),
+    'SU': Spec(True, 1, ASKED, int),
+    'TE': Spec(False, 0, ALWAYS, int),
+    'TP': Spec(True, 0, ALWAYS, int),
+    'TS': Spec(True, 0, ALWAYS, int),
+    'VE': Spec(False, 0, ALWAYS, str),
+    'ZP': Spec(True, 0, NEVER, None),
+}
+
+_COMMAND = re.compile(r'^\s*([0-9]*)([A-Za-z]{2})(.*?)\s*$')
+
+
+class Frame(bytes):
+    """Encoded command line. Besides its bytes, carries the parts of the command and whether
+    the controller replies to it."""
+
+    def __new__(cls, axis, mnemonic, param):
+        spec = COMMANDS.get(mnemonic)
+        self = bytes.__new__(cls, (axis + mnemonic + param + '\r\n').encode('ascii'))
+        self.axis = axis
+        self.mnemonic = mnemonic
+        self.param = param
+        if spec is None:
+            self.query = param.endswith('?')
+        else:
+            self.query = spec.reply == ALWAYS or (spec.reply == ASKED and param.endswith('?'))
+        ## Reply prefix echoing the command, e.g. '1TS' for 1TS, 'CC' for CC?
+        self.echo = axis + mnemonic + (param.rstrip('?') if self.query else '')
+        return self
+
+
+@functools.lru_cache(maxsize=4096)
+def frame(axis, mnemonic, param=''):
+    """Returns the frame of a command. Frames are cached, so polling commands such as 1TS are
+    only encoded once.
+
+    :param axis: Axis number, '' for controller commands
+    :axis type: str
+    :param mnemonic: Two letter command mnemonic
+    :mnemonic type: str
+    :param param: Parameter. Defaults to ''.
+    :param type: str or int, optional
+    :rtype: :class:`Frame`
+    """
+    return Frame(str(axis), mnemonic, str(param))
+
+
+@functools.lru_cache(maxsize=4096)
+def _parse(command):
+    m = _COMMAND.match(command)
+    if m is None:
+        raise ValueError('Not an AG-UC8 command: {!r}'.format(command))
+    axis, mnemonic, param = m.groups()
+    return frame(axis, mnemonic.upper(), param)
+
+
+def encode(command):
+    """Returns the frame of a command given as text, e.g. '1TS' or '1TS\\r\\n'.
+
+    :param command: Command, or a frame that is returned unchanged
+    :command type: str, bytes or :class:`Frame`
+    :rtype: :class:`Frame`
+    """
+    if isinstance(command, Frame):
+        return command
+    if isinstance(command, bytes):
+        command = command.decode('ascii', 'replace')
+    return _parse(command)
+
+
+def isQuery(command):
+    """Returns whether the controller replies to a command.
+
+    :param command: Command
+    :command type: str, bytes or :class:`Frame`
+    :rtype: bool
+    """
+    return encode(command).query
+
+
+def decode(command, reply):
+    """Returns the value of the reply to a query, e.g. 0 for '1TS0' or '1' for 'CC1'.
+    The echo of the command is removed and the rest is converted to the type of the command.
+
+    :param command: Query the reply answers
+    :command type: str, bytes or :class:`Frame`
+    :param reply: Reply, with or without line terminator
+    :reply type: str
+    :return: Value, or None if the reply is missing or malformed
+    :rtype: int, str or None
+    """
+    if not reply:
+        return None
+    command = encode(command)
+    reply = reply.strip()
+    if reply.startswith(command.echo):
+        reply = reply[len(command.echo):]
+    elif command.mnemonic != 'VE':
+        return None
+    spec = COMMANDS.get(command.mnemonic)
+    if spec is None or spec.type is str:
+        return reply
+    try:
+        return spec.type(reply)
+    except ValueError:
+        return None
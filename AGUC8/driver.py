@@ -10,15 +10,27 @@
 #
 #
 
-from AGUC8.channel import Axis,RATE
-from AGUC8.mothreading import MotorThread
+from AGUC8.channel import Axis,RATE,POLLMIN
+from AGUC8.path import PathRunner
+from AGUC8 import scan as scans
+from AGUC8 import optimize as optimizers
+from AGUC8.calibration import Calibration
+from AGUC8.monitor import Monitor,INTERVAL
+from AGUC8.persist import StateFile
 
 from AGUC8.agPort import AGPort
+from AGUC8.errors import AGUC8Error
+from AGUC8 import codec
 
 import logging
+import time
+from threading import Event
 
 logger = logging.getLogger(__name__)
 
+# Seconds stop waits for the axes to be seen still
+STOPTIMEOUT = 1.
+
 class AGUC8(object):
     """Class that builds support for Agilis AGUC8 piezo motor controller. Creates an instance of a serial
     object using :class:`AGPort`
@@ -35,9 +47,33 @@ class AGUC8(object):
     :stepAmp1 type: int
     :param stepAmp2: Axis 2 step amplitude. See AGUC8 docs. Defaults to 50.
     :stepAmp2 type: int
+    :param concurrent: Whether both axes of a channel move at the same time. If False, axis 1
+        finishes its move before axis 2 starts. Defaults to True.
+    :concurrent type: bool, optional
+    :param channelResync: Seconds after which the cached active channel is checked against the
+        controller with CC?. Defaults to None, in which case it is only checked after a reply error.
+    :channelResync type: float, optional
+    :param monitor: Seconds between the polls of a background status monitor, see
+        :class:`AGUC8.monitor.Monitor`. Defaults to None, in which case no monitor thread runs.
+    :monitor type: float, optional
+    :param calibration: Step sizes of the axes, as a :class:`AGUC8.calibration.Calibration`,
+        the name of a file saved by it or its dictionary form. Defaults to None (1 unit per step).
+    :calibration type: str, dict or :class:`AGUC8.calibration.Calibration`, optional
+    :param state: Name of a file in which the configuration and the step counters are kept
+        between runs, see :class:`AGUC8.persist.StateFile`. When it exists, startup checks it
+        with a single batch of queries and only writes the settings that differ.
+        Defaults to None (always configure the controller from scratch).
+    :state type: str, optional
+    :param heartbeat: Seconds without traffic after which the connection is checked, and
+        restored if it dropped, see :meth:`AGUC8.agPort.AGPort.supervise`. Defaults to None, in
+        which case drops are only noticed by the next command.
+    :heartbeat type: float, optional
+    :raises AGUC8.errors.NotConnected: if the port cannot be opened
     """
     
-    def __init__(self,portName,activeChannels = ['1'], axis1alias = 'X', axis2alias = 'Y', stepAmp1 = 50, stepAmp2 = 50):
+    def __init__(self,portName,activeChannels = ['1'], axis1alias = 'X', axis2alias = 'Y', stepAmp1 = 50, stepAmp2 = 50,
+                 concurrent = True, channelResync = None, monitor = None, calibration = None, state = None,
+                 heartbeat = None):
         """Constructor method
         """
         
@@ -51,46 +87,269 @@ class AGUC8(object):
         
         self.defChannel = activeChannels[0]
         
+        self.concurrent = concurrent
+        self.channelResync = channelResync
+        ## Active channel as last set by this driver. None when unknown.
+        self._channel = None
+        self._channelSynced = 0.
+        self._channelErrors = 0
+        # Channels whose step amplitudes are written again with the next CC to them
+        self._stale = set()
+        # Set by stop to cancel the operations started before it. stop installs a fresh one.
+        self._cancel = Event()
+        if isinstance(calibration, str):
+            calibration = Calibration.load(calibration)
+        elif isinstance(calibration, dict):
+            calibration = Calibration.fromdict(calibration)
+        ## Step sizes used to convert physical units to steps
+        self.calibration = Calibration() if calibration is None else calibration
+        ## Latest status polled from the controller
+        self.monitor = Monitor(self, INTERVAL if monitor is None else monitor)
+        ## File the state is saved to between runs, None if not kept
+        self.stateFile = None if state is None else StateFile(state)
+        ## Firmware version answered to VE
+        self.deviceName = None
+        
         if not self.port.amInull():
-            deviceName = self.port.sendString('VE\r\n')
-            logger.info('Device name: ' + deviceName)
-            logger.debug('Setting device to remote mode')
-            self.port.sendString('MR\r\n')
-            for c in activeChannels:
-                logger.debug('Configuring channel ' + str(c))
-                self.port.sendString('CC'+str(c)+'\r\n')
-                self.addAxis(c,'1',axis1alias,stepAmp1)
-                logger.info('Channel ' + c + ': ' + axis1alias + ' axis given step amplitude ' + str(stepAmp1))
-                self.addAxis(c,'2',axis2alias,stepAmp2)
-                logger.info('Channel ' + c + ': ' + axis2alias + ' axis given step amplitude ' + str(stepAmp2))
-            logger.info('Changing to channel ' + str(activeChannels[0]))
-            self.port.sendString('CC'+str(activeChannels[0])+'\r\n')
+            saved = None if self.stateFile is None else self.stateFile.load()
+            if saved is not None:
+                self._warmStart(saved,activeChannels,stepAmp1,stepAmp2)
+            else:
+                logger.debug('Setting device to remote mode')
+                self.deviceName, = self.port.sendBatch([codec.frame('','VE'),codec.frame('','MR')])
+                logger.info('Device name: ' + str(self.deviceName))
+                for c in activeChannels:
+                    logger.debug('Configuring channel ' + str(c))
+                    self.port.sendString(codec.frame('','CC',c))
+                    self.addAxis(c,'1',axis1alias,stepAmp1)
+                    logger.info('Channel ' + c + ': ' + axis1alias + ' axis given step amplitude ' + str(stepAmp1))
+                    self.addAxis(c,'2',axis2alias,stepAmp2)
+                    logger.info('Channel ' + c + ': ' + axis2alias + ' axis given step amplitude ' + str(stepAmp2))
+                logger.info('Changing to channel ' + str(activeChannels[0]))
+                self.port.sendString(codec.frame('','CC',activeChannels[0]))
+                self._setChannel(activeChannels[0])
 
-            # Does a device have a limit switch?
-            self._limit_status = self.port.sendString('PH\r\n')[2]
+                # Does a device have a limit switch?
+                self.limits(refresh=True)
+            self.saveState(force=True)
+            self.port.restore = self._restoreCommands
+            if heartbeat is not None:
+                self.port.supervise(heartbeat)
+            if monitor is not None:
+                self.monitor.start()
+
+            ## Runner of the last path followed
+            self.path = None
+        
+    def _warmStart(self,saved,activeChannels,stepAmp1,stepAmp2):
+        """Configures the controller from a saved state. VE, CC?, SU? and TP of the active
+        channel and PH go in a single batch with MR; the saved state is trusted when the firmware,
+        the active channel and its step amplitudes match, and then no other channel is written to.
+        Otherwise the channels are configured in one write, skipping the step amplitudes already
+        set. When the counters of the controller were reset by a power cycle, the saved counters
+        become the offsets of the new ones, so that the zero reference is kept.
+        """
+        
+        for c in activeChannels:
+            self.addAxis(c,'1',self.aliases[0],stepAmp1,configure=False)
+            self.addAxis(c,'2',self.aliases[1],stepAmp2,configure=False)
+        steps = [codec.frame(n,'SU',d+'?') for n in ('1','2') for d in '+-']
+        counters = [codec.frame(n,'TP') for n in ('1','2')]
+        queries = [codec.frame('','VE'),codec.frame('','CC','?')] + steps + counters + [codec.frame('','PH')]
+        now = time.monotonic()
+        replies = self.port.sendBatch(queries[:1] + [codec.frame('','MR')] + queries[1:])
+        values = [codec.decode(q,r) for q, r in zip(queries, replies)]
+        self.deviceName, active = values[:2]
+        amps, counts, limits = values[2:6], values[6:8], values[8]
+        logger.info('Device name: ' + str(self.deviceName))
+        
+        savedChannels = saved.get('channels') or {}
+        def wanted(c):
+            return [int(self.channels[c][alias].stepAmp) for alias in self.aliases]
+        trusted = (self.deviceName == saved.get('version') and active == saved.get('channel') and
+                   active in activeChannels and amps == [amp for amp in wanted(active) for d in '+-'] and
+                   all((savedChannels.get(c) or {}).get('stepAmps') == wanted(c) for c in activeChannels))
+        previous = (savedChannels.get(active) or {}).get('axes') or {}
+        # A power cycle restores the default configuration, which may well match the saved one,
+        # so the counters are checked whether or not the state is trusted
+        reset = (counts == [0, 0] and any((previous.get(n) or {}).get('counter') for n in ('1','2')))
+        if reset:
+            logger.warning('The step counters were reset since the state was saved: keeping the saved zero reference')
+        for c in activeChannels:
+            axes = (savedChannels.get(c) or {}).get('axes') or {}
+            for alias in self.aliases:
+                a = self.channels[c][alias]
+                entry = axes.get(a.name) or {}
+                a.offset = entry.get('offset') or 0
+                if reset and entry.get('counter') is not None:
+                    a.offset -= entry['counter']
+        
+        writes = []
+        channel = active
+        if active in activeChannels:
+            for a, d, amp in zip([self.channels[active][alias] for alias in self.aliases for d in '+-'], '+-+-', amps):
+                if amp != int(a.stepAmp):
+                    writes.append(codec.frame(a.name,'SU',d+a.stepAmp))
+            for alias, count in zip(self.aliases, counts):
+                self.channels[active][alias].setCounter(count)
+        if not trusted:
+            for c in activeChannels:
+                if c != active:
+                    writes += [codec.frame('','CC',c)] + self._stepAmpCommands(c)
+                    channel = c
+        if writes:
+            self.port.sendBatch(writes)
+        logger.info(('Warm start' if trusted else 'State check failed') + ': ' + str(len(writes)) + ' configuration commands written')
+        self._setChannel(channel)
+        if channel == active:
+            self.monitor.publish(now,channel,limits=limits)
+        else:
+            self.limits(refresh=True)
+        
+    def _stepAmpCommands(self,ch):
+        
+        return [codec.frame(a.name,'SU',d+a.stepAmp) for a in (self.channels[ch][alias] for alias in self.aliases) for d in '+-']
+        
+    def _restoreCommands(self):
+        """Commands that configure the controller again once the port has reopened a lost
+        connection: remote mode, then the active channel and its step amplitudes. The step
+        amplitudes of the other channels are written with the next CC to them, since CC is
+        refused while an axis of the active channel still moves.
+        """
+        
+        configured = [c for c, channel in self.channels.items() if channel[self.aliases[0]] is not None]
+        commands = [codec.frame('','MR')]
+        self._stale = set(configured)
+        if self._channel in self._stale:
+            commands += [codec.frame('','CC',self._channel)] + self._stepAmpCommands(self._channel)
+            self._stale.discard(self._channel)
+        return commands
+        
+    def saveState(self,force=False):
+        """Saves the configuration and the step counters to the state file, if any. Unless
+        forced, does nothing when the last save is more recent than the save period of the file.
+        Called after every motion, so a restart after a crash finds counters close to the last
+        ones.
 
-            logger.debug('Starting motor thread')
-            self.mThread = MotorThread()
+        :param force: Whether to save even if the last save is recent. Defaults to False.
+        :force type: bool, optional
+        """
+        
+        if self.stateFile is None:
+            return
+        channels = {}
+        for c, channel in self.channels.items():
+            axes = [channel[alias] for alias in self.aliases]
+            if None in axes:
+                continue
+            channels[c] = {'stepAmps': [int(a.stepAmp) for a in axes],
+                           'axes': {a.name: {'counter': a.counter(), 'offset': a.offset} for a in axes}}
+        self.stateFile.save({'version': self.deviceName, 'channel': self._channel, 'channels': channels}, force)
         
     def close(self):
         """Close serial connection."""
+        self.monitor.stop()
+        self.saveState(force=True)
         self.port.close()
         
+    @property
+    def _limit_status(self):
+        
+        return str(self.limits())
+        
+    def limits(self,refresh=False):
+        """Limit switch status, as answered to PH: a bit field of the axes at a limit switch
+        (1: axis 1, 2: axis 2). Read from the monitor snapshot when it is fresh.
+
+        :param refresh: Whether to poll PH even if the snapshot is fresh. Defaults to False.
+        :refresh type: bool, optional
+        :rtype: int or None
+        """
+        
+        snapshot = None if refresh else self.monitor.fresh()
+        if snapshot is None or snapshot.limits is None:
+            query = codec.frame('','PH')
+            now = time.monotonic()
+            snapshot = self.monitor.publish(now,self._channel,limits=codec.decode(query,self.port.sendString(query)))
+        return snapshot.limits
+        
+    def pollStatus(self,axes=None):
+        """Polls TS of axes of the active channel in one batch and publishes the result to
+        self.monitor. PH is polled in the same batch while the monitor thread runs.
+
+        :param axes: Axes to poll. Defaults to None, polling both axes of the active channel.
+        :axes type: list of :class:`AGUC8.channel.Axis`, optional
+        :return: Status code of each axis, None for a missing reply
+        :rtype: list
+        """
+        
+        ch = self._channel
+        if axes is None:
+            # The controller may have been switched to a channel that is not active
+            axes = [self.channels[ch][alias] for alias in self.aliases] if self._active(ch) else []
+        queries = [a.command('TS') for a in axes]
+        withLimits = self.monitor.running()
+        if withLimits:
+            queries.append(codec.frame('','PH'))
+        now = time.monotonic()
+        codes = [codec.decode(q,r) for q, r in zip(queries, self.port.sendBatch(queries))]
+        limits = codes.pop() if withLimits else None
+        self.monitor.publish(now,ch,{self.aliases[int(a.name)-1]: c for a, c in zip(axes, codes)},limits)
+        return codes
+        
     def chchch(self,ch):
         """CHeck and CHange CHannel.
         Changes to channel ch if it isn't already active.
+        The active channel is cached, so the controller is only asked with CC? if a reply error
+        occurred since the channel was last set or if the cache is older than self.channelResync.
 
         :param ch: Desired channel number
         :type ch: str
         """
         
-        channel = int(self.port.sendString('CC?\r\n')[2:])
-        if channel != ch:
-            logger.info('Changing to channel ' + str(ch))
-            self.port.sendString('CC'+str(ch)+'\r\n')
+        ch = str(ch)
+        if self.port.errorCount != self._channelErrors or (self.channelResync is not None and
+                time.monotonic() - self._channelSynced > self.channelResync):
+            self.resyncChannel()
+        if self._channel != ch or ch in self._stale:
+            logger.info('Changing to channel ' + ch)
+            commands = [codec.frame('','CC',ch)]
+            if ch in self._stale:
+                commands += self._stepAmpCommands(ch)
+            self.port.sendBatch(commands)
+            self._stale.discard(ch)
+            self._setChannel(ch)
+            
+            
+    def resyncChannel(self):
+        """Reads the active channel from the controller into the channel cache.
+
+        :return: Active channel, or None if the reply could not be read
+        :rtype: str or None
+        """
+        
+        query = codec.frame('','CC','?')
+        channel = codec.decode(query,self.port.sendString(query))
+        if channel != self._channel:
+            logger.debug('Cached channel ' + str(self._channel) + ' resynced to ' + str(channel))
+        self._setChannel(channel)
+        return channel
+        
+        
+    def _active(self,ch):
+        """Returns whether channel ch was configured with axes."""
+        
+        return ch in self.channels and self.channels[ch][self.aliases[0]] is not None
+        
+        
+    def _setChannel(self,ch):
         
+        self._channel = None if ch is None else str(ch)
+        self._channelSynced = time.monotonic()
+        self._channelErrors = self.port.errorCount
         
-    def addAxis(self,channel,name,alias,stepAmp):
+        
+    def addAxis(self,channel,name,alias,stepAmp,configure=True):
         """Assigns an axis to a channel.
 
         :param channel: Channel number
@@ -101,14 +360,64 @@ class AGUC8(object):
         :alias type: str
         :param stepAmp: Axis step amplitude
         :stepAmp type: int
+        :param configure: Whether to send the step amplitude to the controller. Defaults to True.
+        :configure type: bool, optional
         """
         
         if alias not in self.aliases:
             raise KeyError('You used an invalid axis name')
-        self.channels[channel][alias] = Axis(name,stepAmp,controller = self)
+        self.channels[channel][alias] = Axis(name,stepAmp,controller = self,configure = configure)
     
     
-    def move(self,d1,d2,ch='def'):
+    def waitAxes(self,axes,rate):
+        """Waits until all axes are still, polling the status of every axis still moving
+        with a single batched TS query. Polls follow the :meth:`AGUC8.channel.Axis.pollDelays`
+        of the axis expected to finish last.
+
+        :param axes: Axes to wait for
+        :axes type: list
+        :param rate: Longest poll interval in milliseconds
+        :rate type: int
+        """
+        
+        moving = list(axes)
+        etas = [a.eta() for a in moving]
+        last = moving[etas.index(None)] if None in etas else moving[etas.index(max(etas))]
+        last.woken.clear()
+        for polls, delay in enumerate(last.pollDelays(rate), 1):
+            last.woken.wait(delay)
+            now = time.monotonic()
+            codes = self.pollStatus(moving)
+            for a, c in list(zip(moving, codes)):
+                if c == 0:
+                    a.still(now)
+                    moving.remove(a)
+                else:
+                    a.moving(now)
+            if not moving:
+                self.port.metrics.polled(polls)
+                return True
+            
+            
+    def _moveAxes(self,ch,moves,rate,concurrent,cancel=None):
+        
+        if concurrent is None:
+            concurrent = self.concurrent
+        if cancel is None:
+            cancel = self._cancel
+        axes = [self.channels[ch][alias] for alias in self.aliases]
+        if concurrent:
+            started = [a for a, m in zip(axes, moves) if m(a, cancel) is not False]
+            if started:
+                self.waitAxes(started, rate)
+        else:
+            for a, m in zip(axes, moves):
+                if m(a, cancel) is not False:
+                    a.amIstill(rate)
+        self.saveState()
+    
+    
+    def move(self,d1,d2,ch='def',concurrent=None,cancel=None):
         """Relative move.
 
         :param d1: Axis 1 relative position
@@ -117,6 +426,11 @@ class AGUC8(object):
         :d2 type: int
         :param ch: Channel number. Defaults to 'def' and uses self.defChannel.
         :ch type: str, optional
+        :param concurrent: Whether both axes move at the same time. Defaults to None and uses self.concurrent.
+        :concurrent type: bool, optional
+        :param cancel: Event that keeps the move from starting once set. Defaults to None, in which
+            case the move is cancelled by :meth:`stop`.
+        :cancel type: :class:`threading.Event`, optional
         """
         
         if ch == 'def':
@@ -124,61 +438,61 @@ class AGUC8(object):
         self.chchch(ch)
         
         logger.info('Moving to relative position: (' + str(d1) + ', ' + str(d2) + ')')
-        self.channels[ch][self.aliases[0]].jog(d1)
-        self.channels[ch][self.aliases[0]].amIstill(100)
-        self.channels[ch][self.aliases[1]].jog(d2)
-        self.channels[ch][self.aliases[1]].amIstill(100)
+        with self.port.metrics.operation('move'):
+            self._moveAxes(ch,[lambda a, c: a.jog(d1,c),lambda a, c: a.jog(d2,c)],100,concurrent,cancel)
         
     
-    def moveUpUp(self,ch='def'):
+    def moveUpUp(self,ch='def',concurrent=None):
         """Move to Axis 1 maximum, Axis 2 maximum.
 
         :param ch: Channel number. Defaults to 'def' and uses self.defChannel.
         :ch type: str, optional
+        :param concurrent: Whether both axes move at the same time. Defaults to None and uses self.concurrent.
+        :concurrent type: bool, optional
         """
-  
+        
         if ch == 'def':
             ch = ch=self.defChannel
         self.chchch(ch)
 
-        if self._limit_status == ch:        
+        if self._limit_status == ch:
             logger.info('Moving to: ' + self.aliases[0] + ' axis max, ' + self.aliases[1] + ' axis max')
-            self.channels[ch][self.aliases[0]].goMax()
-            self.channels[ch][self.aliases[0]].amIstill(RATE)
-            self.channels[ch][self.aliases[1]].goMax()
-            self.channels[ch][self.aliases[1]].amIstill(RATE)
+            with self.port.metrics.operation('moveUpUp'):
+                self._moveAxes(ch,[lambda a, c: a.goMax(cancel=c),lambda a, c: a.goMax(cancel=c)],RATE,concurrent)
         else:
             logger.warning('The device on the specified channel has no active limit switch.')
             return
         
         
-    def moveDownDown(self,ch='def'):
+    def moveDownDown(self,ch='def',concurrent=None):
         """Move to Axis 1 minimum, Axis 2 minimum.
 
         :param ch: Channel number. Defaults to 'def' and uses self.defChannel.
         :ch type: str, optional
+        :param concurrent: Whether both axes move at the same time. Defaults to None and uses self.concurrent.
+        :concurrent type: bool, optional
         """
         
         if ch == 'def':
             ch = ch=self.defChannel
         self.chchch(ch)
 
-        if self._limit_status == ch:        
+        if self._limit_status == ch:
             logger.info('Moving to: ' + self.aliases[0] + ' axis min, ' + self.aliases[1] + ' axis min')
-            self.channels[ch][self.aliases[0]].goMin()
-            self.channels[ch][self.aliases[0]].amIstill(RATE)
-            self.channels[ch][self.aliases[1]].goMin()
-            self.channels[ch][self.aliases[1]].amIstill(RATE)
+            with self.port.metrics.operation('moveDownDown'):
+                self._moveAxes(ch,[lambda a, c: a.goMin(cancel=c),lambda a, c: a.goMin(cancel=c)],RATE,concurrent)
         else:
             logger.warning('The device on the specified channel has no active limit switch.')
             return
         
         
-    def moveDownUp(self,ch='def'):
+    def moveDownUp(self,ch='def',concurrent=None):
         """Move to Axis 1 minimum, Axis 2 maximum.
 
         :param ch: Channel number. Defaults to 'def' and uses self.defChannel.
         :ch type: str, optional
+        :param concurrent: Whether both axes move at the same time. Defaults to None and uses self.concurrent.
+        :concurrent type: bool, optional
         """
         
         if ch == 'def':
@@ -187,57 +501,55 @@ class AGUC8(object):
 
         if self._limit_status == ch:
             logger.info('Moving to: ' + self.aliases[0] + ' axis min, ' + self.aliases[1] + ' axis max')
-            self.channels[ch][self.aliases[0]].goMin()
-            self.channels[ch][self.aliases[0]].amIstill(RATE)
-            self.channels[ch][self.aliases[1]].goMax()
-            self.channels[ch][self.aliases[1]].amIstill(RATE)
+            with self.port.metrics.operation('moveDownUp'):
+                self._moveAxes(ch,[lambda a, c: a.goMin(cancel=c),lambda a, c: a.goMax(cancel=c)],RATE,concurrent)
         else:
             logger.warning('The device on the specified channel has no active limit switch.')
             return
         
         
-    def moveUpDown(self,ch='def'):
+    def moveUpDown(self,ch='def',concurrent=None):
         """Move to Axis 1 maximum, Axis 2 minimum.
 
         :param ch: Channel number. Defaults to 'def' and uses self.defChannel.
         :ch type: str, optional
+        :param concurrent: Whether both axes move at the same time. Defaults to None and uses self.concurrent.
+        :concurrent type: bool, optional
         """
         
         if ch == 'def':
             ch = ch=self.defChannel
         self.chchch(ch)
+
         if self._limit_status == ch:
             logger.info('Moving to: ' + self.aliases[0] + ' axis max, ' + self.aliases[1] + ' axis min')
-            self.channels[ch][self.aliases[0]].goMax()
-            self.channels[ch][self.aliases[0]].amIstill(RATE)
-            self.channels[ch][self.aliases[1]].goMin()
-            self.channels[ch][self.aliases[1]].amIstill(RATE)
+            with self.port.metrics.operation('moveUpDown'):
+                self._moveAxes(ch,[lambda a, c: a.goMax(cancel=c),lambda a, c: a.goMin(cancel=c)],RATE,concurrent)
         else:
             logger.warning('The device on the specified channel has no active limit switch.')
             return
         
-
-    def goToZero(self,ch='def'):
+        
+    def goToZero(self,ch='def',concurrent=None):
         """Move to the zero position. If zero position hasn't been defined,
         it will move to the initial position of the device when powered on.
 
         :param ch: Channel number. Defaults to 'def' and uses self.defChannel.
         :ch type: str, optional
+        :param concurrent: Whether both axes move at the same time. Defaults to None and uses self.concurrent.
+        :concurrent type: bool, optional
         """
         
         if ch == 'def':
             ch = ch=self.defChannel
         self.chchch(ch)
         
-        steps1 = self.channels[ch][self.aliases[0]].queryCounter()
-        steps2 = self.channels[ch][self.aliases[1]].queryCounter()
+        with self.port.metrics.operation('goToZero'):
+            steps1, steps2 = self.counters(ch)
 
-        logger.info('Moving to zero position: relative position (' + str(steps1) + ', ' + str(steps2) + ')')
-        
-        self.channels[ch][self.aliases[0]].jog(-1*steps1)
-        self.channels[ch][self.aliases[0]].amIstill(150)
-        self.channels[ch][self.aliases[1]].jog(-1*steps2)
-        self.channels[ch][self.aliases[1]].amIstill(150)
+            logger.info('Moving to zero position: relative position (' + str(steps1) + ', ' + str(steps2) + ')')
+            
+            self._moveAxes(ch,[lambda a, c: a.jog(-1*steps1,c),lambda a, c: a.jog(-1*steps2,c)],150,concurrent)
         
     
     def setZero(self,ch='def'):
@@ -253,50 +565,296 @@ class AGUC8(object):
 
         logger.info('Setting zero position to current position')
         
-        self.channels[ch][self.aliases[0]].resetCounter()
-        self.channels[ch][self.aliases[1]].resetCounter()
+        axes = [self.channels[ch][alias] for alias in self.aliases]
+        self.port.sendBatch([a.command('ZP') for a in axes])
+        for a in axes:
+            a.__lastOp__ = 'reset'
+            a.offset = 0
+            a.setPosition(0)
+        self.saveState(force=True)
         
         
-    def stop(self,ch='def'):
-        """Stop ongoing motion.
+    def queryStatus(self,ch='def'):
+        """Query the status of both axes. Status codes are 0 ready, 1 stepping, 2 jogging
+        and 3 moving to limit.
 
         :param ch: Channel number. Defaults to 'def' and uses self.defChannel.
         :ch type: str, optional
+        :return: Status code of each axis, by alias
+        :rtype: dict
         """
         
         if ch == 'def':
             ch = ch=self.defChannel
+        snapshot = self.monitor.fresh()
+        if snapshot is not None and snapshot.channel == str(ch) and None not in snapshot.status.values():
+            return dict(snapshot.status)
         self.chchch(ch)
+        
+        axes = [self.channels[ch][alias] for alias in self.aliases]
+        return dict(zip(self.aliases, self.pollStatus(axes)))
+        
+        
+    def positions(self,ch='def'):
+        """Step counters of both axes. The driver tracks the counters from the moves it sends,
+        so the controller is only queried with TP, in a single batch, for the axes whose counter
+        became uncertain after a limit move, a stop or a reply error.
+
+        :param ch: Channel number. Defaults to 'def' and uses self.defChannel.
+        :ch type: str, optional
+        :return: Step counter of each axis, by alias
+        :rtype: dict
+        """
+        
+        if ch == 'def':
+            ch = ch=self.defChannel
+        
+        axes = [self.channels[ch][alias] for alias in self.aliases]
+        unknown = [alias for alias, a in zip(self.aliases, axes) if not a.positionKnown()]
+        read = {}
+        if unknown:
+            self.chchch(ch)
+            queries = [self.channels[ch][alias].command('TP') for alias in unknown]
+            for alias, q, r in zip(unknown, queries, self.port.sendBatch(queries)):
+                a = self.channels[ch][alias]
+                counter = codec.decode(q,r)
+                a.setCounter(counter)
+                # Still unknown while the axis moves, the value just read is the answer
+                read[alias] = None if counter is None else counter - a.offset
+        return {alias: read[alias] if alias in read else a.position() for alias, a in zip(self.aliases, axes)}
+        
+        
+    def counters(self,ch):
+        """Step counters of both axes, for moves relative to them. See :meth:`positions`.
+
+        :param ch: Channel number
+        :ch type: str
+        :return: Step counter of each axis, in the order of the aliases
+        :rtype: list
+        :raises AGUC8.errors.AGUC8Error: if a counter could not be read
+        """
+        
+        position = self.positions(ch)
+        steps = [position[alias] for alias in self.aliases]
+        if None in steps:
+            raise AGUC8Error('Could not read the step counters of channel ' + str(ch) + ': ' + str(position))
+        return steps
+        
+        
+    def eta(self,ch='def'):
+        """Predicted time until the moves in progress end. See :meth:`AGUC8.channel.Axis.eta`.
+
+        :param ch: Channel number. Defaults to 'def' and uses self.defChannel.
+        :ch type: str, optional
+        :return: Seconds until the end of the move of each axis, by alias. None if unpredictable.
+        :rtype: dict
+        """
+        
+        if ch == 'def':
+            ch = ch=self.defChannel
+        return {alias: self.channels[ch][alias].eta() for alias in self.aliases}
+        
+        
+    def stop(self,ch='def'):
+        """Stop ongoing motion. Does not wait for the operation in progress to return.
+        ST is sent ahead of any command waiting for the port, operations started before the
+        stop are cancelled, and the time until the axes are seen still is recorded in the
+        port metrics.
+
+        :param ch: Channel number, used when the active channel is unknown. The controller only
+            drives the active channel. Defaults to 'def' and uses self.defChannel.
+        :ch type: str, optional
+        """
+        
+        start = time.monotonic()
+        cancel, self._cancel = self._cancel, Event()
+        cancel.set()
+        if self.path is not None:
+            self.path.stop()
+        if self._channel is not None:
+            ch = self._channel
+        elif ch == 'def':
+            ch = self.defChannel
 
         logger.info('Stopping ongoing motion')
         
-        if self.mThread.isAlive():
-            self.mThread.stop_at_next_check = True
-            while self.mThread.isAlive():
-                continue
-            self.mThread = MotorThread()
-        self.channels[ch][self.aliases[0]].stop()
-        self.channels[ch][self.aliases[1]].stop()
+        # The active channel may have no axes configured: the controller is stopped all the same
+        axes = [self.channels[ch][alias] for alias in self.aliases] if self._active(ch) else []
+        queries = [codec.frame(n,'TS') for n in ('1','2')]
+        replies = self.port.sendUrgent([codec.frame(n,'ST') for n in ('1','2')] + queries)
+        for a in axes:
+            a.stopped()
+        while any(codec.decode(q,r) != 0 for q, r in zip(queries, replies)):
+            if time.monotonic() - start > STOPTIMEOUT:
+                logger.warning('Axes still moving ' + str(STOPTIMEOUT) + ' s after stop')
+                return
+            time.sleep(POLLMIN)
+            replies = self.port.sendUrgent(queries)
+        self.port.metrics.halted(time.monotonic() - start)
         
     
-    def followApath(self,path,ch='def'):
-        """Follow a path.
+    def _amps(self,ch):
+        
+        return tuple(int(self.channels[ch][alias].stepAmp) for alias in self.aliases)
+        
+        
+    def toSteps(self,moves,ch='def'):
+        """Converts relative moves in physical units to steps with the calibration of the axes
+        at their step amplitude. See :meth:`AGUC8.calibration.Calibration.toSteps`.
 
-        :param path: Path to be followed. List of tuples defining relative moves.
-        :path type: list
+        :param moves: Relative moves (d1, d2), shape (N, 2) or (2,)
+        :moves type: array_like
         :param ch: Channel number. Defaults to 'def' and uses self.defChannel.
         :ch type: str, optional
+        :rtype: numpy.ndarray
         """
         
         if ch == 'def':
             ch = ch=self.defChannel
-        self.chchch(ch)
+        return self.calibration.toSteps(ch,moves,self._amps(ch))
+        
+        
+    def toUnits(self,steps,ch='def'):
+        """Converts relative moves in steps to physical units. See :meth:`toSteps`.
+
+        :param steps: Relative moves (d1, d2), shape (N, 2) or (2,)
+        :steps type: array_like
+        :param ch: Channel number. Defaults to 'def' and uses self.defChannel.
+        :ch type: str, optional
+        :rtype: numpy.ndarray
+        """
+        
+        if ch == 'def':
+            ch = ch=self.defChannel
+        return self.calibration.toUnits(ch,steps,self._amps(ch))
+        
+        
+    def moveUnits(self,u1,u2,ch='def',concurrent=None):
+        """Relative move in physical units. See :meth:`move` and :meth:`toSteps`.
+
+        :param u1: Axis 1 relative position
+        :u1 type: float
+        :param u2: Axis 2 relative position
+        :u2 type: float
+        """
+        
+        d1, d2 = (int(d) for d in self.toSteps((u1,u2),ch))
+        self.move(d1,d2,ch,concurrent)
+        
+        
+    def followApathUnits(self,path,ch='def',wait=False):
+        """Follows a path of relative moves in physical units, converted to steps at once with
+        rounding errors carried along the path. See :meth:`followApath` and :meth:`toSteps`.
+
+        :param path: Relative moves (d1, d2), shape (N, 2)
+        :path type: array_like
+        """
+        
+        return self.followApath(self.toSteps(path,ch),ch,wait)
+        
+        
+    def scan(self,points,ch='def',dwell=0.,hook=None,measure=True,relative=True):
+        """Visits a list of points and records where each was reached. See :func:`AGUC8.scan.run`.
+
+        :param points: Points (d1, d2), offsets from the current position. Array of shape (N, 2)
+            or list of pairs.
+        :points type: array_like
+        :param ch: Channel number. Defaults to 'def' and uses self.defChannel.
+        :ch type: str, optional
+        :param dwell: Seconds to wait at each point before calling the hook. Defaults to 0.
+        :dwell type: float, optional
+        :param hook: Function, or name of a hook registered with :func:`AGUC8.scan.register`,
+            called at each point. Defaults to None.
+        :hook type: callable or str, optional
+        :param measure: Whether to read the step counters at each point. Defaults to True.
+        :measure type: bool, optional
+        :param relative: Whether points are offsets from the current position rather than step
+            counter values. Defaults to True.
+        :relative type: bool, optional
+        :return: NumPy arrays commanded, measured, time and values
+        :rtype: dict
+        """
+        
+        if ch == 'def':
+            ch = ch=self.defChannel
+        if self.path is not None and self.path.running():
+            raise RuntimeError('A path is being followed')
+        return scans.run(self,points,ch,dwell,hook,measure,relative)
+        
+        
+    def rasterScan(self,n1,n2,step1,step2=None,ch='def',dwell=0.,hook=None,measure=True):
+        """Serpentine raster scan of n1 x n2 points centred on the current position.
+        See :func:`AGUC8.scan.raster` and :meth:`scan`.
+        """
+        
+        return self.scan(scans.raster(n1,n2,step1,step2),ch,dwell,hook,measure)
+        
+        
+    def spiralScan(self,n,step1,step2=None,ch='def',dwell=0.,hook=None,measure=True):
+        """Square spiral scan of n points going out from the current position.
+        See :func:`AGUC8.scan.spiral` and :meth:`scan`.
+        """
+        
+        return self.scan(scans.spiral(n,step1,step2),ch,dwell,hook,measure)
+        
+    
+    def optimize(self,objective,method='pattern',ch='def',step=50,tol=1,budget=200,maximize=True,dwell=0.):
+        """Moves the axes of a channel to the extremum of a measured objective, then returns
+        the best point found. See :func:`AGUC8.optimize.run`.
+
+        :param objective: Callable of the (axis 1, axis 2) step counters, name of a registered
+            objective, or description of an RPC or simulated one. See :func:`AGUC8.optimize.objective`.
+        :objective type: callable, str or dict
+        :param method: 'coordinate', 'pattern' or 'neldermead'. Defaults to 'pattern'.
+        :method type: str, optional
+        :param ch: Channel number. Defaults to 'def' and uses self.defChannel.
+        :ch type: str, optional
+        :param step: Initial step size in steps. Defaults to 50.
+        :step type: int, optional
+        :param tol: Smallest step size in steps. Defaults to 1.
+        :tol type: int, optional
+        :param budget: Largest number of objective readings. Defaults to 200.
+        :budget type: int, optional
+        :param maximize: Whether to maximize rather than minimize. Defaults to True.
+        :maximize type: bool, optional
+        :param dwell: Seconds to wait at each point before reading. Defaults to 0.
+        :dwell type: float, optional
+        :return: best, value, evaluations, converged and history
+        :rtype: dict
+        """
+        
+        if ch == 'def':
+            ch = ch=self.defChannel
+        if self.path is not None and self.path.running():
+            raise RuntimeError('A path is being followed')
+        return optimizers.run(self,optimizers.objective(objective),ch,method,step,tol,budget,maximize,dwell)
+        
+    
+    def followApath(self,path,ch='def',wait=False):
+        """Follow a path of relative moves in a background thread.
+        Zero moves are dropped and consecutive moves along the same single axis are merged.
+
+        :param path: Path to be followed. List or iterable of tuples (d1, d2) defining relative moves,
+            or NumPy array of shape (N, 2).
+        :path type: iterable
+        :param ch: Channel number. Defaults to 'def' and uses self.defChannel.
+        :ch type: str, optional
+        :param wait: Whether to return only once the path has been followed. Defaults to False.
+        :wait type: bool, optional
+        :return: Runner of the path, which reports progress and can be stopped and restarted
+        :rtype: :class:`AGUC8.path.PathRunner`
+        """
+        
+        if ch == 'def':
+            ch = ch=self.defChannel
+        if self.path is not None and self.path.running():
+            raise RuntimeError('A path is already being followed')
 
         logger.info('Following a path')
         
-        steps = []
-        for p in path:
-            step = lambda: self.move(ch,p[0], p[1])
-            steps.append(step)
-        self.mThread.steps = steps
-        self.mThread.start()
+        self.path = PathRunner(self,path,ch)
+        if wait:
+            self.path.run()
+        else:
+            self.path.start()
+        return self.path
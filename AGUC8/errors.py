@@ -0,0 +1,24 @@
+## @package errors
+# This module contains the exceptions raised by the driver when the connection to the
+# controller fails, and by the RPC server when a motion is refused
+#
+
+
+class AGUC8Error(Exception):
+    """Base class of the exceptions raised by the driver."""
+
+
+class NotConnected(AGUC8Error, ConnectionError):
+    """The port could not be opened, or a lost connection could not be restored in time.
+    The commands of the exchange that raised it were not sent."""
+
+
+class CommandLost(AGUC8Error, ConnectionError):
+    """The connection dropped during an exchange that cannot be safely repeated, such as a
+    relative move. The commands may or may not have been executed; tracked positions are
+    invalidated, so the next position request reads the counters again."""
+
+
+class ChannelLeased(AGUC8Error):
+    """The channel is leased by another client, or the lease given with a motion expired or was
+    released. See :class:`AGUC8.lease.Leases`."""
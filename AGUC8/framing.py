@@ -0,0 +1,140 @@
+## @package framing
+# This module contains the framing of the replies read from the controller: a buffered line
+# reader, the per-command reply timeouts learned from the observed latencies and the matching
+# of reply lines to the queries they answer
+#
+
+import re
+import time
+
+from AGUC8 import codec
+
+## Reply line terminator
+TERMINATOR = b'\r\n'
+## Reply timeout in seconds used until enough latencies are observed, and the largest one
+TIMEOUT = 1.
+## Smallest reply timeout in seconds
+MINTIMEOUT = 0.05
+## Reply timeouts are this multiple of the latency quantile
+FACTOR = 3.
+## Latency quantile the reply timeouts are based on
+QUANTILE = 0.99
+## Number of observed latencies from which a command gets its own timeout
+SAMPLES = 20
+
+_REPLY = re.compile(r'^[0-9]*([A-Z]{2})')
+
+
+class FrameReader(object):
+    """Reads reply lines from a serial port. Bytes are read in chunks of whatever has arrived
+    into a buffer that is kept between calls, instead of one byte per read as
+    :meth:`serial.Serial.readline` does, so a line costs a few reads whatever its length.
+    A partial line left by a timeout stays buffered until :meth:`flush`.
+
+    :param ser: Serial port
+    :ser type: :class:`serial.Serial`
+    """
+
+    def __init__(self, ser):
+        """Constructor method
+        """
+        self.ser = ser
+        self._buffer = bytearray()
+        ## Number of reads from the port
+        self.reads = 0
+
+    def readline(self, timeout):
+        """Returns the next line, terminator included.
+
+        :param timeout: Seconds to wait for the line to be complete
+        :timeout type: float
+        :return: Line, or b'' if it was not complete in time
+        :rtype: bytes
+        """
+        deadline = time.monotonic() + timeout
+        buffer = self._buffer
+        while True:
+            end = buffer.find(TERMINATOR)
+            if end >= 0:
+                end += len(TERMINATOR)
+                line = bytes(buffer[:end])
+                del buffer[:end]
+                return line
+            if time.monotonic() >= deadline:
+                return b''
+            # Changing the timeout of a serial port reconfigures it, so only do it when needed
+            if self.ser.timeout != timeout:
+                self.ser.timeout = timeout
+            chunk = self.ser.read(max(1, self.ser.in_waiting))
+            self.reads += 1
+            buffer += chunk
+
+    def flush(self):
+        """Discards the buffered bytes and those waiting in the port.
+        """
+        self._buffer.clear()
+        self.ser.reset_input_buffer()
+
+
+class Timeouts(object):
+    """Reply timeout of each command, FACTOR times the QUANTILE of its observed latencies,
+    between MINTIMEOUT and TIMEOUT. Commands with fewer than SAMPLES observations get TIMEOUT.
+
+    :param metrics: Metrics the latencies are read from
+    :metrics type: :class:`AGUC8.metrics.Metrics`
+    """
+
+    def __init__(self, metrics, default=TIMEOUT, minimum=MINTIMEOUT, factor=FACTOR, quantile=QUANTILE,
+                 samples=SAMPLES):
+        """Constructor method
+        """
+        self.metrics = metrics
+        self.default = default
+        self.minimum = minimum
+        self.factor = factor
+        self.quantile = quantile
+        self.samples = samples
+
+    def get(self, mnemonic):
+        """Returns the reply timeout of a command.
+
+        :param mnemonic: Two letter mnemonic
+        :mnemonic type: str
+        :return: Seconds
+        :rtype: float
+        """
+        stats = self.metrics.commands.get(mnemonic)
+        if stats is None or stats.latency.count < self.samples:
+            return self.default
+        return min(max(self.factor*stats.latency.quantile(self.quantile), self.minimum), self.default)
+
+
+def isReply(line):
+    """Returns whether a line is the reply to a command of the AG-UC8 command set, e.g. '1TS0'.
+    The VE reply is not recognized.
+
+    :param line: Reply, without terminator
+    :line type: str
+    :rtype: bool
+    """
+    m = _REPLY.match(line)
+    return m is not None and m.group(1) in codec.COMMANDS
+
+
+def match(queries, reply):
+    """Finds the query a reply line answers among queries still waiting for their reply.
+
+    :param queries: Queries in the order they were sent
+    :queries type: list of :class:`AGUC8.codec.Frame`
+    :param reply: Reply, without terminator
+    :reply type: str
+    :return: Index of the query, 0 for a line that is not a recognizable reply (VE replies,
+        garbled lines), None for the reply to a query of an earlier exchange
+    :rtype: int or None
+    """
+    for i, q in enumerate(queries):
+        if reply.startswith(q.echo):
+            return i
+    if isReply(reply):
+        return None
+    return 0
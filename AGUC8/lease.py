@@ -0,0 +1,169 @@
+## @package lease
+# This module contains the channel leases of the RPC server, with which a client reserves the
+# motions of a channel for itself while several clients share one controller
+#
+
+import asyncio
+import logging
+import time
+import uuid
+
+from AGUC8.errors import ChannelLeased
+
+logger = logging.getLogger(__name__)
+
+## Default lease duration in seconds
+DURATION = 60.
+
+
+class Lease(object):
+    """Lease of one channel.
+
+    :param channel: Channel leased
+    :channel type: str
+    :param duration: Seconds until the lease expires
+    :duration type: float
+    :param owner: Free text naming the holder, e.g. the experiment. Defaults to None.
+    :owner type: str, optional
+    """
+
+    def __init__(self, channel, duration, owner=None):
+        """Constructor method
+        """
+        self.token = uuid.uuid4().hex
+        self.channel = channel
+        self.owner = owner
+        self.granted = time.time()
+        self.expires = time.monotonic() + duration
+
+    def remaining(self):
+        """Returns the seconds until the lease expires, negative once it expired.
+
+        :rtype: float
+        """
+        return self.expires - time.monotonic()
+
+    def status(self):
+        """Returns the lease as plain types, without its token.
+
+        :return: channel, owner, granted (time.time()) and remaining (seconds)
+        :rtype: dict
+        """
+        return {'channel': self.channel, 'owner': self.owner, 'granted': self.granted,
+                'remaining': self.remaining()}
+
+
+class Leases(object):
+    """Leases of the channels of one controller. A leased channel only runs the motions given
+    the token of its lease; motions of other clients fail with
+    :class:`AGUC8.errors.ChannelLeased`. Status reads and stops are never refused. A lease ends
+    when released or when it expires without being renewed, so a crashed client does not hold
+    a channel forever.
+    """
+
+    def __init__(self):
+        """Constructor method
+        """
+        self._leases = {}
+        self._released = None
+
+    def _holder(self, ch):
+        lease = self._leases.get(ch)
+        if lease is not None and lease.remaining() <= 0:
+            logger.info('Lease of channel ' + ch + ' by ' + str(lease.owner) + ' expired')
+            del self._leases[ch]
+            lease = None
+        return lease
+
+    async def acquire(self, ch, duration=DURATION, owner=None, wait=0.):
+        """Leases a channel. Must be called from the event loop.
+
+        :param ch: Channel
+        :ch type: str
+        :param duration: Seconds until the lease expires. Defaults to DURATION.
+        :duration type: float, optional
+        :param owner: Free text naming the holder. Defaults to None.
+        :owner type: str, optional
+        :param wait: Seconds to wait for a channel leased by another client. Defaults to 0.
+        :wait type: float, optional
+        :return: Token of the lease
+        :rtype: str
+        :raises AGUC8.errors.ChannelLeased: if the channel is still leased after wait
+        """
+        ch = str(ch)
+        deadline = time.monotonic() + wait
+        if self._released is None:
+            self._released = asyncio.Condition()
+        async with self._released:
+            while True:
+                holder = self._holder(ch)
+                if holder is None:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise ChannelLeased('Channel ' + ch + ' is leased by ' + str(holder.owner) + ' for '
+                                        + '{:.1f}'.format(holder.remaining()) + ' s')
+                try:
+                    await asyncio.wait_for(self._released.wait(), min(remaining, holder.remaining()))
+                except asyncio.TimeoutError:
+                    pass
+        lease = self._leases[ch] = Lease(ch, duration, owner)
+        logger.info('Channel ' + ch + ' leased by ' + str(owner) + ' for ' + str(duration) + ' s')
+        return lease.token
+
+    def _find(self, token):
+        for ch in list(self._leases):
+            lease = self._holder(ch)
+            if lease is not None and lease.token == token:
+                return lease
+        raise ChannelLeased('No lease with this token, it expired or was released')
+
+    def renew(self, token, duration=DURATION):
+        """Extends a lease to duration seconds from now.
+
+        :param token: Token of the lease
+        :token type: str
+        :param duration: Seconds until the lease expires. Defaults to DURATION.
+        :duration type: float, optional
+        :raises AGUC8.errors.ChannelLeased: if the lease expired or was released
+        """
+        self._find(token).expires = time.monotonic() + duration
+
+    async def release(self, token):
+        """Ends a lease. Releasing a lease that already ended does nothing.
+
+        :param token: Token of the lease
+        :token type: str
+        """
+        try:
+            lease = self._find(token)
+        except ChannelLeased:
+            return
+        del self._leases[lease.channel]
+        logger.info('Channel ' + lease.channel + ' released by ' + str(lease.owner))
+        if self._released is not None:
+            async with self._released:
+                self._released.notify_all()
+
+    def check(self, ch, token=None):
+        """Checks that a motion may run on a channel.
+
+        :param ch: Channel
+        :ch type: str
+        :param token: Token given with the motion. Defaults to None.
+        :token type: str, optional
+        :raises AGUC8.errors.ChannelLeased: if the channel is leased with another token, or a
+            token was given that does not hold the channel
+        """
+        holder = self._holder(str(ch))
+        if holder is not None and holder.token != token:
+            raise ChannelLeased('Channel ' + str(ch) + ' is leased by ' + str(holder.owner))
+        if holder is None and token is not None:
+            raise ChannelLeased('The lease of channel ' + str(ch) + ' expired or was released')
+
+    def all(self):
+        """Returns the leases in force.
+
+        :rtype: list of :class:`Lease`
+        """
+        return [lease for lease in (self._holder(ch) for ch in list(self._leases)) if lease is not None]
@@ -0,0 +1,273 @@
+## @package metrics
+# This module contains the instrumentation of the serial exchanges and driver operations
+#
+
+from contextlib import contextmanager
+import re
+import threading
+import time
+
+## Upper bounds of the time histogram buckets in seconds
+BUCKETS = (0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1., 2., 5., 10., 30., 60.)
+## Upper bounds of the polls per move histogram buckets
+POLLBUCKETS = (1, 2, 3, 5, 10, 20, 50, 100, 200, 500, 1000)
+## Upper bounds of the queue depth histogram buckets
+DEPTHBUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+_MNEMONIC = re.compile(r'^\s*[0-9]*([A-Za-z]{2})')
+
+
+def mnemonic(command):
+    """Returns the two letter mnemonic of a command, e.g. 'TS' for '1TS\\r\\n'.
+
+    :param command: Command
+    :command type: str or :class:`AGUC8.codec.Frame`
+    :rtype: str
+    """
+    m = getattr(command, 'mnemonic', None)
+    if m is not None:
+        return m
+    m = _MNEMONIC.match(command)
+    return m.group(1).upper() if m else '??'
+
+
+class Histogram(object):
+    """Histogram with fixed buckets.
+
+    :param buckets: Upper bounds of the buckets, increasing
+    :buckets type: tuple
+    """
+
+    def __init__(self, buckets=BUCKETS):
+        """Constructor method
+        """
+        self.buckets = buckets
+        self.counts = [0]*(len(buckets) + 1)
+        self.sum = 0.
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                break
+        else:
+            i = len(self.buckets)
+        self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Estimates a quantile as the upper bound of the bucket that contains it.
+        Returns None when empty and inf when it falls above the last bucket.
+        """
+        if not self.count:
+            return None
+        rank = q*self.count
+        seen = 0
+        for bound, n in zip(self.buckets, self.counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+    def snapshot(self):
+        return {'buckets': list(self.buckets), 'counts': list(self.counts), 'sum': self.sum, 'count': self.count}
+
+
+class CommandStats(object):
+    """Statistics of one command mnemonic."""
+
+    def __init__(self):
+        """Constructor method
+        """
+        self.sent = 0
+        self.timeouts = 0
+        self.bytesOut = 0
+        self.bytesIn = 0
+        self.write = Histogram()
+        self.latency = Histogram()
+
+    def snapshot(self):
+        return {'sent': self.sent, 'timeouts': self.timeouts, 'bytesOut': self.bytesOut,
+                'bytesIn': self.bytesIn, 'write': self.write.snapshot(), 'latency': self.latency.snapshot()}
+
+
+class Metrics(object):
+    """Counters and histograms of the traffic on one port and of the driver operations:
+    per mnemonic write times, round trip latencies, timeouts and bytes in and out, late replies,
+    the number of TS polls per move, the duration of whole operations, the time from a stop
+    request to the axes being seen still, the time taken to restore lost connections, and the
+    depth of the operation queue of the RPC server and the time operations wait in it.
+    """
+
+    def __init__(self):
+        """Constructor method
+        """
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Clears every counter and histogram.
+        """
+        with self.lock:
+            self.commands = {}
+            self.polls = Histogram(POLLBUCKETS)
+            self.operations = {}
+            self.stops = Histogram()
+            self.outages = Histogram()
+            self.stale = 0
+            self.depth = 0
+            self.ahead = Histogram(DEPTHBUCKETS)
+            self.waits = {}
+            self.since = time.time()
+
+    def _command(self, m):
+        stats = self.commands.get(m)
+        if stats is None:
+            stats = self.commands[m] = CommandStats()
+        return stats
+
+    def written(self, commands, seconds):
+        """Records commands sent in a single write that took seconds."""
+        with self.lock:
+            for c in commands:
+                stats = self._command(mnemonic(c))
+                stats.sent += 1
+                stats.bytesOut += len(c)
+                stats.write.observe(seconds)
+
+    def replied(self, command, nbytes, seconds):
+        """Records a reply of nbytes bytes received seconds after its command was written.
+        A reply with no bytes is counted as a timeout."""
+        with self.lock:
+            stats = self._command(mnemonic(command))
+            if nbytes:
+                stats.bytesIn += nbytes
+                stats.latency.observe(seconds)
+            else:
+                stats.timeouts += 1
+
+    def discarded(self):
+        """Records a late reply, to a query of an earlier exchange, that was discarded."""
+        with self.lock:
+            self.stale += 1
+
+    def polled(self, polls):
+        """Records the number of TS polls needed to see a move end."""
+        with self.lock:
+            self.polls.observe(polls)
+
+    def halted(self, seconds):
+        """Records the time from a stop request to the axes being seen still."""
+        with self.lock:
+            self.stops.observe(seconds)
+
+    def reconnected(self, seconds):
+        """Records the time from a connection loss to its restoration."""
+        with self.lock:
+            self.outages.observe(seconds)
+
+    def queued(self, depth):
+        """Records an operation queued behind depth others."""
+        with self.lock:
+            self.ahead.observe(depth)
+            self.depth = depth + 1
+
+    def dequeued(self, priority, seconds, depth):
+        """Records an operation of a priority that waited seconds in the queue, leaving depth
+        operations queued."""
+        with self.lock:
+            histogram = self.waits.get(priority)
+            if histogram is None:
+                histogram = self.waits[priority] = Histogram()
+            histogram.observe(seconds)
+            self.depth = depth
+
+    @contextmanager
+    def operation(self, name):
+        """Context manager that records the duration of a driver operation."""
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            seconds = time.monotonic() - start
+            with self.lock:
+                histogram = self.operations.get(name)
+                if histogram is None:
+                    histogram = self.operations[name] = Histogram()
+                histogram.observe(seconds)
+
+    def snapshot(self):
+        """Returns every counter and histogram as plain dictionaries and lists.
+
+        :rtype: dict
+        """
+        with self.lock:
+            return {'since': self.since,
+                    'commands': {m: s.snapshot() for m, s in self.commands.items()},
+                    'pollsPerMove': self.polls.snapshot(),
+                    'stopLatency': self.stops.snapshot(),
+                    'reconnectTime': self.outages.snapshot(),
+                    'staleReplies': self.stale,
+                    'queueDepth': self.depth,
+                    'queuedAhead': self.ahead.snapshot(),
+                    'queueWait': {p: h.snapshot() for p, h in self.waits.items()},
+                    'operations': {n: h.snapshot() for n, h in self.operations.items()}}
+
+    def prometheus(self, prefix='aguc8', labels=None):
+        """Returns the metrics in the Prometheus text exposition format.
+
+        :param prefix: Prefix of the metric names
+        :prefix type: str
+        :param labels: Labels added to every sample, e.g. {'controller': 'mirror1'}
+        :labels type: dict, optional
+        :rtype: str
+        """
+        labels = dict(labels or {})
+        lines = []
+
+        def fmt(extra):
+            items = sorted(labels.items()) + list(extra.items())
+            if not items:
+                return ''
+            return '{' + ','.join('{}="{}"'.format(k, v) for k, v in items) + '}'
+
+        def histogram(name, h, extra):
+            seen = 0
+            for bound, n in zip(h.buckets, h.counts):
+                seen += n
+                lines.append('{}_bucket{} {}'.format(name, fmt(dict(extra, le=repr(float(bound)))), seen))
+            lines.append('{}_bucket{} {}'.format(name, fmt(dict(extra, le='+Inf')), h.count))
+            lines.append('{}_sum{} {!r}'.format(name, fmt(extra), float(h.sum)))
+            lines.append('{}_count{} {}'.format(name, fmt(extra), h.count))
+
+        with self.lock:
+            commands = sorted(self.commands.items())
+            for name, field in (('commands_sent_total', 'sent'), ('command_timeouts_total', 'timeouts'),
+                                ('bytes_sent_total', 'bytesOut'), ('bytes_received_total', 'bytesIn')):
+                lines.append('# TYPE {}_{} counter'.format(prefix, name))
+                for m, s in commands:
+                    lines.append('{}_{}{} {}'.format(prefix, name, fmt({'mnemonic': m}), getattr(s, field)))
+            for name, field in (('command_write_seconds', 'write'), ('command_latency_seconds', 'latency')):
+                lines.append('# TYPE {}_{} histogram'.format(prefix, name))
+                for m, s in commands:
+                    histogram(prefix + '_' + name, getattr(s, field), {'mnemonic': m})
+            lines.append('# TYPE {}_stale_replies_total counter'.format(prefix))
+            lines.append('{}_stale_replies_total{} {}'.format(prefix, fmt({}), self.stale))
+            lines.append('# TYPE {}_polls_per_move histogram'.format(prefix))
+            histogram(prefix + '_polls_per_move', self.polls, {})
+            lines.append('# TYPE {}_stop_latency_seconds histogram'.format(prefix))
+            histogram(prefix + '_stop_latency_seconds', self.stops, {})
+            lines.append('# TYPE {}_reconnect_seconds histogram'.format(prefix))
+            histogram(prefix + '_reconnect_seconds', self.outages, {})
+            lines.append('# TYPE {}_queue_depth gauge'.format(prefix))
+            lines.append('{}_queue_depth{} {}'.format(prefix, fmt({}), self.depth))
+            lines.append('# TYPE {}_queued_ahead histogram'.format(prefix))
+            histogram(prefix + '_queued_ahead', self.ahead, {})
+            lines.append('# TYPE {}_queue_wait_seconds histogram'.format(prefix))
+            for p, h in sorted(self.waits.items()):
+                histogram(prefix + '_queue_wait_seconds', h, {'priority': p})
+            lines.append('# TYPE {}_operation_seconds histogram'.format(prefix))
+            for n, h in sorted(self.operations.items()):
+                histogram(prefix + '_operation_seconds', h, {'operation': n})
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,163 @@
+## @package monitor
+# This module contains the status monitor, which keeps the latest limit switch and axis status
+# of a controller in an immutable snapshot
+#
+
+from collections import namedtuple
+from threading import Thread, Event, Lock
+from types import MappingProxyType
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+## Default seconds between monitor polls
+INTERVAL = 0.1
+
+
+class Snapshot(namedtuple('Snapshot', 'time channel limits status')):
+    """Status of a controller at one time. Snapshots are never modified: a new one replaces
+    the last after every poll, so readers can keep one without locking.
+
+    :param time: time.monotonic() of the poll
+    :param channel: Active channel, None if unknown
+    :param limits: PH value, a bit field of the axes at a limit switch (1: axis 1, 2: axis 2),
+        None if not polled yet
+    :param status: Read-only mapping of axis alias to TS status code (0 ready, 1 stepping,
+        2 jogging, 3 moving to limit), None for an axis not polled yet
+    """
+
+    __slots__ = ()
+
+    def moving(self):
+        """Returns whether any axis of the active channel was moving.
+
+        :rtype: bool
+        """
+        return any(code for code in self.status.values())
+
+    def atLimit(self, axis):
+        """Returns whether an axis was at a limit switch.
+
+        :param axis: Axis number, '1' or '2'
+        :axis type: str
+        :rtype: bool
+        """
+        return bool(self.limits and self.limits & int(axis))
+
+    def asdict(self):
+        """Returns the snapshot as plain types.
+
+        :rtype: dict
+        """
+        return {'time': self.time, 'channel': self.channel, 'limits': self.limits,
+                'status': dict(self.status)}
+
+
+class Monitor(object):
+    """Keeps the latest status of a controller. Every TS and PH poll of the driver is published
+    to the monitor; when started, the monitor thread also polls PH and the TS of the active
+    channel in one batch whenever no poll was published for interval seconds. While the driver
+    waits for a move its polls carry PH too, so the monitor has nothing to add and the line
+    never carries two status poll streams.
+
+    :param controller: Controller to monitor
+    :controller type: :class:`AGUC8.driver.AGUC8`
+    :param interval: Seconds between polls. Defaults to INTERVAL.
+    :interval type: float, optional
+    """
+
+    def __init__(self, controller, interval=INTERVAL):
+        """Constructor method
+        """
+        self.controller = controller
+        self.interval = interval
+        self._lock = Lock()
+        self._snapshot = Snapshot(0., None, None, MappingProxyType({alias: None for alias in controller.aliases}))
+        self._stop = Event()
+        self._thread = None
+
+    def snapshot(self):
+        """Returns the latest snapshot.
+
+        :rtype: :class:`Snapshot`
+        """
+        return self._snapshot
+
+    def fresh(self, maxAge=None):
+        """Returns the latest snapshot if it is recent enough to be used instead of polling.
+
+        :param maxAge: Age limit in seconds. Defaults to None: twice the interval while the
+            monitor runs, in which case no snapshot is fresh when it does not run.
+        :maxAge type: float, optional
+        :rtype: :class:`Snapshot` or None
+        """
+        if maxAge is None:
+            if not self.running():
+                return None
+            maxAge = 2*self.interval
+        snapshot = self._snapshot
+        if time.monotonic() - snapshot.time > maxAge:
+            return None
+        return snapshot
+
+    def publish(self, when, channel, status=None, limits=None):
+        """Merges the results of a poll into a new snapshot.
+
+        :param when: time.monotonic() of the poll
+        :when type: float
+        :param channel: Active channel at the time of the poll
+        :channel type: str
+        :param status: TS status codes by alias. Defaults to None (not polled).
+        :status type: dict, optional
+        :param limits: PH value. Defaults to None (not polled).
+        :limits type: int, optional
+        :return: New snapshot
+        :rtype: :class:`Snapshot`
+        """
+        with self._lock:
+            last = self._snapshot
+            if channel == last.channel:
+                merged = dict(last.status)
+            else:
+                merged = {alias: None for alias in last.status}
+            if status:
+                merged.update(status)
+            self._snapshot = Snapshot(max(when, last.time), channel,
+                                      last.limits if limits is None else limits, MappingProxyType(merged))
+            return self._snapshot
+
+    def start(self):
+        """Starts the monitor thread.
+        """
+        if self.running():
+            return
+        self._stop.clear()
+        self._thread = Thread(target=self._run, name='AGUC8 monitor', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stops the monitor thread and waits for it.
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def running(self):
+        """Returns whether the monitor thread runs.
+
+        :rtype: bool
+        """
+        return self._thread is not None and self._thread.is_alive() and not self._stop.is_set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            wait = self._snapshot.time + self.interval - time.monotonic()
+            if wait > 0:
+                self._stop.wait(wait)
+                continue
+            try:
+                self.controller.pollStatus()
+            except Exception:
+                logger.exception('Status poll failed')
+                self._stop.wait(self.interval)
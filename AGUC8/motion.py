@@ -0,0 +1,197 @@
+## @package motion
+# This module contains the motion handles of the RPC server: operations queued without waiting
+# for them, identified by a number with which they can be polled, waited for and cancelled
+#
+
+import asyncio
+from collections import OrderedDict
+import itertools
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+## States of a motion
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+
+## Default number of finished motions kept for status and wait
+HISTORY = 100
+
+
+class Motion(object):
+    """One queued operation.
+
+    :param id: Motion number
+    :id type: int
+    :param operation: Name of the operation, e.g. 'move'
+    :operation type: str
+    :param channel: Channel the operation runs on
+    :channel type: str
+    """
+
+    def __init__(self, id, operation, channel):
+        """Constructor method
+        """
+        self.id = id
+        self.operation = operation
+        self.channel = channel
+        self.state = QUEUED
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self.result = None
+        self.error = None
+        ## Whether cancel stopped the motion while it ran
+        self.cancelled = False
+        self.task = None
+
+    def done(self):
+        """Returns whether the motion ended, whatever the outcome.
+
+        :rtype: bool
+        """
+        return self.state in (DONE, FAILED, CANCELLED)
+
+    def status(self):
+        """Returns the motion as plain types.
+
+        :return: id, operation, channel, state, submitted, started and finished (time.time(),
+            None until then), result (once done) and error (repr of the exception, once failed)
+        :rtype: dict
+        """
+        return {'id': self.id, 'operation': self.operation, 'channel': self.channel,
+                'state': self.state, 'submitted': self.submitted, 'started': self.started,
+                'finished': self.finished, 'result': self.result,
+                'error': None if self.error is None else repr(self.error)}
+
+
+class Motions(object):
+    """Motions of one controller. Each runs through the controller's
+    :class:`AGUC8.scheduler.ChannelScheduler`, so it waits for the operations queued before it,
+    and the caller gets its id at once. Motions that did not end are always kept, and the last
+    history finished ones.
+
+    :param history: Number of finished motions kept. Defaults to HISTORY.
+    :history type: int, optional
+    """
+
+    def __init__(self, history=HISTORY):
+        """Constructor method
+        """
+        self.history = history
+        self._motions = OrderedDict()
+        self._ids = itertools.count(1)
+
+    def start(self, operation, ch, scheduler, function, *args, lease=None):
+        """Queues a coroutine function in a scheduler without waiting for it. Must be called
+        from the event loop.
+
+        :param operation: Name of the operation
+        :operation type: str
+        :param ch: Channel the operation runs on
+        :ch type: str
+        :param scheduler: Scheduler of the controller
+        :scheduler type: :class:`AGUC8.scheduler.ChannelScheduler`
+        :param function: Coroutine function, called with args
+        :function type: callable
+        :param lease: Token of the lease of the channel. Defaults to None.
+        :lease type: str, optional
+        :return: Motion id
+        :rtype: int
+        """
+        motion = Motion(next(self._ids), operation, str(ch))
+
+        async def run(*args):
+            motion.state = RUNNING
+            motion.started = time.time()
+            return await function(*args)
+
+        async def track():
+            try:
+                motion.result = await scheduler.submit(ch, run, *args, lease=lease)
+                motion.state = CANCELLED if motion.cancelled else DONE
+            except asyncio.CancelledError:
+                motion.state = CANCELLED
+            except Exception as e:
+                logger.warning('Motion ' + str(motion.id) + ' (' + operation + ') failed: ' + repr(e))
+                motion.state = FAILED
+                motion.error = e
+            finally:
+                motion.finished = time.time()
+                self._prune()
+
+        motion.task = asyncio.ensure_future(track())
+        self._motions[motion.id] = motion
+        return motion.id
+
+    def get(self, id):
+        """Returns a motion.
+
+        :param id: Motion id
+        :id type: int
+        :rtype: :class:`Motion`
+        """
+        try:
+            return self._motions[int(id)]
+        except KeyError:
+            raise ValueError('Unknown motion id: {!r}'.format(id))
+
+    def all(self):
+        """Returns the motions kept, oldest first.
+
+        :rtype: list
+        """
+        return list(self._motions.values())
+
+    async def wait(self, id, timeout=None):
+        """Waits for a motion to end.
+
+        :param id: Motion id
+        :id type: int
+        :param timeout: Seconds to wait at most. Defaults to None (no limit).
+        :timeout type: float, optional
+        :return: Status of the motion, see :meth:`Motion.status`. Its state is still queued or
+            running if the timeout expired.
+        :rtype: dict
+        :raises Exception: the exception raised by the operation, if it failed
+        """
+        motion = self.get(id)
+        if not motion.done():
+            await asyncio.wait([motion.task], timeout=timeout)
+        if motion.state == FAILED:
+            raise motion.error
+        return motion.status()
+
+    async def cancel(self, id, stop):
+        """Cancels a motion. A queued motion is removed from the queue; a running one is
+        stopped with stop, which halts the controller.
+
+        :param id: Motion id
+        :id type: int
+        :param stop: Coroutine function called with the channel to stop a running motion
+        :stop type: callable
+        :return: Status of the motion once it ended
+        :rtype: dict
+        """
+        motion = self.get(id)
+        if motion.state == QUEUED:
+            motion.task.cancel()
+        elif motion.state == RUNNING:
+            motion.cancelled = True
+            await stop(motion.channel)
+        if not motion.done():
+            await asyncio.wait([motion.task])
+        if not motion.done():
+            # Cancelled before it reached the scheduler
+            motion.state = CANCELLED
+            motion.finished = time.time()
+        return motion.status()
+
+    def _prune(self):
+        finished = [id for id, m in self._motions.items() if m.done()]
+        for id in finished[:max(len(finished) - self.history, 0)]:
+            del self._motions[id]
@@ -0,0 +1,326 @@
+## @package optimize
+# This module contains the closed loop optimizers that move the two axes of a channel to the
+# extremum of a measured objective, and the objective sources they read from
+#
+
+import logging
+import math
+import random
+import time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+## Optimization methods
+METHODS = ('coordinate', 'pattern', 'neldermead')
+
+## Objectives by name, see :func:`register`
+objectives = {}
+
+
+def register(name, function=None):
+    """Registers an objective under a name, so that optimizations requested over RPC can use it.
+    Can be used as a decorator: ``@register('photodiode')``.
+
+    An objective is called as function(position), position being the (axis 1, axis 2) step
+    counters, once the axes are there, and returns the measured value.
+
+    :param name: Objective name
+    :name type: str
+    :param function: Objective
+    :function type: callable
+    """
+    if function is None:
+        return lambda f: register(name, f)
+    objectives[name] = function
+    return function
+
+
+class RPCObjective(object):
+    """Objective read from a sipyco RPC target, e.g. a photodiode controller. The method is
+    called with the given arguments; the axis position is not passed.
+
+    :param host: RPC server host
+    :host type: str
+    :param port: RPC server port
+    :port type: int
+    :param target: RPC target name
+    :target type: str
+    :param method: Method returning the measured value
+    :method type: str
+    :param args: Arguments of the method. Defaults to ().
+    :args type: list, optional
+    """
+
+    def __init__(self, host, port, target, method, args=()):
+        """Constructor method
+        """
+        self.host = host
+        self.port = port
+        self.target = target
+        self.method = method
+        self.args = tuple(args)
+        self._client = None
+
+    def __call__(self, position):
+        if self._client is None:
+            from sipyco.pc_rpc import Client
+            self._client = Client(self.host, self.port, self.target)
+        try:
+            return float(getattr(self._client, self.method)(*self.args))
+        except Exception:
+            self.close()
+            raise
+
+    def close(self):
+        """Closes the connection to the RPC server.
+        """
+        if self._client is not None:
+            self._client.close_rpc()
+            self._client = None
+
+
+class GaussianObjective(object):
+    """Stand-in objective for testing: a Gaussian beam profile over the step counters.
+
+    :param center: Step counters (axis 1, axis 2) of the peak. Defaults to (0, 0).
+    :center type: tuple, optional
+    :param width: Standard deviation in steps. Defaults to 200.
+    :width type: float, optional
+    :param peak: Value at the peak. Defaults to 1.
+    :peak type: float, optional
+    :param noise: Standard deviation of the Gaussian noise added to each reading. Defaults to 0.
+    :noise type: float, optional
+    :param seed: Seed of the noise. Defaults to None.
+    :seed type: int, optional
+    """
+
+    def __init__(self, center=(0, 0), width=200., peak=1., noise=0., seed=None):
+        """Constructor method
+        """
+        self.center = tuple(center)
+        self.width = float(width)
+        self.peak = float(peak)
+        self.noise = float(noise)
+        self._random = random.Random(seed)
+
+    def __call__(self, position):
+        r2 = (position[0] - self.center[0])**2 + (position[1] - self.center[1])**2
+        value = self.peak*math.exp(-0.5*r2/self.width**2)
+        if self.noise:
+            value += self._random.gauss(0., self.noise)
+        return value
+
+
+def objective(spec):
+    """Returns the objective described by spec.
+
+    :param spec: A callable, the name of a registered objective, {'rpc': {'host', 'port',
+        'target', 'method', ['args']}} or {'gaussian': {GaussianObjective arguments}}
+    :spec type: callable, str or dict
+    :rtype: callable
+    """
+    if callable(spec):
+        return spec
+    if isinstance(spec, str):
+        try:
+            return objectives[spec]
+        except KeyError:
+            raise ValueError('Unknown objective: {!r}'.format(spec))
+    if isinstance(spec, dict) and len(spec) == 1:
+        (kind, options), = spec.items()
+        if kind == 'rpc':
+            return RPCObjective(**options)
+        if kind == 'gaussian':
+            return GaussianObjective(**options)
+    raise ValueError('Unknown objective: {!r}'.format(spec))
+
+
+class Stopped(Exception):
+    """Raised inside an optimization when the controller is stopped or the budget is spent."""
+
+
+class _Probe(object):
+    """Moves the axes to integer step positions and reads the objective there. Readings are
+    cached, so revisiting a point costs nothing."""
+
+    def __init__(self, controller, function, ch, maximize, budget, dwell):
+        self.controller = controller
+        self.function = function
+        self.ch = ch
+        self.sign = -1. if maximize else 1.
+        self.budget = budget
+        self.dwell = dwell
+        self.cancel = controller._cancel
+        self.current = tuple(controller.counters(ch))
+        self.cache = {}
+        self.history = []
+
+    def __call__(self, point):
+        """Returns the objective at point, to be minimized."""
+        point = (int(round(point[0])), int(round(point[1])))
+        if point in self.cache:
+            return self.cache[point]
+        if len(self.history) >= self.budget or self.cancel.is_set():
+            raise Stopped()
+        self.moveTo(point)
+        if self.dwell > 0:
+            self.cancel.wait(self.dwell)
+        if self.cancel.is_set():
+            raise Stopped()
+        value = float(self.function(point))
+        self.history.append((point[0], point[1], value, time.time()))
+        self.cache[point] = self.sign*value
+        return self.cache[point]
+
+    def moveTo(self, point):
+        d1, d2 = point[0] - self.current[0], point[1] - self.current[1]
+        if d1 or d2:
+            self.controller.move(d1, d2, self.ch, cancel=self.cancel)
+        if not self.cancel.is_set():
+            self.current = point
+
+
+def _coordinate(f, x, step, tol):
+    fx = f(x)
+    while step >= tol:
+        improved = False
+        for axis in (0, 1):
+            for direction in (1, -1):
+                moved = False
+                while True:
+                    y = list(x)
+                    y[axis] += direction*step
+                    y = tuple(y)
+                    fy = f(y)
+                    if fy >= fx:
+                        break
+                    x, fx, moved = y, fy, True
+                if moved:
+                    improved = True
+                    break
+        if not improved:
+            step //= 2
+    return x
+
+
+def _pattern(f, x, step, tol):
+    def explore(base, fbase, step):
+        best, fbest = base, fbase
+        for axis in (0, 1):
+            for direction in (1, -1):
+                y = list(best)
+                y[axis] += direction*step
+                y = tuple(y)
+                fy = f(y)
+                if fy < fbest:
+                    best, fbest = y, fy
+                    break
+        return best, fbest
+
+    fx = f(x)
+    while step >= tol:
+        y, fy = explore(x, fx, step)
+        if fy >= fx:
+            step //= 2
+            continue
+        # Pattern moves along the direction of improvement while they keep improving
+        while True:
+            z = (2*y[0] - x[0], 2*y[1] - x[1])
+            x, fx = y, fy
+            y, fy = explore(z, f(z), step)
+            if fy >= fx:
+                break
+    return x
+
+
+def _neldermead(f, x, step, tol):
+    simplex = [np.array(x, float), np.array((x[0] + step, x[1]), float), np.array((x[0], x[1] + step), float)]
+    values = [f(p) for p in simplex]
+    while True:
+        order = np.argsort(values)
+        simplex = [simplex[i] for i in order]
+        values = [values[i] for i in order]
+        if max(np.abs(p - simplex[0]).max() for p in simplex[1:]) <= tol:
+            break
+        previous = [tuple(p) for p in simplex]
+        centroid = (simplex[0] + simplex[1])/2
+        reflected = centroid + (centroid - simplex[2])
+        fr = f(reflected)
+        if fr < values[0]:
+            expanded = centroid + 2*(centroid - simplex[2])
+            fe = f(expanded)
+            simplex[2], values[2] = (expanded, fe) if fe < fr else (reflected, fr)
+        elif fr < values[1]:
+            simplex[2], values[2] = reflected, fr
+        else:
+            contracted = centroid + 0.5*(simplex[2] - centroid)
+            fc = f(contracted)
+            if fc < values[2]:
+                simplex[2], values[2] = contracted, fc
+            else:
+                for i in (1, 2):
+                    simplex[i] = simplex[0] + 0.5*(simplex[i] - simplex[0])
+                    values[i] = f(simplex[i])
+        simplex = [np.round(p) for p in simplex]
+        if sorted(tuple(p) for p in simplex) == sorted(previous):
+            # Rounding to whole steps undid the update
+            break
+    return tuple(int(c) for c in simplex[0])
+
+
+_ALGORITHMS = {'coordinate': _coordinate, 'pattern': _pattern, 'neldermead': _neldermead}
+
+
+def run(controller, function, ch, method='pattern', step=50, tol=1, budget=200, maximize=True, dwell=0.):
+    """Moves the axes of a channel to an extremum of an objective, starting from the current
+    position, then goes to the best point found.
+
+    - 'coordinate': coordinate descent, stepping along one axis while the objective improves
+    - 'pattern': Hooke-Jeeves pattern search, polling both axes then extrapolating successes
+    - 'neldermead': Nelder-Mead simplex on integer step positions
+
+    Step sizes halve (or the simplex shrinks) until smaller than tol steps.
+
+    :param controller: Controller
+    :controller type: :class:`AGUC8.driver.AGUC8`
+    :param function: Objective, called as function(position)
+    :function type: callable
+    :param ch: Channel number
+    :ch type: str
+    :param method: One of METHODS. Defaults to 'pattern'.
+    :method type: str, optional
+    :param step: Initial step size in steps. Defaults to 50.
+    :step type: int, optional
+    :param tol: Smallest step size in steps. Defaults to 1.
+    :tol type: int, optional
+    :param budget: Largest number of objective readings. Defaults to 200.
+    :budget type: int, optional
+    :param maximize: Whether to maximize rather than minimize. Defaults to True.
+    :maximize type: bool, optional
+    :param dwell: Seconds to wait at each point before reading. Defaults to 0.
+    :dwell type: float, optional
+    :return: best: step counters of the best point, value: objective there, evaluations,
+        converged: whether tol was reached before the budget ran out or a stop, history: array
+        of shape (evaluations, 4) of axis 1, axis 2, value and time.time() of each reading
+    :rtype: dict
+    """
+    if method not in _ALGORITHMS:
+        raise ValueError('Unknown method {!r}, expected one of {}'.format(method, METHODS))
+    probe = _Probe(controller, function, ch, maximize, budget, dwell)
+    converged = True
+    with controller.port.metrics.operation('optimize'):
+        try:
+            _ALGORITHMS[method](probe, probe.current, int(step), max(int(tol), 1))
+        except Stopped:
+            converged = False
+            logger.info('Optimization ended before convergence after ' + str(len(probe.history)) + ' readings')
+        best = min(probe.cache, key=probe.cache.get) if probe.cache else probe.current
+        if not probe.cancel.is_set():
+            probe.moveTo(best)
+    return {'best': best,
+            'value': probe.sign*probe.cache[best] if best in probe.cache else None,
+            'evaluations': len(probe.history),
+            'converged': converged,
+            'history': np.array(probe.history).reshape(-1, 4)}
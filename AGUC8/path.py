@@ -0,0 +1,192 @@
+## @package path
+# This module contains the path engine used to follow sequences of relative moves
+#
+
+from threading import Thread, Event
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def _coalesce(path):
+    """Yields (index, (d1, d2)) where index is the position in path of the last move merged."""
+    pending = None
+    last = -1
+    for index, p in enumerate(path):
+        d1, d2 = int(p[0]), int(p[1])
+        if d1 == 0 and d2 == 0:
+            continue
+        if pending is not None:
+            if d2 == 0 and pending[1] == 0:
+                pending = (pending[0] + d1, 0)
+                last = index
+                continue
+            if d1 == 0 and pending[0] == 0:
+                pending = (0, pending[1] + d2)
+                last = index
+                continue
+            if pending != (0, 0):
+                yield last, pending
+        pending = (d1, d2)
+        last = index
+    if pending is not None and pending != (0, 0):
+        yield last, pending
+
+
+def coalesce(path):
+    """Streams a path of relative moves, dropping zero moves and merging consecutive moves
+    along the same single axis. Holds at most one move in memory.
+
+    :param path: Relative moves (d1, d2). List, NumPy array of shape (N, 2) or any iterable.
+    :path type: iterable
+    :return: Generator of relative moves
+    :rtype: generator
+    """
+    for index, move in _coalesce(path):
+        yield move
+
+
+class PathRunner(object):
+    """Follows a path of relative moves on one channel of a controller.
+
+    The path is consumed lazily, so generators of any length run in bounded memory.
+    A runner can be started again after it finishes or is stopped: :meth:`start`
+    follows the path from its beginning, :meth:`resume` first finishes the move that
+    a stop interrupted, then continues with the rest of the path.
+
+    :param controller: Controller that executes the moves
+    :controller type: :class:`AGUC8.driver.AGUC8`
+    :param path: Relative moves (d1, d2). List, NumPy array of shape (N, 2) or any iterable.
+    :path type: iterable
+    :param ch: Channel number
+    :ch type: str
+    """
+
+    def __init__(self, controller, path, ch):
+        """Constructor method
+        """
+        self.controller = controller
+        self.path = path
+        self.ch = ch
+        self._moves = None
+        self._thread = None
+        self._stop = Event()
+        self._index = -1
+        self._count = 0
+        self._pending = None
+        self._start = None
+        self._end = None
+        self._elapsed = 0.
+        self._error = None
+
+    def run(self):
+        """Follows the rest of the path in the calling thread.
+        """
+        if self._moves is None:
+            self._moves = _coalesce(self.path)
+        self._stop.clear()
+        self._error = None
+        self._start = time.monotonic()
+        self._end = None
+        with self.controller.port.metrics.operation('path'):
+            self._follow()
+
+    def _follow(self):
+        try:
+            while not self._stop.is_set():
+                if self._pending is not None:
+                    index, (d1, d2) = self._pending
+                    self._pending = None
+                else:
+                    try:
+                        index, (d1, d2) = next(self._moves)
+                    except StopIteration:
+                        self._moves = None
+                        logger.info('Path completed')
+                        return
+                before = self.controller.counters(self.ch)
+                self.controller.move(d1, d2, self.ch, cancel=self._stop)
+                if self._stop.is_set():
+                    # Keep the steps the stop left undone, resume sends them first
+                    after = self.controller.counters(self.ch)
+                    rest = (d1 - (after[0] - before[0]), d2 - (after[1] - before[1]))
+                    if rest != (0, 0):
+                        self._pending = (index, rest)
+                        break
+                self._index = index
+                self._count += 1
+            logger.info('Path stopped after move ' + str(self._index))
+        except Exception as e:
+            self._error = e
+            self._moves = None
+            self._pending = None
+            raise
+        finally:
+            self._end = time.monotonic()
+            self._elapsed += self._end - self._start
+
+    def _launch(self):
+        if self.running():
+            raise RuntimeError('The path is already running')
+        self._thread = Thread(target=self.run, name='PathRunner', daemon=True)
+        self._thread.start()
+
+    def start(self):
+        """Follows the path from its beginning in a background thread.
+        """
+        if iter(self.path) is self.path and (self._moves is not None or self._count):
+            raise RuntimeError('A path given as an iterator cannot be restarted, use resume')
+        self._moves = None
+        self._index = -1
+        self._count = 0
+        self._pending = None
+        self._start = None
+        self._elapsed = 0.
+        self._launch()
+
+    def resume(self):
+        """Continues a stopped path in a background thread, starting with the steps left
+        undone by the move the stop interrupted.
+        """
+        self._launch()
+
+    def stop(self):
+        """Asks the runner to stop after the move in progress. Does not wait.
+        """
+        self._stop.set()
+
+    def running(self):
+        """Returns whether the path is being followed.
+
+        :rtype: bool
+        """
+        return self._thread is not None and self._thread.is_alive()
+
+    def join(self, timeout=None):
+        """Waits for the background thread to finish.
+
+        :param timeout: Seconds to wait. Defaults to None, waiting forever.
+        :timeout type: float, optional
+        """
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def progress(self):
+        """Returns the progress of the path.
+
+        :return: index: position in the path of the last completed move, moves: number of
+            moves sent to the controller after merging, elapsed: seconds spent following the
+            path since it was last started, movesPerSecond, running and error (None or the
+            exception text)
+        :rtype: dict
+        """
+        elapsed = self._elapsed
+        if self._start is not None and self._end is None:
+            elapsed += time.monotonic() - self._start
+        return {'index': self._index,
+                'moves': self._count,
+                'elapsed': elapsed,
+                'movesPerSecond': self._count/elapsed if elapsed > 0 else 0.,
+                'running': self.running(),
+                'error': None if self._error is None else repr(self._error)}
@@ -0,0 +1,85 @@
+## @package persist
+# This module contains the state file in which the driver keeps the configuration and the step
+# counters of a controller between runs, so that it can start warm
+#
+
+import json
+import logging
+import os
+import time
+from threading import Lock
+
+logger = logging.getLogger(__name__)
+
+## Default shortest time in seconds between two saves that are not forced
+SAVEPERIOD = 1.
+
+
+class StateFile(object):
+    """JSON file holding the last known state of a controller: firmware version, active
+    channel, and for each configured channel the step amplitudes and, for each axis, the step
+    counter of the controller and the offset of the zero reference from it. Saves replace the
+    file atomically, so a crash never leaves it half written.
+
+    :param filename: File name
+    :filename type: str
+    :param period: Shortest time in seconds between two saves that are not forced. Defaults to
+        SAVEPERIOD.
+    :period type: float, optional
+    """
+
+    def __init__(self, filename, period=SAVEPERIOD):
+        """Constructor method
+        """
+        self.filename = filename
+        self.period = period
+        self._lock = Lock()
+        self._saved = None
+
+    def load(self):
+        """Reads the saved state.
+
+        :return: State as saved, None if there is no file or it cannot be read
+        :rtype: dict or None
+        """
+        try:
+            with open(self.filename) as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            logger.info('No state file ' + self.filename + ', starting cold')
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning('Ignoring unreadable state file ' + self.filename + ': ' + str(e))
+            return None
+        if not isinstance(state, dict):
+            logger.warning('Ignoring state file ' + self.filename + ': not a JSON object')
+            return None
+        return state
+
+    def save(self, state, force=False):
+        """Writes a state. Failures are logged, not raised: losing the state only costs a cold
+        start.
+
+        :param state: State, plain types
+        :state type: dict
+        :param force: Whether to save even if the last save was less than period ago.
+            Defaults to False.
+        :force type: bool, optional
+        :return: Whether the state was written
+        :rtype: bool
+        """
+        with self._lock:
+            now = time.monotonic()
+            if not force and self._saved is not None and now - self._saved < self.period:
+                return False
+            state = dict(state, time=time.time())
+            temporary = self.filename + '.tmp'
+            try:
+                with open(temporary, 'w') as f:
+                    json.dump(state, f, indent=1)
+                os.replace(temporary, self.filename)
+            except (OSError, TypeError, ValueError) as e:
+                logger.warning('Could not save state file ' + self.filename + ': ' + str(e))
+                return False
+            self._saved = now
+            return True
@@ -0,0 +1,93 @@
+## @package protocol_replay
+# pySerial protocol handler for ``replay://`` URLs. Opens a port that answers with the replies
+# of a session recorded by :meth:`AGUC8.agPort.AGPort.startTrace` (see :mod:`AGUC8.trace`).
+#
+# URL format: replay://FILE[?option=value[&option=value...]]
+# options:
+# - "timing" "original" to serve each reply after its recorded latency (default), "none" to
+#   serve replies at once. Only reply latencies are reproduced: when commands are written is up
+#   to the writer, see the replay command of :mod:`AGUC8.trace`
+# - "speed" divides the recorded latencies, e.g. 2 replays twice as fast
+#
+# Each command line written is matched with the next recorded exchange of the same command,
+# skipping the exchanges in between. A command the session never sent again afterwards gets
+# the first recorded reply to it, and counts as a mismatch.
+#
+
+import time
+import urllib.parse as urlparse
+
+from serial.serialutil import SerialException, PortNotOpenError, to_bytes
+
+from AGUC8 import protocol_sim, trace
+
+
+def _parseUrl(url):
+    parts = urlparse.urlsplit(url)
+    if parts.scheme != 'replay':
+        raise SerialException('expected a string in the form "replay://FILE[?option=value...]": '
+                              'not starting with replay:// ({!r})'.format(parts.scheme))
+    options = {'timing': True, 'speed': 1.}
+    for option, values in urlparse.parse_qs(parts.query, True).items():
+        if option == 'timing':
+            if values[0] not in ('original', 'none'):
+                raise SerialException('timing must be "original" or "none": {!r}'.format(values[0]))
+            options[option] = values[0] == 'original'
+        elif option == 'speed':
+            options[option] = float(values[0])
+        else:
+            raise SerialException('unknown option: {!r}'.format(option))
+    return parts.netloc + parts.path, options
+
+
+class Serial(protocol_sim.Serial):
+    """Serial port implementation that serves the replies of a recorded session."""
+
+    def open(self):
+        if self.is_open:
+            raise SerialException('Port is already open.')
+        if self._port is None:
+            raise SerialException('Port must be configured before it can be used.')
+        filename, options = _parseUrl(self.port)
+        try:
+            self._exchanges = trace.exchanges(trace.load(filename))
+        except (OSError, ValueError) as e:
+            raise SerialException('could not open trace {}: {}'.format(filename, e))
+        self._timing = options['timing']
+        self._speed = options['speed']
+        self._next = 0
+        ## Number of commands that did not match the next recorded exchanges
+        self.mismatches = 0
+        self.is_open = True
+        self.reset_input_buffer()
+
+    def _check(self):
+        if not self.is_open:
+            raise PortNotOpenError()
+
+    def _find(self, line):
+        for i in range(self._next, len(self._exchanges)):
+            if self._exchanges[i][1] == line:
+                self._next = i + 1
+                return self._exchanges[i]
+        self.mismatches += 1
+        return next((e for e in self._exchanges if e[1] == line), None)
+
+    def write(self, data):
+        self._check()
+        data = to_bytes(data)
+        now = time.monotonic()
+        lines = (self._pending + data).split(b'\n')
+        self._pending = lines.pop()
+        with self._cond:
+            for line in lines:
+                exchange = self._find((line + b'\n').decode('utf-8', 'replace'))
+                if exchange is None or not exchange[3]:
+                    continue
+                sent, _, replied, reply = exchange
+                ready = now + (replied - sent)/self._speed if self._timing else now
+                if self._rx:
+                    ready = max(ready, self._rx[-1][0])
+                self._rx.append([ready, reply])
+            self._cond.notify_all()
+        return len(data)
@@ -0,0 +1,185 @@
+## @package protocol_sim
+# pySerial protocol handler for ``sim://`` URLs. Opens a port to a simulated AG-UC8
+# controller (see :mod:`AGUC8.simulator`).
+#
+# URL format: sim://[name][?option=value[&option=value...]]
+# options:
+# - "rate" relative move step rate in steps/s
+# - "latency" link round trip latency in seconds
+# - "processing" controller processing time per command in seconds
+# - "limits" comma separated list of channels with limit switches
+# - "travel" distance in steps from the centre of travel to each limit switch
+#
+# Ports opened with the same name share one controller. Options only apply when
+# the named controller is first created. Unnamed ports get a fresh controller.
+#
+
+import threading
+import time
+import urllib.parse as urlparse
+
+from serial.serialutil import SerialBase, SerialException, PortNotOpenError, to_bytes
+
+from AGUC8 import simulator
+
+
+def _parseUrl(url):
+    parts = urlparse.urlsplit(url)
+    if parts.scheme != 'sim':
+        raise SerialException('expected a string in the form "sim://[name][?option=value...]": '
+                              'not starting with sim:// ({!r})'.format(parts.scheme))
+    options = {}
+    for option, values in urlparse.parse_qs(parts.query, True).items():
+        if option in ('rate', 'latency', 'processing'):
+            options[option] = float(values[0])
+        elif option == 'travel':
+            options[option] = int(values[0])
+        elif option == 'limits':
+            options[option] = [c for c in values[0].split(',') if c]
+        else:
+            raise SerialException('unknown option: {!r}'.format(option))
+    return parts.netloc + parts.path.strip('/'), options
+
+
+class Serial(SerialBase):
+    """Serial port implementation that talks to a :class:`AGUC8.simulator.SimController`."""
+
+    def __init__(self, *args, **kwargs):
+        self.controller = None
+        self._rx = []
+        self._pending = b''
+        self._cond = threading.Condition()
+        super(Serial, self).__init__(*args, **kwargs)
+
+    def open(self):
+        if self.is_open:
+            raise SerialException('Port is already open.')
+        if self._port is None:
+            raise SerialException('Port must be configured before it can be used.')
+        name, options = _parseUrl(self.port)
+        if name:
+            self.controller = simulator.getController(name, **options)
+        else:
+            self.controller = simulator.SimController(**options)
+        if self.controller.offline:
+            raise SerialException('could not open port {}: controller offline'.format(self.port))
+        self.is_open = True
+        self.reset_input_buffer()
+
+    def close(self):
+        with self._cond:
+            self.is_open = False
+            self._cond.notify_all()
+
+    def _reconfigure_port(self):
+        pass
+
+    def _check(self):
+        if not self.is_open:
+            raise PortNotOpenError()
+        if self.controller.offline:
+            raise SerialException('connection to simulated controller lost')
+
+    def write(self, data):
+        self._check()
+        data = to_bytes(data)
+        now = time.monotonic()
+        baudrate = self._baudrate
+        # Commands reach the controller once they have been fully transmitted
+        now += 10.*len(data)/baudrate
+        lines = (self._pending + data).split(b'\n')
+        self._pending = lines.pop()
+        with self._cond:
+            for line in lines:
+                reply = self.controller.handle(line.decode('ascii', 'replace'), now)
+                if reply is None:
+                    continue
+                frame = (reply + '\r\n').encode('ascii', 'replace')
+                ready = now + self.controller.replyDelay(len(frame), baudrate)
+                if self._rx:
+                    ready = max(ready, self._rx[-1][0])
+                self._rx.append([ready, frame])
+            self._cond.notify_all()
+        return len(data)
+
+    def _available(self, now):
+        n = 0
+        for ready, frame in self._rx:
+            if ready > now:
+                break
+            n += len(frame)
+        return n
+
+    def _take(self, size):
+        data = bytearray()
+        while self._rx and len(data) < size:
+            frame = self._rx[0][1]
+            n = size - len(data)
+            data += frame[:n]
+            if n >= len(frame):
+                self._rx.pop(0)
+            else:
+                self._rx[0][1] = frame[n:]
+        return bytes(data)
+
+    @property
+    def in_waiting(self):
+        self._check()
+        with self._cond:
+            return self._available(time.monotonic())
+
+    def read(self, size = 1):
+        self._check()
+        deadline = None if self._timeout is None else time.monotonic() + self._timeout
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                available = self._available(now)
+                if available >= size or not self.is_open:
+                    break
+                if deadline is not None and now >= deadline:
+                    size = available
+                    break
+                wait = deadline - now if deadline is not None else None
+                nextReady = next((r for r, f in self._rx if r > now), None)
+                if nextReady is not None:
+                    wait = nextReady - now if wait is None else min(wait, nextReady - now)
+                self._cond.wait(wait)
+                self._check()
+            return self._take(min(size, available))
+
+    def reset_input_buffer(self):
+        with self._cond:
+            self._rx = []
+
+    def reset_output_buffer(self):
+        self._pending = b''
+
+    @property
+    def out_waiting(self):
+        return 0
+
+    def _update_break_state(self):
+        pass
+
+    def _update_rts_state(self):
+        pass
+
+    def _update_dtr_state(self):
+        pass
+
+    @property
+    def cts(self):
+        return True
+
+    @property
+    def dsr(self):
+        return True
+
+    @property
+    def ri(self):
+        return False
+
+    @property
+    def cd(self):
+        return True
@@ -0,0 +1,160 @@
+## @package scan
+# This module contains the 2D scans run by the driver: point generators for raster and spiral
+# scans, the registry of per-point hooks and the scan loop
+#
+
+import logging
+import time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+## Per-point hooks by name, see :func:`register`
+hooks = {}
+
+
+def register(name, function=None):
+    """Registers a per-point hook under a name, so that scans requested over RPC can use it.
+    Can be used as a decorator: ``@register('photodiode')``.
+
+    A hook is called as function(index, commanded, measured) once the scan has reached a point
+    and dwelt there. commanded and measured are (axis 1, axis 2) step counters, a measured
+    counter being None if it could not be read. The hook may return a number, recorded in the
+    values of the scan.
+
+    :param name: Hook name
+    :name type: str
+    :param function: Hook
+    :function type: callable
+    """
+    if function is None:
+        return lambda f: register(name, f)
+    hooks[name] = function
+    return function
+
+
+def _hook(hook):
+    if hook is None or callable(hook):
+        return hook
+    try:
+        return hooks[hook]
+    except KeyError:
+        raise ValueError('Unknown scan hook: {!r}'.format(hook))
+
+
+def raster(n1, n2, step1, step2=None):
+    """Points of a serpentine raster centred on (0, 0): rows along axis 1, every other row
+    reversed so that consecutive points are always one step apart.
+
+    :param n1: Number of points along axis 1
+    :n1 type: int
+    :param n2: Number of points along axis 2
+    :n2 type: int
+    :param step1: Steps between points along axis 1
+    :step1 type: int
+    :param step2: Steps between points along axis 2. Defaults to None, same as step1.
+    :step2 type: int, optional
+    :return: Offsets (d1, d2) of shape (n1*n2, 2)
+    :rtype: numpy.ndarray
+    """
+    if step2 is None:
+        step2 = step1
+    i = np.arange(n1) - (n1 - 1)//2
+    j = np.arange(n2) - (n2 - 1)//2
+    ii = np.tile(i, (n2, 1))
+    ii[1::2] = ii[1::2, ::-1]
+    jj = np.repeat(j, n1).reshape(n2, n1)
+    return np.column_stack((ii.ravel()*step1, jj.ravel()*step2)).astype(np.int64)
+
+
+def spiral(n, step1, step2=None):
+    """First n points of a square spiral going out from (0, 0), one step apart.
+
+    :param n: Number of points
+    :n type: int
+    :param step1: Steps between points along axis 1
+    :step1 type: int
+    :param step2: Steps between points along axis 2. Defaults to None, same as step1.
+    :step2 type: int, optional
+    :return: Offsets (d1, d2) of shape (n, 2)
+    :rtype: numpy.ndarray
+    """
+    if step2 is None:
+        step2 = step1
+    # Legs of length 1, 1, 2, 2, 3, 3... turning right: +1, +2, -1, -2
+    legs = np.repeat(np.arange(1, int(np.sqrt(n)) + 3), 2)
+    directions = np.array([(1, 0), (0, 1), (-1, 0), (0, -1)])
+    moves = np.repeat(directions[np.arange(len(legs)) % 4], legs, axis=0)[:max(n - 1, 0)]
+    points = np.vstack(([(0, 0)], np.cumsum(moves, axis=0)))[:n]
+    return (points*(step1, step2)).astype(np.int64)
+
+
+def run(controller, points, ch, dwell=0., hook=None, measure=True, relative=True):
+    """Visits points one after the other on a channel. Stops early, returning the points
+    visited so far, when the controller is stopped.
+
+    :param controller: Controller
+    :controller type: :class:`AGUC8.driver.AGUC8`
+    :param points: Points (d1, d2). Array of shape (N, 2) or list of pairs.
+    :points type: array_like
+    :param ch: Channel number
+    :ch type: str
+    :param dwell: Seconds to wait at each point before calling the hook. Defaults to 0.
+    :dwell type: float, optional
+    :param hook: Function or name of a registered hook called at each point, see
+        :func:`register`. Defaults to None.
+    :hook type: callable or str, optional
+    :param measure: Whether to read the step counters with TP at each point. If False, the
+        measured positions are the counters tracked by the driver. Defaults to True.
+    :measure type: bool, optional
+    :param relative: Whether points are offsets from the position at the start of the scan.
+        If False, they are step counter values. Defaults to True.
+    :relative type: bool, optional
+    :return: commanded and measured step counters, arrays of shape (M, 2), measured being
+        float with NaN where a counter could not be read; time, array of time.time() at which
+        each point was reached; values, array of the values returned by the hook (NaN if none).
+        M is less than N if the scan was stopped.
+    :rtype: dict
+    """
+    hook = _hook(hook)
+    points = np.asarray(points, dtype=np.int64).reshape(-1, 2)
+    n = len(points)
+    commanded = np.empty((n, 2), dtype=np.int64)
+    measured = np.empty((n, 2))
+    times = np.empty(n)
+    values = np.full(n, np.nan)
+    aliases = controller.aliases
+    axes = [controller.channels[ch][alias] for alias in aliases]
+    cancel = controller._cancel
+    current = np.array(controller.counters(ch), dtype=np.int64)
+    targets = points + current if relative else points
+    done = 0
+    with controller.port.metrics.operation('scan'):
+        for index, target in enumerate(targets):
+            if cancel.is_set():
+                break
+            d1, d2 = (int(d) for d in target - current)
+            controller.move(d1, d2, ch, cancel=cancel)
+            if cancel.is_set():
+                break
+            current = target
+            if dwell > 0:
+                cancel.wait(dwell)
+            times[index] = time.time()
+            if measure:
+                for a in axes:
+                    a.setPosition(None)
+            position = controller.positions(ch)
+            commanded[index] = target
+            # A counter whose TP replies were lost is recorded as NaN and given to the hook as None
+            measured[index] = [np.nan if position[alias] is None else position[alias] for alias in aliases]
+            if hook is not None:
+                value = hook(index, tuple(int(c) for c in target),
+                             tuple(None if np.isnan(m) else int(m) for m in measured[index]))
+                if value is not None:
+                    values[index] = value
+            done = index + 1
+    if done < n:
+        logger.info('Scan stopped after ' + str(done) + ' of ' + str(n) + ' points')
+    return {'commanded': commanded[:done], 'measured': measured[:done], 'time': times[:done], 'values': values[:done]}
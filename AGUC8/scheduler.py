@@ -0,0 +1,151 @@
+## @package scheduler
+# This module contains the command scheduler that orders the operations sent to one
+# controller by priority and so as to minimize channel switches
+#
+
+import asyncio
+from collections import deque
+import itertools
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+## Priority of the operations that read the state of the axes
+STATUS = 1
+## Priority of the operations that move the axes
+MOTION = 2
+## Priority names, as used in the metrics
+PRIORITIES = {STATUS: 'status', MOTION: 'motion'}
+
+
+class ChannelScheduler(object):
+    """Runs the operations of one controller one at a time, by priority and grouped by channel.
+
+    Queued status reads run before queued motions. Within a priority, operations are queued per
+    channel and each channel keeps its submission order. When the operations of the active
+    channel run out, the scheduler switches to the channel with the oldest pending operation and
+    runs, in one pass, every operation pending for it at that time. Interleaved requests for
+    different channels therefore cost one CC switch per pass instead of one per operation, while
+    no channel waits for more than one pass of each other channel.
+
+    Operations that must not wait, such as stop, should bypass the scheduler.
+
+    :param channel: Active channel of the controller. Defaults to None (unknown).
+    :channel type: str, optional
+    :param metrics: Metrics the queue depth and waiting times are recorded in. Defaults to None.
+    :metrics type: :class:`AGUC8.metrics.Metrics`, optional
+    :param leases: Leases checked before each motion runs. Defaults to None (no leases).
+    :leases type: :class:`AGUC8.lease.Leases`, optional
+    """
+
+    def __init__(self, channel=None, metrics=None, leases=None):
+        """Constructor method
+        """
+        ## Channel of the last operation run
+        self.channel = channel
+        ## Number of times the scheduler changed channel
+        self.switches = 0
+        self.metrics = metrics
+        self.leases = leases
+        self._queues = {priority: {} for priority in PRIORITIES}
+        self._order = itertools.count()
+        # Channel of the pass in progress and number of operations left in it, by priority
+        self._groups = {}
+        self._wake = None
+        self._task = None
+
+    def pending(self, ch=None, priority=None):
+        """Returns the number of queued operations.
+
+        :param ch: Only count the operations of this channel. Defaults to None, counting all.
+        :ch type: str, optional
+        :param priority: Only count the operations of this priority. Defaults to None, counting all.
+        :priority type: int, optional
+        :rtype: int
+        """
+        levels = self._queues.values() if priority is None else [self._queues[priority]]
+        if ch is not None:
+            return sum(len(queues.get(str(ch), ())) for queues in levels)
+        return sum(len(q) for queues in levels for q in queues.values())
+
+    async def submit(self, ch, function, *args, priority=MOTION, lease=None):
+        """Queues a coroutine function to be run on channel ch and waits for its result.
+
+        :param ch: Channel the operation runs on
+        :ch type: str
+        :param function: Coroutine function
+        :function type: callable
+        :param priority: STATUS or MOTION. Defaults to MOTION.
+        :priority type: int, optional
+        :param lease: Token of the lease of the channel, checked before a motion runs. Defaults
+            to None.
+        :lease type: str, optional
+        :return: Result of the operation
+        :raises AGUC8.errors.ChannelLeased: if the motion is refused by the leases
+        """
+        future = asyncio.get_running_loop().create_future()
+        if self.metrics is not None:
+            self.metrics.queued(self.pending())
+        self._queues[priority].setdefault(str(ch), deque()).append(
+            (next(self._order), function, args, future, priority, lease, time.monotonic()))
+        if self._task is None or self._task.done():
+            self._wake = asyncio.Event()
+            self._task = asyncio.ensure_future(self._run())
+        self._wake.set()
+        return await future
+
+    def _next(self):
+        for priority in sorted(self._queues):
+            queues = self._queues[priority]
+            pending = [ch for ch, q in queues.items() if q]
+            if pending:
+                break
+        else:
+            return None
+        ch, group = self._groups.get(priority, (None, 0))
+        if group and queues.get(ch):
+            # A pass interrupted by operations of higher priority resumes where it stopped
+            self._groups[priority] = (ch, group - 1)
+        else:
+            ch = min(pending, key=lambda c: queues[c][0][0])
+            self._groups[priority] = (ch, len(queues[ch]) - 1)
+        if ch != self.channel:
+            logger.debug('Scheduler switching to channel ' + ch)
+            self.switches += 1
+            self.channel = ch
+        return queues[ch].popleft()
+
+    async def _run(self):
+        while True:
+            item = self._next()
+            if item is None:
+                self._wake.clear()
+                await self._wake.wait()
+                continue
+            _, function, args, future, priority, lease, submitted = item
+            if future.done():
+                continue
+            if self.metrics is not None:
+                self.metrics.dequeued(PRIORITIES[priority], time.monotonic() - submitted, self.pending())
+            try:
+                if self.leases is not None and priority == MOTION:
+                    self.leases.check(self.channel, lease)
+                result = await function(*args)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            else:
+                if not future.done():
+                    future.set_result(result)
+
+    def close(self):
+        """Stops the scheduler. Queued operations are cancelled.
+        """
+        if self._task is not None:
+            self._task.cancel()
+        for queues in self._queues.values():
+            for queue in queues.values():
+                for item in queue:
+                    item[3].cancel()
+                queue.clear()
@@ -0,0 +1,386 @@
+## @package simulator
+# This module contains a software model of the Agilis AG-UC8 controller
+# that can stand in for the real device when benchmarking or load testing
+#
+
+import re
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+## Firmware version string answered to VE
+VERSION = 'AG-UC8 v2.2.1'
+## Default relative move (PR) step rate in steps/s
+STEPRATE = 1000.
+## Step rates in steps/s for the MV speed tags
+MVRATES = {1: 5., 2: 100., 3: 1700., 4: 666.}
+## Default distance in steps between the centre of travel and each limit switch
+TRAVEL = 20000
+
+## Error codes answered to TE
+NO_ERROR = 0
+UNKNOWN_COMMAND = -1
+AXIS_OUT_OF_RANGE = -2
+WRONG_FORMAT = -3
+PARAMETER_OUT_OF_RANGE = -4
+NOT_ALLOWED_IN_LOCAL = -5
+NOT_ALLOWED_IN_STATE = -6
+
+## Axis status codes answered to TS
+READY = 0
+STEPPING = 1
+JOGGING = 2
+MOVING_TO_LIMIT = 3
+
+_COMMAND = re.compile(r'^([0-9]{0,2})([A-Z]{2})(.*)$')
+
+_registry = {}
+_registryLock = threading.Lock()
+
+
+def getController(name, **options):
+    """Returns the named simulated controller, creating it if needed.
+    Ports opened with ``sim://<name>`` share the controller returned here.
+
+    :param name: Controller name
+    :name type: str
+    :return: The simulated controller
+    :rtype: :class:`SimController`
+    """
+    with _registryLock:
+        if name not in _registry:
+            _registry[name] = SimController(**options)
+        return _registry[name]
+
+
+def removeController(name):
+    """Forgets the named simulated controller.
+
+    :param name: Controller name
+    :name type: str
+    """
+    with _registryLock:
+        _registry.pop(name, None)
+
+
+class SimAxis(object):
+    """State of one piezo axis.
+
+    :param rate: Relative move step rate in steps/s
+    :rate type: float
+    :param travel: Distance in steps from the centre of travel to each limit switch
+    :travel type: int
+    """
+
+    def __init__(self, rate = STEPRATE, travel = TRAVEL):
+        self.rate = float(rate)
+        self.travel = travel
+        self.stepAmp = {'+': 50, '-': 50}
+        ## Physical position in steps, zero at the centre of travel
+        self.physical = 0
+        ## Step counter reported by TP
+        self.counter = 0
+        self.status = READY
+        self.atLimit = False
+        self._start = 0.
+        self._origin = (0, 0)
+        self._direction = 0
+        self._steps = None
+        self._speed = 0.
+
+    def start(self, now, status, direction, speed, steps = None):
+        self.status = status
+        self.atLimit = False
+        self._start = now
+        self._origin = (self.physical, self.counter)
+        self._direction = direction
+        self._speed = speed
+        self._steps = steps
+
+    def update(self, now, hasLimits):
+        """Advances the motion model to time ``now``."""
+        if self.status == READY:
+            return
+        done = int((now - self._start)*self._speed)
+        if self._steps is not None and done >= self._steps:
+            done = self._steps
+            self.status = READY
+        physical = self._origin[0] + self._direction*done
+        if hasLimits and abs(physical) >= self.travel:
+            done = self.travel - self._direction*self._origin[0]
+            physical = self._direction*self.travel
+            self.status = READY
+            self.atLimit = True
+        self.physical = physical
+        self.counter = self._origin[1] + self._direction*done
+
+    def stop(self, now, hasLimits):
+        self.update(now, hasLimits)
+        self.status = READY
+
+
+class SimController(object):
+    """Software model of an Agilis AG-UC8 controller.
+
+    The model answers every command of the Agilis command reference used by
+    :class:`AGUC8.driver.AGUC8`, tracks channel, axis and limit switch state and
+    moves the axes at a fixed step rate in simulated real time. Replies are
+    delayed to account for the link latency, the controller processing time and
+    the time needed to send each byte at the port baud rate.
+
+    :param rate: Relative move step rate of every axis in steps/s. Defaults to STEPRATE.
+    :rate type: float
+    :param latency: Link round trip latency in seconds. Defaults to 0.
+    :latency type: float
+    :param processing: Controller processing time per command in seconds. Defaults to 0.
+    :processing type: float
+    :param limits: Channels whose device has limit switches. Defaults to all channels.
+    :limits type: list, optional
+    :param travel: Distance in steps from the centre of travel to each limit switch
+    :travel type: int
+    """
+
+    def __init__(self, rate = STEPRATE, latency = 0., processing = 0., limits = None, travel = TRAVEL):
+        self.latency = float(latency)
+        self.processing = float(processing)
+        self.channels = {str(c): {'1': SimAxis(rate, travel), '2': SimAxis(rate, travel)} for c in range(1, 5)}
+        self.limits = set(str(c) for c in (limits if limits is not None else self.channels))
+        self.channel = '1'
+        self.remote = False
+        self.error = NO_ERROR
+        ## Number of commands handled, by mnemonic
+        self.counts = {}
+        self.lock = threading.RLock()
+        self.offline = False
+        self._delays = []
+        self._drops = 0
+        self._garbles = 0
+
+    # Fault injection
+
+    def injectDelay(self, seconds, count = 1):
+        """Delays the next ``count`` replies by ``seconds`` on top of the latency model.
+
+        :param seconds: Extra delay in seconds
+        :seconds type: float
+        :param count: Number of replies to delay
+        :count type: int
+        """
+        with self.lock:
+            self._delays.extend([float(seconds)]*count)
+
+    def dropReplies(self, count = 1):
+        """Silently drops the next ``count`` replies.
+
+        :param count: Number of replies to drop
+        :count type: int
+        """
+        with self.lock:
+            self._drops += count
+
+    def garbleReplies(self, count = 1):
+        """Replaces the next ``count`` replies with unparseable data.
+
+        :param count: Number of replies to garble
+        :count type: int
+        """
+        with self.lock:
+            self._garbles += count
+
+    def setOffline(self, offline = True):
+        """Simulates a dropped link. While offline, opening a port fails and
+        open ports raise :class:`serial.SerialException` on every read and write.
+
+        :param offline: Whether the link is down
+        :offline type: bool
+        """
+        self.offline = offline
+
+    def setStepRate(self, channel, axis, rate):
+        """Sets the relative move step rate of one axis.
+
+        :param channel: Channel number
+        :channel type: str
+        :param axis: Axis number
+        :axis type: str
+        :param rate: Step rate in steps/s
+        :rate type: float
+        """
+        with self.lock:
+            self.channels[str(channel)][str(axis)].rate = float(rate)
+
+    def axis(self, channel, axis):
+        """Returns the up to date state of one axis.
+
+        :rtype: :class:`SimAxis`
+        """
+        with self.lock:
+            a = self.channels[str(channel)][str(axis)]
+            a.update(time.monotonic(), str(channel) in self.limits)
+            return a
+
+    # Command handling
+
+    def replyDelay(self, nbytes, baudrate):
+        """Returns the time in seconds until a reply of ``nbytes`` bytes is fully received."""
+        delay = self.latency + self.processing + 10.*nbytes/baudrate
+        if self._delays:
+            delay += self._delays.pop(0)
+        return delay
+
+    def handle(self, line, now = None):
+        """Executes one command line and returns the reply line, or None if the command
+        has no reply or the reply is dropped.
+
+        :param line: Command without line terminator
+        :line type: str
+        :return: Reply without line terminator
+        :rtype: str or None
+        """
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            for c, axes in self.channels.items():
+                for a in axes.values():
+                    a.update(now, c in self.limits)
+            reply = self._execute(line.strip().upper(), now)
+            if reply is None:
+                return None
+            if self._drops:
+                self._drops -= 1
+                return None
+            if self._garbles:
+                self._garbles -= 1
+                return '\x00?' + reply[::-1]
+            return reply
+
+    def _execute(self, line, now):
+        m = _COMMAND.match(line)
+        if m is None:
+            self.error = UNKNOWN_COMMAND
+            return None
+        axis, mnemonic, arg = m.groups()
+        self.counts[mnemonic] = self.counts.get(mnemonic, 0) + 1
+        handler = getattr(self, '_cmd_' + mnemonic, None)
+        if handler is None:
+            self.error = UNKNOWN_COMMAND
+            return None
+        if not self.remote and mnemonic not in ('VE', 'MR', 'ML', 'TE', 'RS'):
+            self.error = NOT_ALLOWED_IN_LOCAL
+            return None
+        if axis and axis not in ('1', '2'):
+            self.error = AXIS_OUT_OF_RANGE
+            return None
+        try:
+            return handler(axis, arg, now)
+        except ValueError:
+            self.error = WRONG_FORMAT
+            return None
+
+    def _ok(self, reply = None):
+        self.error = NO_ERROR
+        return reply
+
+    def _fail(self, code):
+        self.error = code
+        return None
+
+    def _axis(self, axis):
+        return self.channels[self.channel][axis or '1']
+
+    def _moving(self):
+        return any(a.status != READY for a in self.channels[self.channel].values())
+
+    def _cmd_VE(self, axis, arg, now):
+        return self._ok(VERSION)
+
+    def _cmd_MR(self, axis, arg, now):
+        self.remote = True
+        return self._ok()
+
+    def _cmd_ML(self, axis, arg, now):
+        self.remote = False
+        return self._ok()
+
+    def _cmd_RS(self, axis, arg, now):
+        for axes in self.channels.values():
+            for a in axes.values():
+                a.__init__(a.rate, a.travel)
+        self.channel = '1'
+        self.remote = False
+        self.error = NO_ERROR
+        return None
+
+    def _cmd_CC(self, axis, arg, now):
+        if arg == '?':
+            return self._ok('CC' + self.channel)
+        if arg not in self.channels:
+            return self._fail(PARAMETER_OUT_OF_RANGE)
+        if arg != self.channel and self._moving():
+            return self._fail(NOT_ALLOWED_IN_STATE)
+        self.channel = arg
+        return self._ok()
+
+    def _cmd_SU(self, axis, arg, now):
+        if len(arg) < 2 or arg[0] not in '+-':
+            return self._fail(WRONG_FORMAT)
+        a = self._axis(axis)
+        if arg[1:] == '?':
+            return self._ok((axis or '1') + 'SU' + arg[0] + str(a.stepAmp[arg[0]]))
+        value = int(arg[1:])
+        if not 0 < value <= 50:
+            return self._fail(PARAMETER_OUT_OF_RANGE)
+        a.stepAmp[arg[0]] = value
+        return self._ok()
+
+    def _cmd_PR(self, axis, arg, now):
+        steps = int(arg)
+        if not -2147483648 <= steps <= 2147483647:
+            return self._fail(PARAMETER_OUT_OF_RANGE)
+        a = self._axis(axis)
+        if a.status != READY:
+            return self._fail(NOT_ALLOWED_IN_STATE)
+        if steps != 0:
+            a.start(now, STEPPING, 1 if steps > 0 else -1, a.rate, abs(steps))
+        return self._ok()
+
+    def _cmd_MV(self, axis, arg, now):
+        speed = int(arg)
+        if abs(speed) not in MVRATES:
+            return self._fail(PARAMETER_OUT_OF_RANGE)
+        a = self._axis(axis)
+        if a.status != READY:
+            return self._fail(NOT_ALLOWED_IN_STATE)
+        a.start(now, MOVING_TO_LIMIT, 1 if speed > 0 else -1, MVRATES[abs(speed)])
+        return self._ok()
+
+    def _cmd_ST(self, axis, arg, now):
+        axes = [axis] if axis else ['1', '2']
+        for name in axes:
+            self.channels[self.channel][name].stop(now, self.channel in self.limits)
+        return self._ok()
+
+    def _cmd_TS(self, axis, arg, now):
+        return self._ok((axis or '1') + 'TS' + str(self._axis(axis).status))
+
+    def _cmd_TP(self, axis, arg, now):
+        return self._ok((axis or '1') + 'TP' + str(self._axis(axis).counter))
+
+    def _cmd_ZP(self, axis, arg, now):
+        a = self._axis(axis)
+        if a.status != READY:
+            return self._fail(NOT_ALLOWED_IN_STATE)
+        a.counter = 0
+        return self._ok()
+
+    def _cmd_PH(self, axis, arg, now):
+        axes = self.channels[self.channel]
+        status = 0
+        if self.channel in self.limits:
+            status = int(axes['1'].atLimit) + 2*int(axes['2'].atLimit)
+        return self._ok('PH' + str(status))
+
+    def _cmd_TE(self, axis, arg, now):
+        error, self.error = self.error, NO_ERROR
+        return 'TE' + str(error)
@@ -0,0 +1,101 @@
+## @package state
+# This module contains the publication of the live state of controllers to sipyco
+# sync_struct subscribers
+#
+
+import asyncio
+import logging
+
+from sipyco.sync_struct import Notifier
+
+logger = logging.getLogger(__name__)
+
+## Default seconds between state updates
+INTERVAL = 0.1
+
+
+def controllerState(controller):
+    """Returns the state of a controller as known to the driver, without querying the controller.
+
+    :param controller: Controller
+    :controller type: :class:`AGUC8.driver.AGUC8`
+    :return: channel: active channel, limits: PH bit field, axes: by channel, then by alias,
+        position (None while unknown), moving, status (last TS code) and lastOp
+    :rtype: dict
+    """
+    snapshot = controller.monitor.snapshot()
+    axes = {}
+    for ch, channel in controller.channels.items():
+        if channel[controller.aliases[0]] is None:
+            continue
+        axes[ch] = {}
+        for alias, a in channel.items():
+            status = snapshot.status.get(alias) if ch == snapshot.channel else 0
+            axes[ch][alias] = {'position': a.position() if a.positionKnown() else None,
+                               'moving': bool(status) or a.eta() != 0.,
+                               'status': status,
+                               'lastOp': a.whatDidIdo()}
+    return {'channel': controller._channel, 'limits': snapshot.limits, 'axes': axes}
+
+
+def _update(notifier, old, new):
+    for key, value in new.items():
+        if isinstance(value, dict) and isinstance(old.get(key), dict):
+            _update(notifier[key], old[key], value)
+        elif key not in old or old[key] != value:
+            notifier[key] = value
+
+
+class StatePublisher(object):
+    """Keeps one :class:`sipyco.sync_struct.Notifier` per controller up to date with
+    :func:`controllerState`. The state is compared with the published one every interval and
+    only the values that changed are sent, so subscribers get at most one update per interval
+    and nothing while the controllers are idle. Serve :attr:`notifiers` with a
+    :class:`sipyco.sync_struct.Publisher`.
+
+    :param controllers: Controllers by name
+    :controllers type: dict
+    :param interval: Seconds between updates. Defaults to INTERVAL.
+    :interval type: float, optional
+    """
+
+    def __init__(self, controllers, interval=INTERVAL):
+        """Constructor method
+        """
+        self.controllers = dict(controllers)
+        self.interval = interval
+        ## Notifiers by controller name
+        self.notifiers = {name: Notifier(controllerState(c)) for name, c in self.controllers.items()}
+        self._task = None
+
+    def update(self):
+        """Publishes the changes since the last update.
+        """
+        for name, controller in self.controllers.items():
+            notifier = self.notifiers[name]
+            _update(notifier, notifier.raw_view, controllerState(controller))
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                self.update()
+            except Exception:
+                logger.exception('State update failed')
+
+    def start(self):
+        """Starts updating in the running event loop.
+        """
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        """Stops updating.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -0,0 +1,231 @@
+## @package trace
+# This module contains the wire level trace recorder of :class:`AGUC8.agPort.AGPort` and the
+# tools to read and replay recorded sessions
+#
+# Run ``python -m AGUC8.trace dump FILE`` to print a trace, or
+# ``python -m AGUC8.trace replay FILE [--no-delay]`` to send the recorded commands again through
+# the driver port layer against the recorded replies and print the timings.
+#
+
+import argparse
+import struct
+import threading
+import time
+
+from AGUC8 import codec
+from AGUC8.errors import NotConnected
+
+## File signature of saved traces
+MAGIC = b'AGUC8TRC\x01'
+## Direction of frames sent to the controller
+TX = 0
+## Direction of frames received from the controller
+RX = 1
+## Default ring buffer size in bytes
+CAPACITY = 1 << 20
+
+_HEADER = struct.Struct('<dBH')
+
+
+class TraceRecorder(object):
+    """Records frames with a monotonic timestamp in a fixed size binary ring buffer.
+    When the buffer is full the oldest frames are dropped.
+
+    Each record is a little endian header (timestamp: double, direction: byte, length: uint16)
+    followed by the frame bytes.
+
+    :param capacity: Size of the ring buffer in bytes. Defaults to CAPACITY.
+    :capacity type: int, optional
+    """
+
+    def __init__(self, capacity=CAPACITY):
+        """Constructor method
+        """
+        self.capacity = capacity
+        self._buffer = bytearray(capacity)
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        """Drops every record.
+        """
+        with self._lock:
+            self._head = 0
+            self._used = 0
+            ## Number of records dropped because the buffer was full
+            self.dropped = 0
+
+    def _get(self, pos, n):
+        pos %= self.capacity
+        end = pos + n
+        if end <= self.capacity:
+            return bytes(self._buffer[pos:end])
+        return bytes(self._buffer[pos:]) + bytes(self._buffer[:end - self.capacity])
+
+    def _put(self, pos, data):
+        pos %= self.capacity
+        n = min(len(data), self.capacity - pos)
+        self._buffer[pos:pos + n] = data[:n]
+        self._buffer[:len(data) - n] = data[n:]
+
+    def record(self, direction, data, timestamp=None):
+        """Records a frame.
+
+        :param direction: TX or RX
+        :direction type: int
+        :param data: Frame
+        :data type: bytes
+        :param timestamp: time.monotonic() timestamp. Defaults to None, taking the current time.
+        :timestamp type: float, optional
+        """
+        if timestamp is None:
+            timestamp = time.monotonic()
+        data = bytes(data[:0xffff])
+        size = _HEADER.size + len(data)
+        if size > self.capacity:
+            return
+        with self._lock:
+            while self.capacity - self._used < size:
+                length = _HEADER.unpack(self._get(self._head, _HEADER.size))[2]
+                self._head = (self._head + _HEADER.size + length) % self.capacity
+                self._used -= _HEADER.size + length
+                self.dropped += 1
+            tail = self._head + self._used
+            self._put(tail, _HEADER.pack(timestamp, direction, len(data)))
+            self._put(tail + _HEADER.size, data)
+            self._used += size
+
+    def dump(self):
+        """Returns the records, oldest first, in the saved file format without signature.
+
+        :rtype: bytes
+        """
+        with self._lock:
+            return self._get(self._head, self._used)
+
+    def records(self):
+        """Returns the records, oldest first.
+
+        :return: (timestamp, direction, frame) tuples
+        :rtype: list
+        """
+        return list(_parse(self.dump()))
+
+    def save(self, filename):
+        """Saves the records to a file that :func:`load` can read.
+
+        :param filename: File name
+        :filename type: str
+        """
+        with open(filename, 'wb') as f:
+            f.write(MAGIC)
+            f.write(self.dump())
+
+
+def _parse(data):
+    pos = 0
+    while pos + _HEADER.size <= len(data):
+        timestamp, direction, length = _HEADER.unpack_from(data, pos)
+        pos += _HEADER.size
+        yield timestamp, direction, bytes(data[pos:pos + length])
+        pos += length
+
+
+def load(filename):
+    """Reads a trace saved by :meth:`TraceRecorder.save`.
+
+    :param filename: File name
+    :filename type: str
+    :return: (timestamp, direction, frame) tuples
+    :rtype: list
+    """
+    with open(filename, 'rb') as f:
+        data = f.read()
+    if not data.startswith(MAGIC):
+        raise ValueError('{} is not an AGUC8 trace'.format(filename))
+    return list(_parse(data[len(MAGIC):]))
+
+
+def exchanges(records):
+    """Splits a trace into command lines paired with their replies. Frames received after a
+    write are the replies to the queries of that write, in order.
+
+    :param records: (timestamp, direction, frame) tuples
+    :records type: list
+    :return: (sent, command, replied, reply) tuples. For commands without a reply, replied and
+        reply are None.
+    :rtype: list
+    """
+    result = []
+    waiting = []
+    for timestamp, direction, frame in records:
+        if direction == TX:
+            waiting = []
+            for line in frame.decode('utf-8', 'replace').splitlines(True):
+                exchange = [timestamp, line, None, None]
+                result.append(exchange)
+                try:
+                    query = codec.isQuery(line)
+                except ValueError:
+                    query = False
+                if query:
+                    waiting.append(exchange)
+        elif waiting:
+            exchange = waiting.pop(0)
+            exchange[2] = timestamp
+            exchange[3] = frame
+    return [tuple(e) for e in result]
+
+
+def _replay(filename, delay):
+    from AGUC8.agPort import AGPort
+    url = 'replay://' + filename + ('' if delay else '?timing=none')
+    try:
+        port = AGPort(url)
+    except NotConnected as e:
+        # A trace that is missing or cannot be read
+        raise SystemExit(str(e))
+    records = load(filename)
+    writes = [(timestamp, frame.decode('utf-8', 'replace')) for timestamp, direction, frame in records
+              if direction == TX]
+    start = time.monotonic()
+    for timestamp, frame in writes:
+        if delay:
+            # Keep the recorded gaps between writes, which the port cannot reproduce by itself
+            wait = start + timestamp - writes[0][0] - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+        port.sendBatch(frame.splitlines(True))
+    elapsed = time.monotonic() - start
+    recorded = records[-1][0] - records[0][0] if records else 0.
+    print('{} writes replayed in {:.3f} s (recorded session: {:.3f} s), {} mismatched commands'.format(
+        len(writes), elapsed, recorded, port.ser.mismatches))
+    for m, stats in sorted(port.metrics.snapshot()['commands'].items()):
+        latency = stats['latency']
+        mean = latency['sum']/latency['count'] if latency['count'] else 0.
+        print('{:>3} sent {:6d} timeouts {:4d} mean latency {:8.3f} ms'.format(
+            m, stats['sent'], stats['timeouts'], 1e3*mean))
+    port.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='AG-UC8 wire trace tool')
+    sub = parser.add_subparsers(dest='action', required=True)
+    p = sub.add_parser('dump', help='print the frames of a trace')
+    p.add_argument('file')
+    p = sub.add_parser('replay', help='send the recorded commands again against the recorded replies')
+    p.add_argument('file')
+    p.add_argument('--no-delay', action='store_true',
+                   help='send the commands back to back and serve replies without the recorded latency')
+    args = parser.parse_args()
+    if args.action == 'dump':
+        records = load(args.file)
+        t0 = records[0][0] if records else 0.
+        for timestamp, direction, frame in records:
+            print('{:12.6f} {} {!r}'.format(timestamp - t0, '>' if direction == TX else '<', frame))
+    else:
+        _replay(args.file, not args.no_delay)
+
+
+if __name__ == '__main__':
+    main()
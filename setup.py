@@ -7,7 +7,7 @@ setup(
     author="OregonIons",
     url="https://github.com/OregonIons/AGUC8",
     download_url="https://github.com/OregonIons/AGUC8",
-    install_requires=["sipyco", "pyserial"],
+    install_requires=["sipyco", "pyserial", "numpy"],
     packages=find_packages(),
     entry_points={
         "console_scripts": [
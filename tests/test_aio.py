@@ -0,0 +1,43 @@
+import asyncio
+import time
+
+import pytest
+
+from AGUC8 import simulator
+from AGUC8.aio import AsyncAGUC8
+
+
+def test_set_zero_refused_while_following_a_path():
+    async def main():
+        drv = AsyncAGUC8('sim://pathzero')
+        try:
+            drv.followApath([(100, 100), (-100, -100)]*5)
+            with pytest.raises(RuntimeError):
+                await drv.setZero()
+            await drv.stop()
+        finally:
+            drv.close()
+            simulator.removeController('pathzero')
+    asyncio.run(main())
+
+
+def test_status_during_move_and_stop():
+    async def main():
+        drv = AsyncAGUC8('sim://aiostop')
+        try:
+            await drv.move(100, 50)
+            assert await drv.positions() == {'X': 100, 'Y': 50}
+            move = asyncio.ensure_future(drv.move(3000, 3000))
+            await asyncio.sleep(0.2)
+            start = time.monotonic()
+            assert (await drv.queryStatus())['X'] == 1
+            assert time.monotonic() - start < 0.5
+            await drv.stop()
+            await asyncio.wait_for(move, 0.5)
+            assert await drv.queryStatus() == {'X': 0, 'Y': 0}
+            counters = [simulator.getController('aiostop').axis('1', n).counter for n in ('1', '2')]
+            assert all(100 < c < 3050 for c in counters)
+        finally:
+            drv.close()
+            simulator.removeController('aiostop')
+    asyncio.run(main())
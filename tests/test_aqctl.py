@@ -0,0 +1,45 @@
+import asyncio
+import time
+
+import pytest
+
+pytest.importorskip('sipyco')
+
+from AGUC8 import simulator
+from AGUC8.aqctl_AGUC8 import AsyncMotor
+from AGUC8.errors import ChannelLeased
+
+
+def test_get_position_during_move():
+    async def main():
+        motor = AsyncMotor('sim://rpcmidmove')
+        try:
+            move = asyncio.ensure_future(motor.move(3000, 3000))
+            await asyncio.sleep(0.2)
+            start = time.monotonic()
+            position = await motor.get_position()
+            assert time.monotonic() - start < 0.5
+            assert not move.done()
+            assert all(0 < p < 3000 for p in position.values())
+            await motor.stop()
+            await move
+        finally:
+            motor.close()
+            simulator.removeController('rpcmidmove')
+    asyncio.run(main())
+
+
+def test_path_in_units_on_a_leased_channel():
+    async def main():
+        motor = AsyncMotor('sim://rpcleasedpath')
+        try:
+            token = await motor.lease()
+            with pytest.raises(ChannelLeased):
+                motor.followApath_units([(10, 20)])
+            motor.followApath_units([(10, 20)], lease=token)
+            motor.drv.path.join(1.)
+            assert motor.path_progress()['moves'] == 1
+        finally:
+            motor.close()
+            simulator.removeController('rpcleasedpath')
+    asyncio.run(main())
@@ -0,0 +1,14 @@
+import argparse
+
+from AGUC8 import benchmark
+
+
+def test_run_and_compare():
+    options = argparse.Namespace(latency=0., processing=0., rate=None, count=5, moves=2, short=10, long=20,
+                                 points=4, startups=2, calls=2)
+    results = benchmark.run(options, ['startup', 'queries', 'moves', 'path'])
+    assert set(results['results']) == {'startup', 'queries', 'moves', 'path'}
+    assert results['results']['queries']['single']['count'] == 5
+    lines = benchmark.compare(results, results)
+    assert len(lines) > 1
+    assert all(line.split()[-1] == '1.000' for line in lines[1:] if not line.split()[-1] == 'nan')
@@ -0,0 +1,32 @@
+import pytest
+
+from AGUC8 import codec
+
+
+def test_frame():
+    ts = codec.frame('1', 'TS')
+    assert ts == b'1TS\r\n'
+    assert ts.query and ts.echo == '1TS'
+    assert codec.frame('1', 'TS') is ts
+    assert not codec.frame('1', 'PR', 100).query
+    cc = codec.frame('', 'CC', '?')
+    assert cc.query and cc.echo == 'CC'
+    assert not codec.frame('', 'CC', '2').query
+
+
+def test_encode():
+    assert codec.encode('1pr-50') == b'1PR-50\r\n'
+    assert codec.encode(b'1TS\r\n').echo == '1TS'
+    assert codec.isQuery('2SU+?')
+    with pytest.raises(ValueError):
+        codec.encode('?')
+
+
+def test_decode():
+    assert codec.decode('1TS', '1TS0\r\n') == 0
+    assert codec.decode('1TP', '1TP-120') == -120
+    assert codec.decode('CC?', 'CC2') == '2'
+    assert codec.decode('VE', 'AG-UC8 v2.2.1') == 'AG-UC8 v2.2.1'
+    assert codec.decode('1TS', '') is None
+    assert codec.decode('1TS', '2TS0') is None
+    assert codec.decode('1TP', '1TPx') is None
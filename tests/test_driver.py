@@ -0,0 +1,171 @@
+import os
+import threading
+import time
+
+import pytest
+
+from AGUC8 import simulator
+from AGUC8.driver import AGUC8
+from AGUC8.errors import AGUC8Error
+from AGUC8.trace import TX
+
+
+def test_concurrent_move():
+    drv = AGUC8('sim://concurrent')
+    try:
+        sim = simulator.getController('concurrent')
+        drv.move(200, 100)
+        starts = [sim.axis('1', n)._start for n in ('1', '2')]
+        # Both axes started together
+        assert abs(starts[1] - starts[0]) < 0.05
+        assert [sim.axis('1', n).counter for n in ('1', '2')] == [200, 100]
+        drv.move(-200, -100, concurrent=False)
+        starts = [sim.axis('1', n)._start for n in ('1', '2')]
+        # Axis 2 waited for the 200 steps of axis 1, at 1000 steps/s
+        assert starts[1] - starts[0] >= 0.2
+        assert [sim.axis('1', n).counter for n in ('1', '2')] == [0, 0]
+    finally:
+        drv.close()
+        simulator.removeController('concurrent')
+
+
+def test_stop_cancels_pending_moves():
+    drv = AGUC8('sim://cancelmove')
+    try:
+        sim = simulator.getController('cancelmove')
+        with drv.port.lock:
+            # The move waits for the port, and the stop is requested before it gets it
+            mover = threading.Thread(target=drv.move, args=(500, 500))
+            mover.start()
+            time.sleep(0.05)
+            stopper = threading.Thread(target=drv.stop)
+            stopper.start()
+            time.sleep(0.05)
+        mover.join()
+        stopper.join()
+        assert [sim.axis('1', n).counter for n in ('1', '2')] == [0, 0]
+        # Later moves run
+        drv.move(10, 10)
+        assert [sim.axis('1', n).counter for n in ('1', '2')] == [10, 10]
+    finally:
+        drv.close()
+        simulator.removeController('cancelmove')
+
+
+def test_warm_start_after_power_cycle(tmp_path):
+    state = os.path.join(str(tmp_path), 'state.json')
+    drv = AGUC8('sim://powercycle', state=state)
+    try:
+        drv.move(100, 50)
+        assert drv.positions() == {'X': 100, 'Y': 50}
+    finally:
+        drv.close()
+    # The controller comes back with its default configuration and its counters at zero
+    simulator.removeController('powercycle')
+    drv = AGUC8('sim://powercycle', state=state)
+    try:
+        assert drv.positions() == {'X': 100, 'Y': 50}
+        drv.goToZero()
+        assert drv.positions() == {'X': 0, 'Y': 0}
+        sim = simulator.getController('powercycle')
+        assert [sim.axis('1', n).counter for n in ('1', '2')] == [-100, -50]
+    finally:
+        drv.close()
+        simulator.removeController('powercycle')
+
+
+def test_position_during_move():
+    drv = AGUC8('sim://midmove')
+    try:
+        assert drv.positions() == {'X': 0, 'Y': 0}
+        mover = threading.Thread(target=drv.move, args=(300, 300))
+        mover.start()
+        time.sleep(0.1)
+        sim = simulator.getController('midmove')
+        queries = sim.counts['TP']
+        # Read from the controller while the axes travel, not the commanded target
+        assert all(0 < p < 300 for p in drv.positions().values())
+        # One TP per axis, in a single batch
+        assert sim.counts['TP'] == queries + 2
+        mover.join()
+        assert drv.positions() == {'X': 300, 'Y': 300}
+        assert all(a.positionKnown() for a in drv.channels['1'].values())
+    finally:
+        drv.close()
+        simulator.removeController('midmove')
+
+
+def test_go_to_zero_without_counters():
+    drv = AGUC8('sim://nocounters')
+    try:
+        drv.move(10, 10)
+        drv.port.timeouts.default = 0.1
+        for a in drv.channels['1'].values():
+            a.setPosition(None)
+        # Both replies of the TP batch
+        simulator.getController('nocounters').dropReplies(2)
+        with pytest.raises(AGUC8Error):
+            drv.goToZero()
+    finally:
+        drv.close()
+        simulator.removeController('nocounters')
+
+
+def test_poll_inactive_channel():
+    drv = AGUC8('sim://inactivepoll', monitor=0.01)
+    try:
+        # Switched to a channel that is not active, e.g. from the front panel or after a resync
+        simulator.getController('inactivepoll').channel = '2'
+        drv.resyncChannel()
+        assert drv._channel == '2'
+        assert drv.pollStatus() == []
+        time.sleep(0.05)
+        assert drv.monitor.running()
+    finally:
+        drv.close()
+        simulator.removeController('inactivepoll')
+
+
+def test_stop_on_inactive_channel():
+    drv = AGUC8('sim://inactivestop')
+    try:
+        sim = simulator.getController('inactivestop')
+        sim.channel = '3'
+        sim.handle('1PR1000')
+        assert sim.axis('3', '1').status == simulator.STEPPING
+        drv.resyncChannel()
+        drv.stop()
+        assert sim.axis('3', '1').status == simulator.READY
+    finally:
+        drv.close()
+        simulator.removeController('inactivestop')
+
+
+def test_stop_during_move():
+    drv = AGUC8('sim://stopmove')
+    try:
+        recorder = drv.port.startTrace()
+        exchange = drv.port._exchange
+        stoppers = []
+
+        def delayed(commands, *args, **kwargs):
+            if not stoppers and any(c.mnemonic == 'PR' for c in commands):
+                # The stop is requested while the first PR waits for the port
+                stoppers.append(threading.Thread(target=drv.stop))
+                stoppers[0].start()
+                while not drv.port._urgent and stoppers[0].is_alive():
+                    time.sleep(0.001)
+            return exchange(commands, *args, **kwargs)
+
+        drv.port._exchange = delayed
+        drv.move(500, 500)
+        stoppers[0].join()
+        lines = [line for _, direction, frame in recorder.records() if direction == TX
+                 for line in frame.decode('ascii').split()]
+        assert '1ST' in lines
+        assert 'PR' not in ''.join(lines[lines.index('1ST'):])
+        sim = simulator.getController('stopmove')
+        assert [sim.axis('1', n).counter for n in ('1', '2')] == [0, 0]
+    finally:
+        drv.close()
+        simulator.removeController('stopmove')
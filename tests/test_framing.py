@@ -0,0 +1,42 @@
+import serial
+
+from AGUC8 import codec
+from AGUC8.framing import FrameReader, Timeouts, isReply, match, TIMEOUT, MINTIMEOUT, SAMPLES
+from AGUC8.metrics import Metrics
+
+
+def test_frame_reader():
+    ser = serial.serial_for_url('loop://', timeout=0.)
+    try:
+        reader = FrameReader(ser)
+        ser.write(b'1TS0\r\n1TP')
+        assert reader.readline(0.05) == b'1TS0\r\n'
+        assert reader.readline(0.01) == b''
+        ser.write(b'25\r\n')
+        assert reader.readline(0.05) == b'1TP25\r\n'
+        ser.write(b'garbage')
+        reader.readline(0.01)
+        reader.flush()
+        ser.write(b'PH0\r\n')
+        assert reader.readline(0.05) == b'PH0\r\n'
+    finally:
+        ser.close()
+
+
+def test_timeouts():
+    metrics = Metrics()
+    timeouts = Timeouts(metrics)
+    assert timeouts.get('TS') == TIMEOUT
+    for _ in range(SAMPLES):
+        metrics.replied('1TS', 6, 0.001)
+    assert timeouts.get('TS') == MINTIMEOUT
+    assert timeouts.get('TP') == TIMEOUT
+
+
+def test_match():
+    queries = [codec.frame('1', 'TS'), codec.frame('2', 'TS'), codec.frame('', 'PH')]
+    assert match(queries, '2TS0') == 1
+    assert match(queries, 'PH0') == 2
+    assert match(queries, 'AG-UC8 v2.2.1') == 0
+    assert match(queries, '1TP10') is None
+    assert isReply('1TP10') and not isReply('AG-UC8 v2.2.1')
@@ -0,0 +1,46 @@
+import asyncio
+import time
+
+import pytest
+
+from AGUC8 import simulator
+from AGUC8.aio import AsyncAGUC8
+from AGUC8.motion import Motions, CANCELLED, DONE, FAILED, QUEUED, RUNNING
+from AGUC8.scheduler import ChannelScheduler
+
+
+def test_wait_and_cancel():
+    async def fail():
+        raise ValueError('no')
+
+    async def main():
+        drv = AsyncAGUC8('sim://handles')
+        scheduler = ChannelScheduler('1')
+        motions = Motions()
+        try:
+            sim = simulator.getController('handles')
+            long = motions.start('move', '1', scheduler, drv.move, 2000, 2000, '1')
+            queued = motions.start('move', '1', scheduler, drv.move, 10, 10, '1')
+            await asyncio.sleep(0.1)
+            assert motions.get(long).state == RUNNING
+            assert motions.get(queued).state == QUEUED
+            assert (await motions.cancel(queued, drv.stop))['state'] == CANCELLED
+            start = time.monotonic()
+            assert (await motions.cancel(long, drv.stop))['state'] == CANCELLED
+            assert time.monotonic() - start < 0.5
+            assert 0 < sim.axis('1', '1').counter < 2000
+            # Waiting with a timeout returns the motion still running
+            short = motions.start('move', '1', scheduler, drv.move, 200, 200, '1')
+            assert (await motions.wait(short, 0.05))['state'] == RUNNING
+            status = await motions.wait(short)
+            assert status['state'] == DONE and status['finished'] >= status['started']
+            failing = motions.start('fail', '1', scheduler, fail)
+            with pytest.raises(ValueError):
+                await motions.wait(failing)
+            assert motions.get(failing).state == FAILED
+            assert [m.id for m in motions.all()] == [long, queued, short, failing]
+        finally:
+            scheduler.close()
+            drv.close()
+            simulator.removeController('handles')
+    asyncio.run(main())
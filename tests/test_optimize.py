@@ -0,0 +1,21 @@
+import pytest
+
+from AGUC8 import simulator
+from AGUC8.driver import AGUC8
+from AGUC8.errors import AGUC8Error
+
+
+def test_optimize_without_counters():
+    drv = AGUC8('sim://optnocounters')
+    try:
+        drv.port.timeouts.default = 0.1
+        for a in drv.channels['1'].values():
+            a.setPosition(None)
+        # Both replies of the TP batch
+        simulator.getController('optnocounters').dropReplies(2)
+        with pytest.raises(AGUC8Error):
+            drv.optimize({'gaussian': {'center': (100, 100), 'width': 100.}})
+        assert simulator.getController('optnocounters').counts.get('PR', 0) == 0
+    finally:
+        drv.close()
+        simulator.removeController('optnocounters')
@@ -0,0 +1,57 @@
+import time
+
+from AGUC8 import simulator
+from AGUC8.driver import AGUC8
+from AGUC8.path import coalesce
+
+
+def test_coalesce():
+    path = [(1, 0), (2, 0), (0, 0), (0, 3), (0, 4), (1, 1), (0, 0)]
+    assert list(coalesce(path)) == [(3, 0), (0, 7), (1, 1)]
+    assert list(coalesce(iter([(0, 0)]))) == []
+
+
+def test_follow_and_stop():
+    drv = AGUC8('sim://pathstop')
+    try:
+        sim = simulator.getController('pathstop')
+        runner = drv.followApath([(20, 10), (0, 10), (-20, 0)], wait=True)
+        assert [sim.axis('1', n).counter for n in ('1', '2')] == [0, 20]
+        assert runner.progress()['index'] == 2
+        assert runner.progress()['moves'] == 3
+        runner = drv.followApath([(100, 100), (-100, -100)]*5)
+        time.sleep(0.25)
+        assert runner.running()
+        drv.stop()
+        runner.join(1.)
+        assert not runner.running()
+        progress = runner.progress()
+        assert progress['index'] < 9
+        counters = [sim.axis('1', n).counter for n in ('1', '2')]
+        time.sleep(0.15)
+        # Nothing moves after the stop
+        assert [sim.axis('1', n).counter for n in ('1', '2')] == counters
+    finally:
+        drv.close()
+        simulator.removeController('pathstop')
+
+
+def test_resume_after_stop():
+    drv = AGUC8('sim://pathresume')
+    try:
+        sim = simulator.getController('pathresume')
+        runner = drv.followApath([(300, 0), (0, 300), (300, 0), (0, 300)])
+        # Stop during the second move, at 1000 steps/s
+        time.sleep(0.45)
+        drv.stop()
+        runner.join(1.)
+        assert runner.progress()['index'] == 0
+        assert sim.axis('1', '2').counter < 300
+        runner.resume()
+        runner.join(5.)
+        assert not runner.running()
+        assert [sim.axis('1', n).counter for n in ('1', '2')] == [600, 600]
+        assert runner.progress()['moves'] == 4
+    finally:
+        drv.close()
+        simulator.removeController('pathresume')
@@ -0,0 +1,92 @@
+import threading
+import time
+
+import pytest
+
+from AGUC8 import simulator
+from AGUC8.agPort import AGPort
+from AGUC8.errors import CommandLost, NotConnected
+from AGUC8.trace import TX
+
+
+def sent(recorder):
+    """Returns the command lines written to the port, in order."""
+    return [line for _, direction, frame in recorder.records() if direction == TX
+            for line in frame.decode('ascii').split()]
+
+
+def test_send_batch():
+    port = AGPort('sim://batch')
+    try:
+        writes = []
+        write = port.ser.write
+        port.ser.write = lambda data: writes.append(data) or write(data)
+        replies = port.sendBatch(['MR\r\n', '1TS\r\n', '2PR-20\r\n', '2TP\r\n', 'VE\r\n'])
+        # One write, and a reply for each query in order
+        assert len(writes) == 1
+        assert replies == ['1TS0', '2TP0', simulator.VERSION]
+        assert port.sendBatch(['1PR10\r\n']) == []
+        assert port.sendString('CC?\r\n') == 'CC1'
+    finally:
+        port.close()
+        simulator.removeController('batch')
+
+
+def test_urgent_goes_first():
+    port = AGPort('sim://urgent')
+    try:
+        port.sendString('MR\r\n')
+        recorder = port.startTrace()
+        with port.lock:
+            # An exchange is in progress: both commands below wait for the port
+            waiting = threading.Thread(target=port.sendString, args=('1TP\r\n',))
+            waiting.start()
+            time.sleep(0.05)
+            urgent = threading.Thread(target=port.sendUrgent, args=(['1ST\r\n', '1TS\r\n'],))
+            urgent.start()
+            time.sleep(0.05)
+        urgent.join()
+        waiting.join()
+        assert sent(recorder) == ['1ST', '1TS', '1TP']
+    finally:
+        port.close()
+        simulator.removeController('urgent')
+
+
+def test_reconnect():
+    port = AGPort('sim://reconnect')
+    try:
+        sim = simulator.getController('reconnect')
+        port.sendString('MR\r\n')
+        port.restore = lambda: ['MR\r\n']
+        sim.setOffline()
+        threading.Timer(0.05, sim.setOffline, (False,)).start()
+        # A query lost with the connection is sent again once it is restored
+        assert port.sendString('1TP\r\n') == '1TP0'
+        assert port.connected
+        assert port.metrics.snapshot()['reconnectTime']['count'] == 1
+        # A relative move is not, as it could run twice
+        sim.setOffline()
+        with pytest.raises(CommandLost):
+            port.sendString('1PR10\r\n')
+        sim.setOffline(False)
+        assert port.sendString('1TP\r\n') == '1TP0'
+        # Gives up after resumeTimeout
+        port.resumeTimeout = 0.05
+        sim.setOffline()
+        with pytest.raises(NotConnected):
+            port.sendString('1TP\r\n')
+        sim.setOffline(False)
+        assert port.sendString('1TS\r\n') == '1TS0'
+    finally:
+        port.close()
+        simulator.removeController('reconnect')
+
+
+def test_open_offline():
+    simulator.getController('offline').setOffline()
+    try:
+        with pytest.raises(NotConnected):
+            AGPort('sim://offline')
+    finally:
+        simulator.removeController('offline')
@@ -0,0 +1,31 @@
+import numpy as np
+
+from AGUC8 import simulator
+from AGUC8.driver import AGUC8
+
+
+def test_scan_with_lost_counter_reply():
+    drv = AGUC8('sim://scanloss')
+    seen = []
+    try:
+        drv.port.timeouts.default = 0.1
+        sim = simulator.getController('scanloss')
+        positions = drv.positions
+        reads = []
+
+        def lossy(ch='def'):
+            reads.append(ch)
+            if len(reads) == 4:
+                # At the third point, lose the reply to the TP of axis 1
+                sim.dropReplies(1)
+            return positions(ch)
+
+        drv.positions = lossy
+        result = drv.scan([(10, 5), (20, 10), (30, 15)], hook=lambda i, c, m: seen.append(m))
+        assert len(result['measured']) == 3
+        assert np.isnan(result['measured'][2, 0])
+        assert result['measured'][2, 1] == 15
+        assert seen == [(10, 5), (20, 10), (None, 15)]
+    finally:
+        drv.close()
+        simulator.removeController('scanloss')
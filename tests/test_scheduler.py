@@ -0,0 +1,90 @@
+import asyncio
+
+import pytest
+
+from AGUC8.errors import ChannelLeased
+from AGUC8.lease import Leases
+from AGUC8.metrics import Metrics
+from AGUC8.scheduler import ChannelScheduler, MOTION, STATUS
+
+
+def run(ops, later=(), leases=None):
+    """Submits (name, channel[, priority[, lease]]) operations together, then the later ones
+    while the first runs, and returns the order they ran in, their results and the scheduler."""
+    async def main():
+        scheduler = ChannelScheduler('1', Metrics(), leases)
+        order = []
+        # Holds the first operation until the later ones are queued
+        submitted = asyncio.Event()
+
+        async def op(name):
+            await submitted.wait()
+            order.append(name)
+            return name
+
+        def submit(name, ch, priority=MOTION, lease=None):
+            return asyncio.ensure_future(scheduler.submit(ch, op, name, priority=priority, lease=lease))
+
+        tasks = [submit(*o) for o in ops]
+        await asyncio.sleep(0.001)
+        tasks += [submit(*o) for o in later]
+        submitted.set()
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        scheduler.close()
+        return order, results, scheduler
+    return asyncio.run(main())
+
+
+def test_channel_grouping():
+    order, results, scheduler = run([('a', '1'), ('b', '2'), ('c', '1'), ('d', '2')])
+    assert order == ['a', 'c', 'b', 'd']
+    assert results == ['a', 'b', 'c', 'd']
+    assert scheduler.switches == 1
+    # Operations queued during a pass wait for the next pass on their channel
+    order, _, scheduler = run([('a', '1')], [('b', '2'), ('c', '1')])
+    assert order == ['a', 'b', 'c']
+
+
+def test_status_before_motions():
+    order, _, scheduler = run([('m1', '1'), ('m2', '2'), ('m3', '1')], [('s1', '2', STATUS)])
+    # The status read goes first, then the pass on channel 1 resumes
+    assert order == ['m1', 's1', 'm3', 'm2']
+    snapshot = scheduler.metrics.snapshot()
+    assert snapshot['queueWait']['status']['count'] == 1
+    assert snapshot['queueWait']['motion']['count'] == 3
+    assert snapshot['queueDepth'] == 0
+
+
+def test_leases_refuse_motions():
+    async def lease():
+        return await leases.acquire('1', 10., 'test')
+    leases = Leases()
+    token = asyncio.run(lease())
+    order, results, _ = run([('mine', '1', MOTION, token), ('other', '1'), ('read', '1', STATUS)], leases=leases)
+    assert order == ['read', 'mine']
+    assert isinstance(results[1], ChannelLeased)
+
+
+def test_lease_lifecycle():
+    async def main():
+        leases = Leases()
+        token = await leases.acquire('1', 10., 'a')
+        with pytest.raises(ChannelLeased):
+            await leases.acquire('1', 10., 'b')
+
+        async def release():
+            await asyncio.sleep(0.05)
+            await leases.release(token)
+
+        asyncio.ensure_future(release())
+        other = await leases.acquire('1', 0.05, 'b', wait=1.)
+        with pytest.raises(ChannelLeased):
+            leases.check('1', token)
+        leases.check('1', other)
+        await asyncio.sleep(0.1)
+        # Expired
+        assert leases.all() == []
+        leases.check('1')
+        with pytest.raises(ChannelLeased):
+            leases.renew(other)
+    asyncio.run(main())
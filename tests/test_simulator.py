@@ -0,0 +1,39 @@
+from AGUC8 import simulator
+from AGUC8.simulator import SimController
+
+
+def test_local_mode():
+    sim = SimController()
+    assert sim.handle('1TS', now=0.) is None
+    assert sim.handle('TE', now=0.) == 'TE-5'
+
+
+def test_relative_move():
+    sim = SimController()
+    sim.handle('MR', now=0.)
+    sim.handle('1PR100', now=0.)
+    assert sim.handle('1TS', now=0.05) == '1TS1'
+    assert sim.handle('1TP', now=0.05) == '1TP50'
+    # CC is refused while an axis moves
+    assert sim.handle('CC2', now=0.05) is None
+    assert sim.handle('TE', now=0.05) == 'TE-6'
+    assert sim.handle('1TS', now=1.) == '1TS0'
+    assert sim.handle('1TP', now=1.) == '1TP100'
+
+
+def test_faults():
+    sim = SimController()
+    sim.handle('MR', now=0.)
+    sim.dropReplies()
+    assert sim.handle('1TP', now=0.) is None
+    assert sim.handle('1TP', now=0.) == '1TP0'
+    sim.garbleReplies()
+    assert sim.handle('1TP', now=0.) != '1TP0'
+
+
+def test_registry():
+    sim = simulator.getController('registry')
+    assert simulator.getController('registry') is sim
+    simulator.removeController('registry')
+    assert simulator.getController('registry') is not sim
+    simulator.removeController('registry')
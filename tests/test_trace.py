@@ -0,0 +1,32 @@
+import os
+import time
+
+import pytest
+
+from AGUC8 import codec, simulator, trace
+from AGUC8.agPort import AGPort
+
+
+def test_replay_keeps_the_gaps_between_writes(tmp_path, capsys):
+    filename = os.path.join(str(tmp_path), 'session.trc')
+    port = AGPort('sim://tracegaps')
+    try:
+        recorder = port.startTrace()
+        port.sendBatch([codec.frame('', 'MR'), codec.frame('', 'VE')])
+        time.sleep(0.1)
+        port.sendString(codec.frame('1', 'TS'))
+        recorder.save(filename)
+    finally:
+        port.close()
+        simulator.removeController('tracegaps')
+    start = time.monotonic()
+    trace._replay(filename, True)
+    assert time.monotonic() - start >= 0.1
+    assert '0 mismatched commands' in capsys.readouterr().out
+
+
+def test_replay_missing_trace(tmp_path):
+    filename = os.path.join(str(tmp_path), 'missing.trc')
+    with pytest.raises(SystemExit) as e:
+        trace._replay(filename, False)
+    assert filename in str(e.value)